@@ -0,0 +1,191 @@
+"""
+Headless batch runner for contract compliance analysis.
+
+Walks a directory (or reads a manifest) of PDF/DOCX/TXT contracts, analyses
+them with a bounded number of concurrent workers, writes one JSON report
+per file and streams a line per finished file to results.jsonl. Re-running
+with --resume skips files that already finished successfully.
+
+    python batch_cli.py contracts/ --out reports/ --workers 8 --rate-limit 2
+    python batch_cli.py manifest.txt --out reports/ --resume
+"""
+import argparse
+import hashlib
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from modules import resources, structured_output
+from modules.metrics import metrics
+from modules.agents.document_processor import DocumentProcessor
+from modules.agents.orchestration_agent import ANALYSIS_MODES, ContractComplianceOrchestrator
+from modules.agents.research_agent import ResearchAgent
+from modules.result_cache import AnalysisCache
+from modules.extraction_cache import ExtractionCache
+
+SUPPORTED_SUFFIXES = set(DocumentProcessor().supported_formats)
+RESULTS_FILE = "results.jsonl"
+
+
+def discover_files(source: str) -> List[Path]:
+    """Contracts under a directory, or the paths listed in a manifest file"""
+    path = Path(source)
+    if path.is_dir():
+        files = (p for p in path.rglob("*") if p.is_file())
+    elif path.suffix.lower() == ".jsonl":
+        with open(path, encoding="utf-8") as f:
+            files = [Path(json.loads(line)["file_path"]) for line in f if line.strip()]
+    else:
+        with open(path, encoding="utf-8") as f:
+            files = [Path(line.strip()) for line in f if line.strip() and not line.startswith("#")]
+    return sorted(p for p in files if p.suffix.lower() in SUPPORTED_SUFFIXES)
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_completed(results_path: Path) -> Dict[str, str]:
+    """file_path -> sha256 of every file that already has a successful report"""
+    completed: Dict[str, str] = {}
+    if not results_path.exists():
+        return completed
+    with open(results_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # partially written line from an interrupted run
+            if record.get("status") == "ok":
+                completed[record["file_path"]] = record["sha256"]
+    return completed
+
+
+class BatchRunner:
+    """Drives one orchestrator, shared by the worker threads, over a list of contracts"""
+
+    def __init__(self, out_dir: Path, workers: int = 4, result_cache: Optional[AnalysisCache] = None,
+                 extraction_cache: Optional[ExtractionCache] = None, analysis_mode: str = "agent"):
+        self.out_dir = out_dir
+        self.workers = workers
+        self.result_cache = result_cache
+        self.extraction_cache = extraction_cache
+        self.analysis_mode = analysis_mode
+        self.results_path = out_dir / RESULTS_FILE
+        self._write_lock = threading.Lock()
+        self.orchestrator = ContractComplianceOrchestrator(
+            ResearchAgent(),
+            result_cache=result_cache,
+            extraction_cache=extraction_cache,
+            analysis_mode=analysis_mode
+        )
+
+    def analyze_file(self, path: Path, sha256: str) -> Dict:
+        start = time.perf_counter()
+        record = {"file_path": str(path), "file_name": path.name, "sha256": sha256}
+        orchestrator = self.orchestrator
+        try:
+            report = orchestrator.process_contracts(
+                [{"file_name": path.name, "file_path": str(path)}], batch=False
+            )
+            if isinstance(report, dict) and report.get("status") == "error":
+                raise RuntimeError(report.get("error", "analysis failed"))
+            report_path = self.out_dir / f"{path.stem}-{sha256[:12]}.json"
+            with open(report_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            record.update({"status": "ok", "report_path": str(report_path)})
+            record["llm_calls"] = orchestrator.last_run_llm_calls
+            record["node_seconds"] = orchestrator.last_run_metrics.get("nodes", {})
+        except Exception as e:
+            record.update({"status": "error", "error": str(e)})
+        record["elapsed_s"] = round(time.perf_counter() - start, 3)
+        return record
+
+    def _append_result(self, record: Dict) -> None:
+        with self._write_lock:
+            with open(self.results_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+    def run(self, files: Iterable[Path], resume: bool = False) -> Dict[str, int]:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        completed = load_completed(self.results_path) if resume else {}
+
+        pending = []
+        skipped = 0
+        for path in files:
+            sha256 = file_digest(path)
+            if completed.get(str(path)) == sha256:
+                skipped += 1
+            else:
+                pending.append((path, sha256))
+
+        counts = {"total": len(pending) + skipped, "skipped": skipped, "ok": 0, "error": 0, "llm_calls": 0}
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = [pool.submit(self.analyze_file, path, sha256) for path, sha256 in pending]
+                for done, future in enumerate(as_completed(futures), 1):
+                    record = future.result()
+                    self._append_result(record)
+                    counts[record["status"]] += 1
+                    counts["llm_calls"] += record.get("llm_calls", 0)
+                    detail = record.get("error", record.get("report_path"))
+                    print(f"[{done}/{len(pending)}] {record['file_name']}: {record['status']} "
+                          f"({record['elapsed_s']}s) {detail}")
+        finally:
+            self.orchestrator.close()
+        return counts
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Analyse a directory or manifest of contracts")
+    parser.add_argument("source", help="Directory of contracts, or a manifest (.txt paths or .jsonl with file_path)")
+    parser.add_argument("--out", default="batch_reports", help="Directory for JSON reports and results.jsonl")
+    parser.add_argument("--workers", type=int, default=4, help="Contracts analysed concurrently")
+    parser.add_argument("--rate-limit", type=float, default=None,
+                        help="Maximum LLM requests per second across all workers")
+    parser.add_argument("--analysis-mode", choices=ANALYSIS_MODES, default="agent",
+                        help="agent: ReAct agent loop; direct: one analysis call without the agent; "
+                             "chunked: parallel per-chunk analysis; targeted: each rule against its most relevant passages")
+    parser.add_argument("--resume", action="store_true", help="Skip files already reported as ok")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the analysis and extraction caches")
+    parser.add_argument("--metrics-out", default=None,
+                        help="Write node, tool and model latency, token and cache metrics here in Prometheus text format")
+    args = parser.parse_args(argv)
+
+    if args.rate_limit:
+        resources.set_llm_rate_limit(args.rate_limit)
+    resources.configure_llm_pool(size=max(resources.LLM_POOL_SIZE, args.workers))
+
+    files = discover_files(args.source)
+    if not files:
+        print(f"No supported contracts found in {args.source}")
+        return 1
+
+    runner = BatchRunner(
+        Path(args.out),
+        workers=args.workers,
+        result_cache=None if args.no_cache else AnalysisCache(),
+        extraction_cache=None if args.no_cache else ExtractionCache(),
+        analysis_mode=args.analysis_mode
+    )
+    counts = runner.run(files, resume=args.resume)
+    # How often model output needed a local fix or a re-ask to pass schema validation
+    counts["structured_output"] = structured_output.stats.snapshot()
+    # Where the time went, slowest graph node first
+    counts["nodes"] = metrics.node_summary()
+    if args.metrics_out:
+        metrics.write_prometheus(args.metrics_out)
+    print(json.dumps(counts))
+    return 0 if counts["error"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
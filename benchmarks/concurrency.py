@@ -0,0 +1,173 @@
+# benchmarks/concurrency.py
+"""
+Load test for one ContractComplianceOrchestrator shared by many threads,
+the way main.py shares it across Streamlit sessions.
+
+Every simulated analyst analyses its own synthetic contract twice on its
+own run thread. The chat model is a local fake with a fixed latency that
+answers with the contract id it was shown, so the test checks that no
+prompt mixes two contracts (agent memory, graph state) and that every
+report names its own contract and no other. It also reports wall time against
+running the same analyses one after another, and the peak number of model
+calls in flight against the LLM_MAX_CONCURRENCY limit.
+
+    python benchmarks/concurrency.py --analysts 16 --mode agent --limit 4
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-dummy-key")
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from modules import resources
+
+CONTRACT_ID = re.compile(r"\bc-\d{4}\b")
+
+
+class FakeGemini(BaseChatModel):
+    """
+    Answers after a fixed delay with an analysis naming the contract id in the prompt.
+
+    The tool call also carries the fields of a rule verdict, so the same
+    answer serves the targeted mode's per-rule checks.
+    """
+
+    latency: float = 0.05
+    mixed_prompts: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-gemini"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        ids = set(CONTRACT_ID.findall(" ".join(str(m.content) for m in messages)))
+        if len(ids) > 1:
+            self.mixed_prompts += 1
+        time.sleep(self.latency)
+        name = f"Analyst {min(ids) if ids else 'unknown'}"
+        analysis = {
+            "document_type": "Employment",
+            "parties_involved": [{"name": name, "role": "Employee"}],
+            "risk_score": {"overall_score": 20, "risk_level": "Low"}
+        }
+        verdict = {"status": "compliant", "evidence": name}
+        message = AIMessage(
+            content="Thought: I now know the final answer\nFinal Answer: " + json.dumps(analysis),
+            tool_calls=[{"name": "ComplianceAnalysis", "args": {**analysis, **verdict}, "id": "call-1"}]
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+# Takes llm_limiter slots like the pooled Gemini clients do
+LimitedFakeGemini = resources.limit_concurrency(FakeGemini)
+
+
+def write_contracts(directory: str, count: int) -> list:
+    files = []
+    for i in range(count):
+        contract_id = f"c-{i:04d}"
+        path = os.path.join(directory, f"{contract_id}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(
+                f"EMPLOYMENT AGREEMENT {contract_id}\n"
+                f"This employment agreement is between Acme Corp and employee {contract_id}. "
+                "The employee shall receive a salary of 50,000 per year. "
+                "Either party may terminate this agreement with thirty days notice. " * 20
+            )
+        files.append((contract_id, {"file_name": f"{contract_id}.txt", "file_path": path}))
+    return files
+
+
+def analyse(orchestrator, contract_id: str, file: dict, runs: int) -> list:
+    """Analyse one contract `runs` times on the analyst's own run thread"""
+    reports = []
+    for _ in range(runs):
+        reports.append(orchestrator.process_contracts([file], thread_id=f"analyst-{contract_id}"))
+    return reports
+
+
+def owners(report: dict) -> list:
+    """Contract ids named anywhere in the report: parties, cited evidence or passage excerpts"""
+    return sorted(set(CONTRACT_ID.findall(json.dumps(report))))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Concurrent analyses on one shared orchestrator")
+    parser.add_argument("--analysts", type=int, default=16)
+    parser.add_argument("--runs", type=int, default=2, help="analyses per analyst on the same run thread")
+    parser.add_argument("--mode", default="agent", choices=["agent", "direct", "chunked", "targeted"])
+    parser.add_argument("--limit", type=int, default=resources.LLM_MAX_CONCURRENCY,
+                        help="model calls in flight at once (0 = unlimited)")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake model call")
+    args = parser.parse_args()
+
+    # The rulebook path is relative to the repository root
+    os.chdir(ROOT)
+    with tempfile.TemporaryDirectory() as directory:
+        # The rule index built with fake embeddings must not touch the real one
+        os.environ["RULE_INDEX_DIR"] = os.path.join(directory, "rule_index")
+        from benchmarks.fakes import FakeEmbeddings
+        from modules.agents.orchestration_agent import ContractComplianceOrchestrator
+        from modules.agents.research_agent import ResearchAgent
+
+        fake = LimitedFakeGemini(latency=args.latency)
+        # Rule search and the targeted mode's contract passages need embeddings too
+        resources.set_model_factories(
+            chat=lambda model, temperature, timeout: fake,
+            embeddings=lambda model: FakeEmbeddings()
+        )
+        resources.set_llm_concurrency(args.limit)
+
+        files = write_contracts(directory, args.analysts)
+        orchestrator = ContractComplianceOrchestrator(ResearchAgent(), analysis_mode=args.mode)
+
+        start = time.perf_counter()
+        for contract_id, file in files[:2]:
+            analyse(orchestrator, contract_id, file, 1)
+        serial_per_run = (time.perf_counter() - start) / 2
+
+        resources.llm_limiter.peak = 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.analysts) as pool:
+            results = list(pool.map(lambda item: analyse(orchestrator, item[0], item[1], args.runs), files))
+        elapsed = time.perf_counter() - start
+        orchestrator.close()
+
+    wrong = [
+        (contract_id, owners(report))
+        for (contract_id, _), reports in zip(files, results)
+        for report in reports if owners(report) != [contract_id]
+    ]
+    runs = args.analysts * args.runs
+    print(json.dumps({
+        "mode": args.mode,
+        "analysts": args.analysts,
+        "runs": runs,
+        "concurrency_limit": args.limit or None,
+        "peak_llm_calls_in_flight": resources.llm_limiter.peak,
+        "wall_seconds": round(elapsed, 3),
+        "serial_estimate_seconds": round(serial_per_run * runs, 3),
+        "speedup": round(serial_per_run * runs / elapsed, 2),
+        "reports_for_wrong_contract": wrong,
+        "prompts_mixing_contracts": fake.mixed_prompts,
+    }, indent=2))
+    if wrong or fake.mixed_prompts or (args.limit and resources.llm_limiter.peak > args.limit):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
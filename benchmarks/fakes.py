@@ -0,0 +1,153 @@
+# benchmarks/fakes.py
+"""
+Deterministic local stand-ins for the Gemini chat and embedding clients.
+
+install() routes modules.resources to these fakes, so the whole pipeline
+(agent, structured chains, rule index, contract passages) runs without
+API keys or network access. Latency is simulated per call and per 1k
+prompt tokens, and every response reports token usage, so timings and
+token metrics behave like a real model of the configured speed.
+"""
+import hashlib
+import json
+import re
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from modules import resources
+from modules.tokens import estimate_tokens
+
+ANALYSIS = {
+    "document_type": "Service Agreement",
+    "parties_involved": [{"name": "Acme Corp", "role": "Provider"}, {"name": "Globex Inc", "role": "Client"}],
+    "compliant_items": ["Payment terms are defined"],
+    "missing_items": ["No limitation of liability clause"],
+    "risk_factors": ["Unlimited liability"],
+    "risk_score": {"overall_score": 72, "risk_level": "Medium"},
+    "shortcomings": [{"category": "COMPLIANCE_RULES", "issue": "Missing limitation of liability",
+                      "severity": "High", "points_deducted": 10}],
+}
+CHUNK_FINDINGS = {
+    "document_type": "Service Agreement",
+    "parties_involved": ANALYSIS["parties_involved"],
+    "rules_addressed": [],
+    "risk_factors": ["Unlimited liability"],
+}
+VERDICTS = ["compliant", "partial", "missing"]
+# Sections of ResearchAgent._analysis_request, passed on to the analysis tool
+REQUEST_SECTION = re.compile(
+    r"CONTRACT TEXT:\s*(?P<contract>.*?)\s*CONTRACT TYPE:.*?"
+    r"COMPLIANCE RULES TO CHECK AGAINST:\s*(?P<rules>.*?)\s*ANALYSIS REQUIREMENTS:",
+    re.DOTALL
+)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model answering every prompt with a fixed, schema-valid response.
+
+    The ReAct agent is walked through a real tool step: its first turn is an
+    analyze_contract_compliance action on the contract and rules of the
+    request, and only once an Observation is in the prompt does it give
+    the final answer.
+    """
+
+    model: str = "fake-gemini"
+    latency: float = 0.0
+    latency_per_1k_tokens: float = 0.0
+    completion_tokens: int = 200
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-gemini"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.model}
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        names = [convert_to_openai_tool(tool)["function"]["name"] for tool in tools]
+        return self.bind(fake_tools=names)
+
+    def _answer(self, prompt: str, tool: Optional[str]) -> AIMessage:
+        if tool == "RuleVerdict":
+            # Varied but reproducible verdicts, keyed on the prompt
+            status = VERDICTS[zlib.crc32(prompt.encode("utf-8")) % len(VERDICTS)]
+            args = {"status": status, "passage": "P1", "evidence": prompt[-80:],
+                    "issue": "" if status == "compliant" else "Not addressed"}
+        elif tool == "ChunkFindings":
+            args = CHUNK_FINDINGS
+        elif tool:
+            args = ANALYSIS
+        elif "Action Input:" in prompt and prompt.count("Observation:") < 2:
+            # The agent prompt's format section holds one Observation; a second is the tool's result
+            request = REQUEST_SECTION.search(prompt)
+            tool_input = {
+                "contract_text": request.group("contract") if request else prompt,
+                "rules_context": request.group("rules") if request else "",
+            }
+            return AIMessage(content="Thought: I should analyse the contract against the rules\n"
+                                     "Action: analyze_contract_compliance\n"
+                                     "Action Input: " + json.dumps(tool_input))
+        else:
+            # The agent after its tool step, and follow-up questions, get text
+            return AIMessage(content="Thought: I now know the final answer\nFinal Answer: " + json.dumps(ANALYSIS))
+        return AIMessage(content="", tool_calls=[{"name": tool, "args": args, "id": "call-0"}])
+
+    def _generate(self, messages, stop=None, run_manager=None, fake_tools: Optional[List[str]] = None, **kwargs):
+        prompt = "\n".join(str(m.content) for m in messages)
+        prompt_tokens = estimate_tokens(prompt)
+        time.sleep(self.latency + self.latency_per_1k_tokens * prompt_tokens / 1000)
+        message = self._answer(prompt, fake_tools[0] if fake_tools else None)
+        message.usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": self.completion_tokens,
+            "total_tokens": prompt_tokens + self.completion_tokens,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class FakeEmbeddings(Embeddings):
+    """Hashed bag-of-words vectors: similar texts get similar vectors, with no model"""
+
+    def __init__(self, dimensions: int = 256, latency: float = 0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in text.lower().split():
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._vector(text)
+
+
+def install(chat_latency: float = 0.0, latency_per_1k_tokens: float = 0.0, completion_tokens: int = 200,
+            embedding_latency: float = 0.0, dimensions: int = 256) -> None:
+    """Make modules.resources hand out the fakes instead of the Gemini clients"""
+    chat_class = resources.limit_concurrency(FakeChatModel)
+    resources.set_model_factories(
+        chat=lambda model, temperature, timeout: chat_class(
+            model=model.split("/")[-1], latency=chat_latency, latency_per_1k_tokens=latency_per_1k_tokens,
+            completion_tokens=completion_tokens
+        ),
+        embeddings=lambda model: FakeEmbeddings(dimensions=dimensions, latency=embedding_latency),
+    )
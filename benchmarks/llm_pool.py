@@ -0,0 +1,71 @@
+# benchmarks/llm_pool.py
+"""
+Per-call cost of building a fresh Gemini client and prompt versus taking
+a pooled chain from modules.resources. No requests are sent, so this only
+needs a (dummy) GOOGLE_API_KEY.
+
+    python benchmarks/llm_pool.py --calls 200 --threads 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-dummy-key")
+
+from langchain_core.prompts import PromptTemplate
+from langchain_google_genai import ChatGoogleGenerativeAI
+from modules import resources
+from modules.tools.contract_analyzer_tool import ANALYSIS_PROMPT
+
+
+def fresh_chain():
+    """What analyze_contract_compliance used to do on every call"""
+    llm = ChatGoogleGenerativeAI(
+        model="gemini-1.5-flash",
+        temperature=0,
+        google_api_key=os.getenv("GOOGLE_API_KEY")
+    )
+    prompt = PromptTemplate(
+        template=ANALYSIS_PROMPT.template,
+        input_variables=["contract_text", "rules_context"]
+    )
+    return prompt | llm
+
+
+def pooled_chain():
+    return resources.get_chain("contract_analysis", ANALYSIS_PROMPT, "gemini-1.5-flash", temperature=0)
+
+
+def run(factory, calls: int, threads: int) -> dict:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        chains = list(pool.map(lambda _: factory(), range(calls)))
+    elapsed = time.perf_counter() - start
+    return {
+        "calls": calls,
+        "distinct_clients": len({id(chain.last) for chain in chains}),
+        "total_ms": round(elapsed * 1000, 2),
+        "per_call_us": round(elapsed / calls * 1e6, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pooled vs per-call LLM client construction")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--pool-size", type=int, default=resources.LLM_POOL_SIZE)
+    args = parser.parse_args()
+
+    resources.configure_llm_pool(size=args.pool_size)
+    print(json.dumps({
+        "fresh": run(fresh_chain, args.calls, args.threads),
+        "pooled": run(pooled_chain, args.calls, args.threads),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# benchmarks/offline.py
+"""
+Offline benchmark suite: no API keys or network needed.
+
+The Gemini chat and embedding clients are replaced by the deterministic
+fakes in benchmarks/fakes.py (with simulated latency and token counts), and
+synthetic contracts of several sizes are generated from the text of
+sample_data/AmazonContract.0.pdf with varied party names and amounts.
+
+Two suites, both reported as JSON:
+
+- pipeline: ContractComplianceOrchestrator.process_contracts per analysis
+  mode and contract size. It reports throughput and the p50/p95 latency of
+  each run, plus model calls and tokens per run.
+- micro: DocumentProcessor text extraction (PDF and TXT), chunking and
+  metadata extraction, and ContractIndex passage splitting.
+
+Pass --baseline with an earlier --out file to print the change of every
+timing against it.
+
+    python benchmarks/offline.py --out bench.json
+    python benchmarks/offline.py --modes direct targeted --sizes 2000 20000 --baseline bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+SAMPLE_PDF = os.path.join(ROOT, "sample_data", "AmazonContract.0.pdf")
+
+PARTIES = ["Acme Corp", "Globex Inc", "Initech LLC", "Umbrella Ltd", "Stark Industries", "Wayne Enterprises"]
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "n": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(pick(0.50) * 1000, 3),
+        "p95_ms": round(pick(0.95) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def timed(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def synthetic_contract(template: str, words: int, seed: int) -> str:
+    """About `words` words of template text with its own parties, amounts and id"""
+    rng = random.Random(seed)
+    first, second = rng.sample(PARTIES, 2)
+    header = (
+        f"SERVICE AGREEMENT No. {seed:05d}\n"
+        f"This agreement is made between {first} and {second} on {rng.randint(1, 28)}/"
+        f"{rng.randint(1, 12)}/20{rng.randint(20, 29)}. The total fee is ${rng.randint(1, 900) * 1000:,}.\n"
+    )
+    body = template.split()
+    out, i = [], rng.randrange(len(body))
+    while len(out) < words:
+        out.append(body[i % len(body)])
+        i += 1
+    return header + " ".join(out)
+
+
+def write_contracts(directory: str, template: str, words: int, count: int, seed: int) -> List[Dict[str, str]]:
+    files = []
+    for i in range(count):
+        path = os.path.join(directory, f"contract-{words}-{seed + i}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(synthetic_contract(template, words, seed + i))
+        files.append({"file_name": os.path.basename(path), "file_path": path})
+    return files
+
+
+def pipeline_suite(args, template: str, directory: str) -> Dict[str, Dict]:
+    from modules.agents.orchestration_agent import ContractComplianceOrchestrator
+    from modules.agents.research_agent import ResearchAgent
+
+    results = {}
+    for mode in args.modes:
+        orchestrator = ContractComplianceOrchestrator(ResearchAgent(), analysis_mode=mode)
+        # First run builds the rule index and warms the pooled clients
+        orchestrator.process_contracts(write_contracts(directory, template, 200, 1, 99999)[:1])
+        for words in args.sizes:
+            files = write_contracts(directory, template, words, args.runs, seed=words)
+            calls, tokens = [], []
+
+            def run(file):
+                start = time.perf_counter()
+                orchestrator.process_contracts([file])
+                record = orchestrator.last_run_metrics
+                calls.append(orchestrator.last_run_llm_calls)
+                tokens.append(sum(s["prompt_tokens"] + s["completion_tokens"] for s in record["llm"].values()))
+                return time.perf_counter() - start
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                latencies = list(pool.map(run, files))
+            wall = time.perf_counter() - start
+            results[f"{mode}/{words}w"] = {
+                **percentiles(latencies),
+                "throughput_per_s": round(len(files) / wall, 3),
+                "llm_calls_per_run": round(statistics.fmean(calls), 2),
+                "tokens_per_run": round(statistics.fmean(tokens), 1),
+            }
+        orchestrator.close()
+    return results
+
+
+def micro_suite(args, template: str, directory: str) -> Dict[str, Dict]:
+    from modules.agents.document_processor import DocumentProcessor
+    from modules.contract_index import ContractIndex
+
+    processor = DocumentProcessor()
+    results = {"extract/pdf": timed(lambda: processor.process_file(SAMPLE_PDF), args.repeat)}
+    for words in args.sizes:
+        path = write_contracts(directory, template, words, 1, seed=words)[0]["file_path"]
+        text = synthetic_contract(template, words, words)
+        results[f"extract/txt/{words}w"] = timed(lambda: processor.process_file(path), args.repeat)
+        results[f"chunk/{words}w"] = timed(lambda: processor.chunk_document(text), args.repeat)
+        results[f"metadata/{words}w"] = timed(lambda: processor.extract_metadata(text), args.repeat)
+        results[f"passages/{words}w"] = timed(lambda: ContractIndex.split(text), args.repeat)
+    return results
+
+
+def compare(current: Dict, baseline: Dict) -> Dict[str, Dict[str, float]]:
+    """p50 change in percent for every timing present in both runs (positive = slower)"""
+    changes = {}
+    for suite in ("pipeline", "micro"):
+        for name, stats in current.get(suite, {}).items():
+            before = baseline.get(suite, {}).get(name)
+            if before and before.get("p50_ms"):
+                changes[f"{suite}/{name}"] = {
+                    "p50_ms": stats["p50_ms"],
+                    "baseline_p50_ms": before["p50_ms"],
+                    "change_pct": round((stats["p50_ms"] / before["p50_ms"] - 1) * 100, 1),
+                }
+    return changes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline pipeline and document-processing benchmarks")
+    parser.add_argument("--suite", choices=["all", "pipeline", "micro"], default="all")
+    parser.add_argument("--modes", nargs="+", default=["direct", "chunked", "targeted", "agent"])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 5000, 20000], help="contract sizes in words")
+    parser.add_argument("--runs", type=int, default=20, help="contracts analysed per mode and size")
+    parser.add_argument("--concurrency", type=int, default=4, help="analyses run at once")
+    parser.add_argument("--repeat", type=int, default=20, help="repetitions per micro-benchmark")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="simulated seconds per model call")
+    parser.add_argument("--llm-latency-per-1k", type=float, default=0.02,
+                        help="extra simulated seconds per 1k prompt tokens")
+    parser.add_argument("--completion-tokens", type=int, default=300)
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="simulated seconds per embedding call")
+    parser.add_argument("--out", help="also write the results to this JSON file")
+    parser.add_argument("--baseline", help="earlier --out file to compare against")
+    args = parser.parse_args()
+
+    out = os.path.abspath(args.out) if args.out else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    # The rulebook path is relative to the repository root
+    os.chdir(ROOT)
+    with tempfile.TemporaryDirectory() as directory:
+        # The rule index built with fake embeddings must not touch the real one
+        os.environ["RULE_INDEX_DIR"] = os.path.join(directory, "rule_index")
+        os.environ.setdefault("GOOGLE_API_KEY", "benchmark-dummy-key")
+        from benchmarks import fakes
+        from modules.agents.document_processor import DocumentProcessor
+
+        fakes.install(
+            chat_latency=args.llm_latency, latency_per_1k_tokens=args.llm_latency_per_1k,
+            completion_tokens=args.completion_tokens, embedding_latency=args.embedding_latency
+        )
+        template = DocumentProcessor().extract_text(SAMPLE_PDF)
+
+        results = {
+            "python": platform.python_version(),
+            "settings": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        }
+        if args.suite in ("all", "micro"):
+            results["micro"] = micro_suite(args, template, directory)
+        if args.suite in ("all", "pipeline"):
+            results["pipeline"] = pipeline_suite(args, template, directory)
+
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            results["vs_baseline"] = compare(results, json.load(f))
+    output = json.dumps(results, indent=2)
+    print(output)
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
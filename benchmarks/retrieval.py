@@ -0,0 +1,95 @@
+# benchmarks/retrieval.py
+"""
+Latency of compliance rule retrieval per embedding backend.
+
+For every backend the rule index is built in a temporary directory, then
+the rule retriever behind check_compliance_rules is queried twice with the
+same set of queries: the first pass embeds every query (new queries), the
+second is answered from the query-embedding cache (repeated queries).
+"embed" times the query embedding alone, "search" the whole retrieval.
+
+    python benchmarks/retrieval.py --backends hashing local
+    python benchmarks/retrieval.py --backends google   # needs GOOGLE_API_KEY
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.offline import percentiles  # noqa: E402
+
+CONTRACT_TYPES = [
+    "employment", "service agreement", "non-disclosure agreement", "lease", "software license",
+    "consulting", "supply agreement", "franchise", "partnership", "loan agreement",
+]
+
+
+def queries(count: int) -> List[str]:
+    return [
+        f"Retrieve compliance rules for {CONTRACT_TYPES[i % len(CONTRACT_TYPES)]}"
+        + (f" (variant {i // len(CONTRACT_TYPES)})" if i >= len(CONTRACT_TYPES) else "")
+        for i in range(count)
+    ]
+
+
+def timed_pass(fn, items: List[str]) -> List[float]:
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_backend(backend: str, args, directory: str) -> Dict[str, Dict]:
+    from modules import vector_store
+
+    start = time.perf_counter()
+    # Built the same way as resources.get_rule_retriever, in a throwaway directory
+    embeddings = vector_store.make_embeddings(backend)
+    store = vector_store.build_rule_index(
+        persist_directory=os.path.join(directory, backend), embedding=embeddings,
+        collection_name=vector_store.rule_collection_name(backend)
+    )
+    retriever = store.as_retriever(search_kwargs={"k": 2})
+    build_seconds = time.perf_counter() - start
+    items = queries(args.queries)
+
+    results = {"build_index_s": round(build_seconds, 3)}
+    results["embed/new"] = percentiles(timed_pass(embeddings.embed_query, items))
+    results["embed/repeated"] = percentiles(timed_pass(embeddings.embed_query, items))
+    embeddings.clear()
+    results["search/new"] = percentiles(timed_pass(retriever.invoke, items))
+    results["search/repeated"] = percentiles(timed_pass(retriever.invoke, items * args.repeat))
+    results["query_cache"] = embeddings.cache_info()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rule retrieval latency per embedding backend")
+    parser.add_argument("--backends", nargs="+", default=["hashing"], choices=["google", "local", "hashing"])
+    parser.add_argument("--queries", type=int, default=50, help="distinct queries per pass")
+    parser.add_argument("--repeat", type=int, default=5, help="passes over the repeated queries")
+    args = parser.parse_args()
+
+    # The rulebook path is relative to the repository root
+    os.chdir(ROOT)
+    results = {"python": platform.python_version(), "settings": vars(args)}
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in args.backends:
+            try:
+                results[backend] = bench_backend(backend, args, directory)
+            except ImportError as e:
+                results[backend] = {"skipped": str(e)}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
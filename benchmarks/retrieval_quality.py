@@ -0,0 +1,99 @@
+# benchmarks/retrieval_quality.py
+"""
+Retrieval quality of the rule retriever for the contract types in rules.txt.
+
+Every `CONTRACT TYPE` block of the rulebook is queried by its name, each of
+its aliases and the "Retrieve compliance rules for <type>" phrasing the
+orchestrator uses. Results are scored against the block's character span
+in the rulebook:
+
+- top1: the first passage comes from the right block
+- recall: share of the block's text covered by the returned passages
+- precision: share of the returned text (duplicates counted again) that
+  belongs to the block
+- tokens: estimated prompt tokens of the returned text
+
+The plain vector retriever is compared with the hybrid BM25 + vector
+retriever at several k. The default hashing backend runs offline; use
+--backend google (with GOOGLE_API_KEY) or local for real embeddings.
+
+    python benchmarks/retrieval_quality.py --k 1 2 4
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def rule_blocks(text: str) -> List[Tuple[str, List[str], int, int]]:
+    """(name, aliases, start, end) of every rule block in the rulebook text"""
+    from modules.rulebook import Rulebook, block_spans
+    blocks = Rulebook.parse(text).blocks
+    return [(block.name, block.aliases, start, end) for block, (_, start, end) in zip(blocks, block_spans(text))]
+
+
+def score(docs, start: int, end: int) -> Dict[str, float]:
+    from modules.tokens import estimate_tokens
+    covered, returned, relevant = set(), 0, 0
+    for doc in docs:
+        doc_start = doc.metadata.get("start_index", -1)
+        doc_end = doc_start + len(doc.page_content)
+        inside = max(0, min(end, doc_end) - max(start, doc_start))
+        covered.update(range(max(start, doc_start), max(start, doc_start) + inside))
+        returned += len(doc.page_content)
+        relevant += inside
+    first = docs[0].metadata.get("start_index", -1) if docs else -1
+    return {
+        "top1": float(bool(docs) and start <= first + len(docs[0].page_content) // 2 < end),
+        "recall": len(covered) / (end - start),
+        "precision": relevant / returned if returned else 0.0,
+        "tokens": float(sum(estimate_tokens(doc.page_content) for doc in docs)),
+    }
+
+
+def evaluate(retrieve, queries: List[Tuple[str, int, int]]) -> Dict[str, float]:
+    scores = [score(retrieve(query), start, end) for query, start, end in queries]
+    return {key: round(statistics.fmean(s[key] for s in scores), 3) for key in scores[0]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rule retrieval quality: vector-only against hybrid")
+    parser.add_argument("--backend", default="hashing", choices=["google", "local", "hashing"])
+    parser.add_argument("--k", nargs="+", type=int, default=[1, 2, 4])
+    args = parser.parse_args()
+
+    # The rulebook path is relative to the repository root
+    os.chdir(ROOT)
+    from modules import vector_store
+    from modules.rule_search import HybridRuleRetriever
+    from modules.rulebook import RULES_PATH
+
+    with open(RULES_PATH, encoding="utf-8") as f:
+        rules_text = f.read()
+    queries = []
+    for name, aliases, start, end in rule_blocks(rules_text):
+        for query in [name, *aliases, f"Retrieve compliance rules for {name.lower()}"]:
+            queries.append((query, start, end))
+
+    with tempfile.TemporaryDirectory() as directory:
+        embeddings = vector_store.make_embeddings(args.backend)
+        store = vector_store.build_rule_index(
+            persist_directory=directory, embedding=embeddings,
+            collection_name=vector_store.rule_collection_name(args.backend)
+        )
+        hybrid = HybridRuleRetriever.from_chunks(store, list(vector_store.unique_rule_chunks().values()))
+        results = {"backend": args.backend, "queries": len(queries)}
+        for k in args.k:
+            results[f"vector/k={k}"] = evaluate(lambda q: store.similarity_search(q, k=k), queries)
+            results[f"hybrid/k={k}"] = evaluate(lambda q: hybrid.invoke(q, k=k), queries)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
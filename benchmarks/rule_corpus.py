@@ -0,0 +1,141 @@
+# benchmarks/rule_corpus.py
+"""
+Rule retrieval latency as the rule corpus grows.
+
+For every size a synthetic multi-jurisdiction corpus is written as a
+.jsonl rule file next to a copy of sample_data/rules.txt, ingested with
+build_rule_index (hashing embeddings, so no network) and queried through
+the hybrid retriever:
+
+- unfiltered: the whole corpus is searched
+- filtered: contract type and jurisdiction filters, which select the
+  matching partitions before either index ranks anything
+
+The filtered slice has about the same size at every corpus size, so its
+latency should stay flat while the unfiltered search grows.
+
+    python benchmarks/rule_corpus.py --sizes 10000 100000
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.offline import percentiles  # noqa: E402
+
+CONTRACT_TYPES = [
+    "Employment", "Non-Disclosure", "Service", "Lease", "Purchase", "Loan", "License", "Franchise",
+    "Partnership", "Distribution", "Supply", "Consulting", "Data Processing", "Agency", "Construction",
+    "Insurance", "Joint Venture", "Shareholder", "Settlement", "Subscription",
+]
+SUBJECTS = [
+    "termination notice", "payment terms", "liability cap", "indemnification", "confidential information",
+    "governing law", "dispute resolution", "data protection", "intellectual property", "force majeure",
+    "warranty period", "audit rights", "assignment", "renewal", "non-compete", "insurance coverage",
+]
+REQUIREMENTS = [
+    "must be stated in writing", "must not exceed the statutory maximum", "must be disclosed before signing",
+    "must name the responsible party", "must specify a deadline", "must comply with local regulations",
+    "should be reviewed annually", "must be approved by both parties",
+]
+RISK_LEVELS = ["Low", "Medium", "High"]
+
+
+def jurisdictions(count: int) -> List[str]:
+    return [f"J-{i:03d}" for i in range(count)]
+
+
+def write_corpus(path: str, size: int, places: List[str], seed: int = 7) -> None:
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(size):
+            contract_type, place = rng.choice(CONTRACT_TYPES), rng.choice(places)
+            subject, requirement = rng.choice(SUBJECTS), rng.choice(REQUIREMENTS)
+            f.write(json.dumps({
+                "text": f"{contract_type} contracts in {place}: the {subject} clause {requirement} (rule {i}).",
+                "contract_type": contract_type,
+                "jurisdiction": place,
+                "risk_level": rng.choice(RISK_LEVELS),
+                "regulatory_reference": f"{place} Code s.{rng.randint(1, 999)}",
+            }) + "\n")
+
+
+def bench_size(size: int, args, directory: str) -> Dict[str, Dict]:
+    from modules import vector_store
+    from modules.rule_search import HybridRuleRetriever
+
+    rules = os.path.join(directory, f"rules-{size}")
+    os.makedirs(rules)
+    shutil.copy(os.path.join(ROOT, "sample_data", "rules.txt"), rules)
+    # Jurisdictions grow with the corpus, so each one keeps about the same number of rules
+    places = jurisdictions(max(1, size // args.rules_per_jurisdiction))
+    write_corpus(os.path.join(rules, "corpus.jsonl"), size, places)
+
+    start = time.perf_counter()
+    embeddings = vector_store.make_embeddings("hashing")
+    store = vector_store.build_rule_index(
+        rules_path=rules, persist_directory=os.path.join(directory, f"index-{size}"), embedding=embeddings
+    )
+    ingest = time.perf_counter() - start
+    start = time.perf_counter()
+    retriever = HybridRuleRetriever.from_chunks(store, list(vector_store.unique_rule_chunks(rules).values()))
+    keyword_index = time.perf_counter() - start
+
+    rng = random.Random(size)
+    queries = [
+        (f"{rng.choice(SUBJECTS)} {rng.choice(REQUIREMENTS)}", rng.choice(CONTRACT_TYPES), rng.choice(places))
+        for _ in range(args.queries)
+    ]
+
+    def run(filtered: bool) -> Dict[str, float]:
+        samples = []
+        for query, contract_type, place in queries:
+            filters = vector_store.rule_filter(contract_type, place) if filtered else None
+            start = time.perf_counter()
+            retriever.invoke(query, filter=filters)
+            samples.append(time.perf_counter() - start)
+        return percentiles(samples)
+
+    filters = vector_store.rule_filter(*queries[0][1:])
+    return {
+        "rules": size,
+        "jurisdictions": len(places),
+        "ingest_s": round(ingest, 2),
+        "keyword_index_s": round(keyword_index, 2),
+        "filtered_slice": sum(
+            1 for doc in retriever.chunks
+            if all(doc.metadata[f] in vector_store.accepted_values(f, v) for f, v in filters.items())
+        ),
+        "unfiltered": run(False),
+        "filtered": run(True),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rule retrieval latency against corpus size")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10000, 100000])
+    parser.add_argument("--rules-per-jurisdiction", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--dimensions", type=int, default=256, help="hashing embedding size")
+    args = parser.parse_args()
+
+    # Read by modules.vector_store at import
+    os.environ["HASHING_DIMENSIONS"] = str(args.dimensions)
+    results = {"python": platform.python_version(), "settings": vars(args)}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            results[f"{size}"] = bench_size(size, args, directory)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# benchmarks/startup.py
+"""
+Startup budget for the app and the orchestrator.
+
+Runs each import target in a fresh interpreter with ``-X importtime``,
+reports the total import time and the slowest top-level packages, then
+times building a ResearchAgent and ContractComplianceOrchestrator. Exits
+non-zero when a measurement fails or exceeds its budget.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --budget-ms 1500 --json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_TARGETS = {
+    "orchestrator": "import modules.agents.orchestration_agent",
+    "main": "import main",
+}
+
+CONSTRUCT_SNIPPET = """
+import time
+start = time.perf_counter()
+from modules.agents.research_agent import ResearchAgent
+from modules.agents.orchestration_agent import ContractComplianceOrchestrator
+imported = time.perf_counter()
+ContractComplianceOrchestrator(ResearchAgent())
+built = time.perf_counter()
+print((imported - start) * 1000, (built - imported) * 1000)
+"""
+
+
+def _run(code: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", code]
+    return subprocess.run(cmd, cwd=REPO_ROOT, capture_output=True, text=True)
+
+
+def parse_importtime(stderr: str) -> Dict[str, float]:
+    """Import time in ms attributed to each top-level package (self time)"""
+    per_package: Dict[str, float] = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, _, rest = line.partition(":")
+        self_us, _cumulative_us, name = rest.split("|")
+        per_package[name.strip().split(".")[0]] += int(self_us) / 1000
+    return dict(per_package)
+
+
+def measure_import(target: str) -> Dict:
+    proc = _run(IMPORT_TARGETS[target], importtime=True)
+    packages = parse_importtime(proc.stderr)
+    slowest = sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:10]
+    return {
+        "target": target,
+        "ok": proc.returncode == 0,
+        "total_ms": round(sum(packages.values()), 1),
+        "slowest": [{"package": name, "ms": round(ms, 1)} for name, ms in slowest],
+    }
+
+
+def measure_construction() -> Dict:
+    proc = _run(CONSTRUCT_SNIPPET)
+    if proc.returncode != 0:
+        return {"ok": False, "error": proc.stderr.strip().splitlines()[-1:]}
+    import_ms, build_ms = (float(v) for v in proc.stdout.split()[-2:])
+    return {"ok": True, "import_ms": round(import_ms, 1), "construct_ms": round(build_ms, 1)}
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--budget-ms", type=float, default=3000,
+                        help="Maximum import time per target in milliseconds")
+    parser.add_argument("--construct-budget-ms", type=float, default=100,
+                        help="Maximum time to build the agent and orchestrator")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = {
+        "imports": [measure_import(target) for target in IMPORT_TARGETS],
+        "construction": measure_construction(),
+    }
+
+    over_budget = [r["target"] for r in report["imports"] if r["total_ms"] > args.budget_ms]
+    construction = report["construction"]
+    if construction.get("ok") and construction["construct_ms"] > args.construct_budget_ms:
+        over_budget.append("construction")
+    report["over_budget"] = over_budget
+    # A target that cannot even be imported or built fails the gate as well
+    failed = [r["target"] for r in report["imports"] if not r["ok"]]
+    if not construction.get("ok"):
+        failed.append("construction")
+    report["failed"] = failed
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for r in report["imports"]:
+            status = "" if r["ok"] else " (import failed)"
+            print(f"{r['target']}: {r['total_ms']} ms (budget {args.budget_ms} ms){status}")
+            for entry in r["slowest"]:
+                print(f"    {entry['package']:<30} {entry['ms']:>8} ms")
+        print(f"construction: {construction}")
+        if over_budget:
+            print(f"OVER BUDGET: {', '.join(over_budget)}")
+        if failed:
+            print(f"FAILED: {', '.join(failed)}")
+
+    return 1 if over_budget or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
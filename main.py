@@ -2,11 +2,13 @@ import streamlit as st
 import tempfile
 import os
 from typing import List, Dict, Any
-from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
 import uuid
 # Import your orchestrator and research agent
 from modules.agents.research_agent import ResearchAgent
 from modules.agents.orchestration_agent import ContractComplianceOrchestrator
+from modules.result_cache import AnalysisCache
+from modules.extraction_cache import ExtractionCache
+from modules.checkpoints import DEFAULT_CHECKPOINT_PATH
 
 # Set page config
 st.set_page_config(page_title="Contract Compliance Analysis", layout="wide")
@@ -19,10 +21,17 @@ def save_uploaded_file(uploaded_file) -> str:
         f.write(uploaded_file.getbuffer())
     return file_path
 
+# One orchestrator serves every browser session: runs are isolated by their
+# checkpoint thread and model calls are capped by LLM_MAX_CONCURRENCY
 @st.cache_resource(show_spinner=False)
 def get_orchestrator() -> ContractComplianceOrchestrator:
     research_agent = ResearchAgent()
-    orchestrator = ContractComplianceOrchestrator(research_agent)
+    orchestrator = ContractComplianceOrchestrator(
+        research_agent,
+        result_cache=AnalysisCache(),
+        extraction_cache=ExtractionCache(),
+        checkpoint_path=DEFAULT_CHECKPOINT_PATH
+    )
     return orchestrator
 
 def main():
@@ -30,15 +39,20 @@ def main():
 
     orchestrator = get_orchestrator()
     if "thread_id" not in st.session_state:
-        st.session_state.thread_id = str(uuid.uuid4())
-    config = {"configurable": {"thread_id": st.session_state.thread_id}}
+        # The run id is kept in the URL, so a reload (or an app restart) shows
+        # the report from the checkpoint database instead of re-analysing
+        st.session_state.thread_id = st.query_params.get("run") or str(uuid.uuid4())
 
     if "uploaded_files" not in st.session_state:
         st.session_state.uploaded_files = []
     if "final_report" not in st.session_state:
         st.session_state.final_report = None
-    if "chat_history" not in st.session_state:  # We'll store messages as langchain messages, starting empty
+        if "run" in st.query_params:
+            st.session_state.final_report = orchestrator.get_report(st.session_state.thread_id)
+    if "chat_history" not in st.session_state:  # (role, text) pairs shown in the chat
         st.session_state.chat_history = []
+        if "run" in st.query_params:
+            st.session_state.chat_history = orchestrator.get_followups(st.session_state.thread_id)
 
     st.header("1️⃣ Upload Contract Files (PDF, DOCX, TXT)")
     uploaded_files = st.file_uploader(
@@ -60,59 +74,61 @@ def main():
         st.success(f"{len(uploaded_files)} file(s) uploaded and saved!")
 
     if st.session_state.uploaded_files and st.button("Analyze Contracts"):
-        with st.spinner("Analyzing contract(s), please wait..."):
-            report = orchestrator.process_contracts(st.session_state.uploaded_files)
-            st.session_state.final_report = report
+        # Every analysis gets its own checkpoint thread
+        st.session_state.thread_id = str(uuid.uuid4())
+        st.query_params["run"] = st.session_state.thread_id
+        with st.status("Analyzing contract(s)...", expanded=True) as status:
+            # Model output is shown as it is generated, progress as each step finishes
+            output = st.empty()
+            text = ""
+            for event in orchestrator.stream_contracts(
+                st.session_state.uploaded_files, thread_id=st.session_state.thread_id
+            ):
+                if event["type"] == "progress":
+                    st.write(f"{event['message']} ({event['elapsed']:.1f}s)")
+                elif event["type"] == "token":
+                    text += event["content"]
+                    output.code(text[-2000:], language=None)
+                else:
+                    st.session_state.final_report = event["report"]
+                    timing = event["timing"]
+            output.empty()
             st.session_state.chat_history.clear()
+            status.update(label=f"Analysis complete in {timing['total_seconds']:.1f}s", state="complete", expanded=False)
         st.success("Analysis complete! Scroll down to view results and ask questions.")
 
     # Show Analysis Report
     if st.session_state.final_report:
         st.header("2️⃣ Compliance Analysis Report")
         st.json(st.session_state.final_report)
+        if orchestrator.last_run_metrics.get("run_id") == st.session_state.thread_id:
+            with st.expander("Run metrics"):
+                st.json({k: v for k, v in orchestrator.last_run_metrics.items() if k != "spans"})
 
         st.header("3️⃣ Ask Questions About the Report")
 
-        # Collect user question
-        user_question = st.text_input("Enter a question about the report and hit Enter:")
+        # Earlier questions and answers of this run
+        for role, content in st.session_state.chat_history:
+            with st.chat_message(role):
+                st.markdown(content)
 
-        if user_question:
-            # Append user question as HumanMessage
-            st.session_state.chat_history.append(HumanMessage(content=user_question))
-
-            with st.spinner("Generating answer..."):
-                # Update state messages with new user question
-                # Our orchestrator expects the chat_interface node to process these messages
-                last_state = {
-                    "uploaded_files": st.session_state.uploaded_files,
-                    "processed_documents": [],
-                    "contract_type": st.session_state.final_report.get("contract_analysis", {}).get("document_type", "General"),
-                    "extracted_text": None,
-                    "compliance_rules": None,
-                    "analysis_results": st.session_state.final_report.get("contract_analysis"),
-                    "final_report": st.session_state.final_report,
-                    "messages": st.session_state.chat_history,
-                    "current_step": "ask_followup",
-                    "processing_complete": True
-                }
-
-                # Run just the chat_interface node via a graph invoke trick
-                # Note: This assumes you can directly access the graph nodes; else create a method in orchestrator
-                updated_state = orchestrator.graph.invoke(last_state, config=config)
-
-                # Extract the ToolMessage response
-                response_msgs = [m for m in updated_state["messages"] if isinstance(m, ToolMessage)]
-                if response_msgs:
-                    reply = response_msgs[-1].content
-                else:
-                    reply = "Sorry, I could not generate an answer to that question."
+        user_question = st.chat_input("Ask a question about the report")
 
-                # Append bot response to history
-                st.session_state.chat_history.append(
-                    ToolMessage(tool_call_id="", name="ResearchAgent", content=reply)
-                )
-
-            st.markdown(f"**Answer:** {reply}")
+        if user_question:
+            with st.chat_message("user"):
+                st.markdown(user_question)
+            # Answered from the run's checkpointed report and contract text in
+            # one model call, streamed as it is generated
+            with st.chat_message("assistant"):
+                try:
+                    reply = st.write_stream(
+                        orchestrator.stream_answer(st.session_state.thread_id, user_question)
+                    )
+                except Exception as e:
+                    reply = f"Sorry, I could not generate an answer to that question: {e}"
+                    st.markdown(reply)
+            st.session_state.chat_history.append(("user", user_question))
+            st.session_state.chat_history.append(("assistant", reply))
 
 if __name__ == "__main__":
    
@@ -1,43 +1,98 @@
 import PyPDF2
 import docx
-from typing import List, Dict, Optional
-import re
+from typing import List, Dict, Optional, Iterator, Tuple
+from itertools import islice
 from pathlib import Path
+from modules.extraction_cache import ExtractionCache
+from modules.agents.metadata_engine import DEFAULT_ENGINE, MetadataEngine
 
 class DocumentProcessor:
-    def __init__(self):
+    def __init__(self, cache: Optional[ExtractionCache] = None,
+                 metadata_engine: MetadataEngine = DEFAULT_ENGINE):
         self.supported_formats = ['.pdf', '.docx', '.txt']
+        self.cache = cache
+        self.metadata_engine = metadata_engine
+
+    def process_file(self, file_path: str) -> Dict:
+        """Extracted text and metadata, served from the extraction cache when possible"""
+        digest = None
+        if self.cache is not None:
+            digest = self.cache.file_digest(file_path)
+            entry = self.cache.get(digest)
+            if entry is not None:
+                return entry
+
+        text = self.extract_text(file_path)
+        entry = {"text": text, "metadata": self.extract_metadata(text)}
+        if digest is not None:
+            self.cache.put(digest, entry)
+        return entry
          
-    def extract_text(self, file_path: str) -> str:
-        """Extract text from various document formats"""
+    def extract_text(self, file_path: str, max_pages: Optional[int] = None,
+                     max_chars: Optional[int] = None) -> str:
+        """
+        Extract text from various document formats.
+
+        max_pages and max_chars stop parsing early once the budget is reached.
+        """
+        parts = []
+        remaining = max_chars
+        for _, text in self.iter_pages(file_path, max_pages=max_pages):
+            if remaining is not None:
+                text = text[:remaining]
+                remaining -= len(text)
+            parts.append(text)
+            if remaining is not None and remaining <= 0:
+                break
+        return "".join(parts)
+
+    def iter_pages(self, file_path: str, max_pages: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        """
+        Yield (number, text) units as the document is parsed.
+
+        Units are pages for PDF, paragraphs for DOCX and lines for TXT, each
+        with its trailing newline, so joining them gives the full text.
+        """
         file_path = Path(file_path)
-        
+
         if file_path.suffix.lower() == '.pdf':
-            return self._extract_from_pdf(file_path)
+            units = self._iter_pdf(file_path)
         elif file_path.suffix.lower() == '.docx':
-            return self._extract_from_docx(file_path)
+            units = self._iter_docx(file_path)
         elif file_path.suffix.lower() == '.txt':
-            return self._extract_from_txt(file_path)
+            units = self._iter_txt(file_path)
         else:
             raise ValueError(f"Unsupported file format: {file_path.suffix}")
-    
-    def _extract_from_pdf(self, file_path: Path) -> str:
-        """Extract text from PDF files"""
-        text = ""
+
+        return units if max_pages is None else islice(units, max_pages)
+
+    def _iter_pdf(self, file_path: Path) -> Iterator[Tuple[int, str]]:
+        """Pages of a PDF, parsed one at a time"""
         with open(file_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        return text
-    
+            for number, page in enumerate(pdf_reader.pages, 1):
+                yield number, page.extract_text() + "\n"
+
+    def _iter_docx(self, file_path: Path) -> Iterator[Tuple[int, str]]:
+        """Paragraphs of a Word document"""
+        doc = docx.Document(file_path)
+        for number, paragraph in enumerate(doc.paragraphs, 1):
+            yield number, paragraph.text + "\n"
+
+    def _iter_txt(self, file_path: Path) -> Iterator[Tuple[int, str]]:
+        """Lines of a plain text file"""
+        with open(file_path, 'r', encoding='utf-8') as file:
+            for number, line in enumerate(file, 1):
+                yield number, line
+
+    def _extract_from_pdf(self, file_path: Path) -> str:
+        """Extract text from PDF files"""
+        return "".join(text for _, text in self._iter_pdf(file_path))
+
     def _extract_from_docx(self, file_path: Path) -> str:
         """Extract text from Word documents"""
-        doc = docx.Document(file_path)
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text
-    
+        return "".join(text for _, text in self._iter_docx(file_path))
+
     def _extract_from_txt(self, file_path: Path) -> str:
         """Extract text from plain text files"""
         with open(file_path, 'r', encoding='utf-8') as file:
@@ -58,62 +113,35 @@ class DocumentProcessor:
         return chunks
     
     def extract_metadata(self, text: str) -> Dict:
-        """Extract basic metadata from contract text"""
-        metadata = {
-            'word_count': len(text.split()),
-            'char_count': len(text),
-            'parties': self._extract_parties(text),
-            'dates': self._extract_dates(text),
-            'contract_type': self._identify_contract_type(text)
-        }
-        return metadata
+        """Extract basic metadata (plus contract-type keyword positions) from contract text"""
+        return self.metadata_engine.extract(text)
     
     def _extract_parties(self, text: str) -> List[str]:
         """Extract party names from contract"""
-        # Simple regex patterns for common party indicators
-        patterns = [
-            r'between\s+([A-Z][a-zA-Z\s&,\.]+?)\s+and\s+([A-Z][a-zA-Z\s&,\.]+?)(?:\s|,|\.|;)',
-            r'Party\s+(?:A|1):\s*([A-Z][a-zA-Z\s&,\.]+?)(?:\n|Party)',
-            r'Party\s+(?:B|2):\s*([A-Z][a-zA-Z\s&,\.]+?)(?:\n|Party)'
-        ]
-        
-        parties = []
-        for pattern in patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            parties.extend([match if isinstance(match, str) else match[0] for match in matches])
-        
-        return list(set(parties))[:5]  # Limit to 5 parties
+        return self.metadata_engine.parties(text, self.metadata_engine.lowered(text))
     
     def _extract_dates(self, text: str) -> List[str]:
         """Extract dates from contract"""
-        date_patterns = [
-            r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b',
-            r'\b(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},?\s+\d{4}\b'
-        ]
-        
-        dates = []
-        for pattern in date_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            dates.extend(matches)
-        
-        return list(set(dates))[:10]  # Limit to 10 dates
+        return self.metadata_engine.dates(text, self.metadata_engine.lowered(text))
     
     def _identify_contract_type(self, text: str) -> str:
         """Identify the type of contract"""
-        contract_types = {
-            'employment': ['employment', 'employee', 'salary', 'benefits', 'termination'],
-            'service': ['services', 'provider', 'client', 'deliverables', 'scope of work'],
-            'sales': ['purchase', 'sale', 'buyer', 'seller', 'goods', 'products'],
-            'lease': ['lease', 'rent', 'tenant', 'landlord', 'property'],
-            'nda': ['confidential', 'non-disclosure', 'proprietary', 'confidentiality']
-        }
-        
-        text_lower = text.lower()
-        scores = {}
-        
-        for contract_type, keywords in contract_types.items():
-            score = sum(1 for keyword in keywords if keyword in text_lower)
-            scores[contract_type] = score
-        
-        return max(scores, key=scores.get) if max(scores.values()) > 0 else 'general'
+        hits = self.metadata_engine.keyword_hits(text, self.metadata_engine.lowered(text))
+        return self.metadata_engine.contract_type(hits)
+
+
+def extract_document(file: Dict[str, str], cache: Optional[ExtractionCache] = None,
+                     processor: Optional[DocumentProcessor] = None) -> Dict:
+    """
+    Extract one uploaded file; module-level so it can run in a worker process.
 
+    A file that cannot be parsed (unsupported format, corrupt PDF/DOCX) comes
+    back with empty text and an "error" message instead of raising, so one
+    bad upload does not abort the others.
+    """
+    processor = processor or DocumentProcessor(cache=cache)
+    try:
+        return {"file_name": file["file_name"], **processor.process_file(file["file_path"])}
+    except Exception as e:
+        return {"file_name": file["file_name"], "text": "", "metadata": None,
+                "error": f"Could not extract {file['file_name']}: {e}"}
@@ -0,0 +1,90 @@
+# modules/agents/followup.py
+"""
+Follow-up questions about a finished analysis.
+
+A question is answered with a single model call from what the run already
+checkpointed: the final report, the most relevant parts of the extracted
+contract text and the last few questions and answers. Nothing is parsed,
+retrieved or analysed again.
+"""
+import json
+import os
+import re
+from typing import Any, Dict, List
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+from modules.contract_index import ContractIndex
+from modules.resources import DEFAULT_CHAT_MODEL, get_chain
+
+# Characters of contract text sent with a question; longer contracts are
+# narrowed to the passages sharing the most words with the question
+FOLLOWUP_CONTEXT_CHARS = int(os.getenv("FOLLOWUP_CONTEXT_CHARS", "12000"))
+# Earlier questions and answers included with a new question
+FOLLOWUP_HISTORY_MESSAGES = 6
+
+_WORD = re.compile(r"\w{3,}")
+
+FOLLOWUP_PROMPT = ChatPromptTemplate.from_messages([
+    ("system",
+     "You are a legal compliance expert answering questions about a contract compliance analysis. "
+     "Answer from the report and the contract excerpts below; say so when they do not contain the answer.\n\n"
+     "COMPLIANCE REPORT:\n{report}\n\n"
+     "CONTRACT EXCERPTS:\n{contract_text}"),
+    MessagesPlaceholder("history"),
+    ("human", "{question}")
+])
+
+
+def followup_chain(model: str = DEFAULT_CHAT_MODEL):
+    return get_chain("followup", FOLLOWUP_PROMPT, model, temperature=0)
+
+
+def _documents(values: Dict[str, Any]) -> List[Dict[str, str]]:
+    docs = [d for d in values.get("processed_documents") or [] if d.get("text")]
+    if docs:
+        return docs
+    return [{"file_name": "contract", "text": values.get("extracted_text") or ""}]
+
+
+def contract_excerpts(values: Dict[str, Any], question: str, max_chars: int = FOLLOWUP_CONTEXT_CHARS) -> str:
+    """The run's contract text, or the passages most relevant to question when it is too long"""
+    docs = _documents(values)
+    multiple = len(docs) > 1
+    if sum(len(d["text"]) for d in docs) <= max_chars:
+        return "\n\n".join(f"[{d['file_name']}]\n{d['text']}" if multiple else d["text"] for d in docs)
+
+    terms = set(_WORD.findall(question.lower()))
+    passages = [(d["file_name"], p) for d in docs for p in ContractIndex.split(d["text"])]
+    scored = sorted(
+        range(len(passages)),
+        key=lambda i: -len(terms.intersection(_WORD.findall(passages[i][1].lower())))
+    )
+    chosen, used = [], 0
+    for i in scored:
+        if used + len(passages[i][1]) > max_chars:
+            break
+        chosen.append(i)
+        used += len(passages[i][1])
+    # Keep the selected passages in document order
+    return "\n\n".join(
+        f"[{passages[i][0]}] {passages[i][1]}" if multiple else passages[i][1] for i in sorted(chosen)
+    )
+
+
+def history(values: Dict[str, Any]) -> List[Any]:
+    """Earlier questions and answers of the run, most recent last"""
+    turns = [m for m in values.get("messages") or [] if isinstance(m, (HumanMessage, AIMessage))]
+    return turns[-FOLLOWUP_HISTORY_MESSAGES:]
+
+
+def followup_inputs(values: Dict[str, Any], question: str) -> Dict[str, Any]:
+    if not values or values.get("final_report") is None:
+        raise ValueError("No finished analysis found for this run")
+    return {
+        "report": json.dumps(values["final_report"], default=str),
+        "contract_text": contract_excerpts(values, question),
+        "history": history(values),
+        "question": question
+    }
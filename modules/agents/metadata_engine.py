@@ -0,0 +1,167 @@
+# modules/agents/metadata_engine.py
+"""
+Contract metadata extraction with every pattern compiled once.
+
+The text is lowercased a single time and reused by every stage. Patterns
+that can only start at a fixed word ("between", "party", month names) are
+only tried at the positions where that word occurs, found with str.find,
+instead of letting a case-insensitive regex probe every character of a
+multi-megabyte contract. The fields match the original re.findall-based
+implementation, with contract-type keyword positions added.
+"""
+import re
+from typing import Dict, Iterator, List, Optional
+
+CONTRACT_TYPE_KEYWORDS = {
+    'employment': ['employment', 'employee', 'salary', 'benefits', 'termination'],
+    'service': ['services', 'provider', 'client', 'deliverables', 'scope of work'],
+    'sales': ['purchase', 'sale', 'buyer', 'seller', 'goods', 'products'],
+    'lease': ['lease', 'rent', 'tenant', 'landlord', 'property'],
+    'nda': ['confidential', 'non-disclosure', 'proprietary', 'confidentiality']
+}
+
+# Keyword hit positions kept per keyword
+MAX_KEYWORD_POSITIONS = 20
+
+# Words are counted in blocks so no list of every word in the document is built
+WORD_COUNT_BLOCK = 1 << 20
+
+MONTHS = ['january', 'february', 'march', 'april', 'may', 'june', 'july',
+          'august', 'september', 'october', 'november', 'december']
+
+_WHITESPACE = re.compile(r'\s')
+
+# (pattern, lowercase word every match starts with)
+_PARTY_PATTERNS = [
+    (re.compile(r'between\s+([A-Z][a-zA-Z\s&,\.]+?)\s+and\s+([A-Z][a-zA-Z\s&,\.]+?)(?:\s|,|\.|;)', re.IGNORECASE), 'between'),
+    (re.compile(r'Party\s+(?:A|1):\s*([A-Z][a-zA-Z\s&,\.]+?)(?:\n|Party)', re.IGNORECASE), 'party'),
+    (re.compile(r'Party\s+(?:B|2):\s*([A-Z][a-zA-Z\s&,\.]+?)(?:\n|Party)', re.IGNORECASE), 'party'),
+]
+
+# Without a leading \b the regex engine can skip ahead to the next digit;
+# the word boundary before the match is checked in _numeric_dates instead
+_NUMERIC_DATE = re.compile(r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b')
+_MONTH_DATE = re.compile(r'\b(?:' + '|'.join(MONTHS) + r')\s+\d{1,2},?\s+\d{4}\b', re.IGNORECASE)
+
+
+def _anchored_finditer(pattern: re.Pattern, anchor: str, text: str,
+                       lowered: Optional[str]) -> Iterator[re.Match]:
+    """
+    Same matches as pattern.finditer(text) for a pattern whose matches all
+    start with anchor (case-insensitively), trying only where anchor occurs.
+    """
+    if lowered is None:
+        yield from pattern.finditer(text)
+        return
+    i = lowered.find(anchor)
+    while i != -1:
+        match = pattern.match(text, i)
+        if match:
+            yield match
+            i = lowered.find(anchor, max(match.end(), i + 1))
+        else:
+            i = lowered.find(anchor, i + 1)
+
+
+def _numeric_dates(text: str) -> List[str]:
+    """Same matches as re.findall(r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b', text)"""
+    dates = []
+    pos = 0
+    while True:
+        match = _NUMERIC_DATE.search(text, pos)
+        if match is None:
+            return dates
+        start = match.start()
+        previous = text[start - 1] if start else ""
+        if previous.isalnum() or previous == "_":
+            pos = start + 1  # no word boundary here; retry from the next character
+            continue
+        dates.append(match.group(0))
+        pos = match.end()
+
+
+class MetadataEngine:
+    """Single-lowercase-pass metadata extractor; build once and reuse"""
+
+    def __init__(self, contract_types: Dict[str, List[str]] = CONTRACT_TYPE_KEYWORDS,
+                 max_positions: int = MAX_KEYWORD_POSITIONS):
+        self.contract_types = contract_types
+        self.max_positions = max_positions
+        self.keywords = list(dict.fromkeys(k for words in contract_types.values() for k in words))
+        self._keyword_patterns = {k: re.compile(re.escape(k), re.IGNORECASE) for k in self.keywords}
+
+    def extract(self, text: str) -> Dict:
+        """word/char counts, parties, dates, contract type and keyword hit positions"""
+        lowered = self.lowered(text)
+        keyword_hits = self.keyword_hits(text, lowered)
+        return {
+            'word_count': self.count_words(text),
+            'char_count': len(text),
+            'parties': self.parties(text, lowered),
+            'dates': self.dates(text, lowered),
+            'contract_type': self.contract_type(keyword_hits),
+            'keyword_hits': keyword_hits
+        }
+
+    @staticmethod
+    def lowered(text: str) -> Optional[str]:
+        """Lowercased text, or None when lowercasing changed its length"""
+        lowered = text.lower()
+        # Offsets in the lowercased text only line up if lowercasing kept the length
+        return lowered if len(lowered) == len(text) else None
+
+    def count_words(self, text: str) -> int:
+        count = 0
+        start = 0
+        while start < len(text):
+            end = start + WORD_COUNT_BLOCK
+            if end < len(text):
+                # Extend the block to the next whitespace so no word is split
+                boundary = _WHITESPACE.search(text, end)
+                end = boundary.start() if boundary else len(text)
+            count += len(text[start:end].split())
+            start = end
+        return count
+
+    def parties(self, text: str, lowered: Optional[str]) -> List[str]:
+        parties = []
+        for pattern, anchor in _PARTY_PATTERNS:
+            for match in _anchored_finditer(pattern, anchor, text, lowered):
+                parties.append(match.group(1))
+        return list(set(parties))[:5]  # Limit to 5 parties
+
+    def dates(self, text: str, lowered: Optional[str]) -> List[str]:
+        dates = _numeric_dates(text)
+        if lowered is None:
+            dates.extend(_MONTH_DATE.findall(text))
+        else:
+            for month in MONTHS:
+                dates.extend(m.group(0) for m in _anchored_finditer(_MONTH_DATE, month, text, lowered))
+        return list(set(dates))[:10]  # Limit to 10 dates
+
+    def keyword_hits(self, text: str, lowered: Optional[str]) -> Dict[str, List[int]]:
+        """First positions of every contract-type keyword present in the text"""
+        hits = {}
+        for keyword in self.keywords:
+            if lowered is None:
+                positions = [m.start() for _, m in zip(range(self.max_positions),
+                                                       self._keyword_patterns[keyword].finditer(text))]
+            else:
+                positions = []
+                i = lowered.find(keyword)
+                while i != -1 and len(positions) < self.max_positions:
+                    positions.append(i)
+                    i = lowered.find(keyword, i + 1)
+            if positions:
+                hits[keyword] = positions
+        return hits
+
+    def contract_type(self, keyword_hits: Dict[str, List[int]]) -> str:
+        scores = {
+            contract_type: sum(1 for keyword in keywords if keyword in keyword_hits)
+            for contract_type, keywords in self.contract_types.items()
+        }
+        return max(scores, key=scores.get) if max(scores.values()) > 0 else 'general'
+
+
+DEFAULT_ENGINE = MetadataEngine()
@@ -1,41 +1,186 @@
 # orchestration_agent.py
 from langgraph.graph import StateGraph, END, START
-from langgraph.checkpoint.memory import MemorySaver
-from typing import TypedDict, Annotated, List, Dict, Any, Optional
-import operator
-from langchain_core.messages import AnyMessage, SystemMessage, HumanMessage, ToolMessage
-from modules.agents.document_processor import DocumentProcessor
+from langgraph.config import get_config
+from langgraph.types import Send
+from typing import TypedDict, Annotated, AsyncIterator, Iterator, List, Dict, Any, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import asyncio
+import contextvars
+import multiprocessing
+import json
+import os
+import threading
+import time
+import uuid
+from langchain_core.messages import AIMessage, AIMessageChunk, AnyMessage, SystemMessage, HumanMessage
+from modules.agents.document_processor import DocumentProcessor, extract_document
+from modules.agents.followup import followup_chain, followup_inputs
 from modules.agents.research_agent import ResearchAgent
+from modules.resources import DEFAULT_CHAT_MODEL, get_rulebook
+from modules.result_cache import AnalysisCache
+from modules.extraction_cache import ExtractionCache
+from modules.metrics import RunMetrics, metrics, record_cache_lookup
+from modules.checkpoints import SqliteCheckpointer
+from modules.tools.compliance_checker_tool import check_compliance_rules
+from modules.tools.contract_analyzer_tool import (
+    aanalyze_contract_by_rule, aanalyze_contract_chunks, analyze_contract_by_rule, analyze_contract_chunks,
+    analyze_contract_compliance
+)
+
+# "agent" lets the ReAct research agent fetch the rules and run the analysis.
+# The other modes are fixed pipelines that query the rule index directly and
+# call the analysis chains with structured arguments: "direct" makes one
+# analysis call, "chunked" analyses the text chunk by chunk in parallel and
+# merges the findings, "targeted" checks each rule against only the contract
+# passages most similar to it.
+ANALYSIS_MODES = ("agent", "direct", "chunked", "targeted")
+
+# Messages kept in a run's state; older ones are dropped by the reducer
+MAX_STATE_MESSAGES = int(os.getenv("MAX_STATE_MESSAGES", "50"))
+# Seconds between sweeps of expired checkpoint threads
+CHECKPOINT_PRUNE_INTERVAL = 300
+# Progress messages streamed when a graph node finishes
+NODE_LABELS = {
+    "process_docs": "Documents processed",
+    "detect_type": "Contract type detected",
+    "check_cache": "Checked analysis cache",
+    "get_rules": "Compliance rules retrieved",
+    "run_analysis": "Analysis complete",
+    "analyze_document": "Document analysed",
+    "collect_reports": "Reports collected",
+    "chat_interface": "Answer generated"
+}
+
+def message_text(content: Any) -> str:
+    """Text of a message or message chunk (Gemini may return a list of parts)"""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return content or ""
+
+
+class StreamTimer:
+    """Time to the first streamed event, to the first model token, and in total"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_event_seconds: Optional[float] = None
+        self.first_token_seconds: Optional[float] = None
+        self.total_seconds: Optional[float] = None
+
+    def mark(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        elapsed = round(time.perf_counter() - self.start, 4)
+        if self.first_event_seconds is None:
+            self.first_event_seconds = elapsed
+        if event["type"] == "token" and self.first_token_seconds is None:
+            self.first_token_seconds = elapsed
+        event["elapsed"] = elapsed
+        return event
+
+    def stop(self) -> Dict[str, Optional[float]]:
+        self.total_seconds = round(time.perf_counter() - self.start, 4)
+        return self.as_dict()
+
+    def as_dict(self) -> Dict[str, Optional[float]]:
+        return {
+            "first_event_seconds": self.first_event_seconds,
+            "first_token_seconds": self.first_token_seconds,
+            "total_seconds": self.total_seconds
+        }
+
+
+def add_bounded_messages(left: Optional[List[AnyMessage]], right: Optional[List[AnyMessage]]) -> List[AnyMessage]:
+    """Append new messages, keeping only the most recent MAX_STATE_MESSAGES"""
+    return ((left or []) + (right or []))[-MAX_STATE_MESSAGES:]
+
+def merge_reports(left: Optional[Dict[str, Any]], right: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Gather per-file reports from the fan-out branches; None starts a new run"""
+    if right is None:
+        return {}
+    return {**(left or {}), **right}
 
 class ContractAnalysisState(TypedDict):
     uploaded_files: List[Dict[str, Any]]
     processed_documents: List[Dict[str, Any]]
+    batch_mode: bool
+    document_reports: Annotated[Dict[str, Any], merge_reports]
     contract_type: Optional[str]
     extracted_text: Optional[str]
     compliance_rules: Optional[str]
+    cache_key: Optional[str]
     analysis_results: Optional[Dict[str, Any]]
     final_report: Optional[Dict[str, Any]]
-    messages: Annotated[List[AnyMessage], operator.add]
+    messages: Annotated[List[AnyMessage], add_bounded_messages]
     current_step: str
     processing_complete: bool
 
 class ContractComplianceOrchestrator:
-    def __init__(self, research_agent: ResearchAgent):
+    """
+    Runs the contract analysis graph.
+
+    One instance can serve many threads (and async tasks) at once: every
+    run has its own checkpoint thread, nodes return partial state updates
+    instead of mutating shared state, the research agent keeps a separate
+    memory per run, and model calls are capped process-wide by
+    resources.set_llm_concurrency.
+    """
+
+    def __init__(self, research_agent: ResearchAgent, result_cache: Optional[AnalysisCache] = None,
+                 extraction_workers: Optional[int] = None,
+                 max_concurrency: Optional[int] = None, extraction_cache: Optional[ExtractionCache] = None,
+                 analysis_mode: str = "agent", checkpoint_path: str = ":memory:"):
+        if analysis_mode not in ANALYSIS_MODES:
+            raise ValueError(f"analysis_mode must be one of {ANALYSIS_MODES}, got {analysis_mode!r}")
         self.research_agent = research_agent
-        self.document_processor = DocumentProcessor()
-        self.memory = MemorySaver()
+        self.analysis_mode = analysis_mode
+        # Running totals of model calls per mode; the most recent run's calls,
+        # metrics and stream timing are kept per calling thread or async task
+        # (see last_run_llm_calls)
+        self._call_stats: Dict[str, Dict[str, int]] = {}
+        self._stats_lock = threading.Lock()
+        self._last_run: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar(
+            f"last_run_{id(self)}", default={}
+        )
+        self.document_processor = DocumentProcessor(cache=extraction_cache)
+        self.result_cache = result_cache
+        # Worker processes for PDF/DOCX parsing (defaults to one per core) and
+        # the number of per-document branches LangGraph runs at once
+        self.extraction_workers = extraction_workers
+        self.max_concurrency = max_concurrency
+        self._extraction_pool: Optional[ProcessPoolExecutor] = None
+        # One checkpoint thread per run, stored in SQLite (a file survives restarts)
+        self.checkpointer = SqliteCheckpointer(checkpoint_path)
+        self._last_prune = 0.0
         self.graph = self._build_graph()
+        # Same graph with native async nodes for the network-bound steps
+        self.async_graph = self._build_graph(use_async=True)
 
-    def _build_graph(self) -> StateGraph:
+    def _build_graph(self, use_async: bool = False) -> StateGraph:
         g = StateGraph(ContractAnalysisState)
         g.add_node("process_docs", self._node_process_docs)
         g.add_node("detect_type", self._node_detect_type)
-        g.add_node("get_rules", self._node_get_rules)
-        g.add_node("run_analysis", self._node_run_analysis)
-        g.add_node("chat_interface", self._node_chat_interface)
+        g.add_node("check_cache", self._node_check_cache)
+        g.add_node("get_rules", self._anode_get_rules if use_async else self._node_get_rules)
+        g.add_node("run_analysis", self._anode_run_analysis if use_async else self._node_run_analysis)
+        g.add_node("chat_interface", self._anode_chat_interface if use_async else self._node_chat_interface)
+        g.add_node("analyze_document", self._anode_analyze_document if use_async else self._node_analyze_document)
+        g.add_node("collect_reports", self._node_collect_reports)
         g.add_edge(START, "process_docs")
-        g.add_edge("process_docs", "detect_type")
-        g.add_edge("detect_type", "get_rules")
+        # Batch runs fan out one analyze_document branch per file
+        g.add_conditional_edges(
+            "process_docs",
+            self._route_documents,
+            ["analyze_document", "detect_type"]
+        )
+        g.add_edge("analyze_document", "collect_reports")
+        g.add_edge("collect_reports", END)
+        g.add_edge("detect_type", "check_cache")
+        # A cached report for the same contract, type, model and rules ends the run
+        g.add_conditional_edges(
+            "check_cache",
+            lambda s: END if s["current_step"] == "cache_hit" else "get_rules",
+            {"get_rules": "get_rules", END: END}
+        )
         g.add_edge("get_rules", "run_analysis")
         # After analysis, allow up to one chat follow-up before END
         g.add_conditional_edges(
@@ -44,274 +189,541 @@ class ContractComplianceOrchestrator:
             {"ask_followup": "chat_interface", END: END}
         )
         g.add_edge("chat_interface", END)
-        return g.compile(checkpointer=self.memory)
-
-    def _node_process_docs(self, s: ContractAnalysisState) -> ContractAnalysisState:
-        docs = []
-        for f in s["uploaded_files"]:
-            text = self.document_processor.extract_text(f["file_path"])
-            docs.append({"file_name": f["file_name"], "text": text})
-        s.update({
+        return g.compile(checkpointer=self.checkpointer)
+
+    def _node_process_docs(self, s: ContractAnalysisState) -> Dict[str, Any]:
+        docs = self._extract_documents(s["uploaded_files"])
+        return {
             "processed_documents": docs,
             "extracted_text": docs[0]["text"] if docs else None,
             "current_step": "processed",
             "messages": [SystemMessage(content="Documents processed.")]
-        })
-        return s
-
-    def _node_detect_type(self, s: ContractAnalysisState) -> ContractAnalysisState:
-        text = s["extracted_text"]
-        ct = self.document_processor.extract_metadata(text).get("contract_type", "General")
+        }
+
+    def _extract_documents(self, files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Parse uploads, in worker processes when there is more than one"""
+        if len(files) < 2 or self.extraction_workers == 1:
+            return [extract_document(f, processor=self.document_processor) for f in files]
+        extract = partial(extract_document, cache=self.document_processor.cache)
+        return list(self._get_extraction_pool().map(extract, files))
+
+    def _get_extraction_pool(self) -> ProcessPoolExecutor:
+        with self._stats_lock:
+            if self._extraction_pool is None:
+                # spawn rather than fork: the LLM clients hold threads and gRPC channels
+                self._extraction_pool = ProcessPoolExecutor(
+                    max_workers=self.extraction_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._extraction_pool
+
+    def _route_documents(self, s: ContractAnalysisState):
+        if s.get("batch_mode") and s["processed_documents"]:
+            return [Send("analyze_document", {"document": doc}) for doc in s["processed_documents"]]
+        return "detect_type"
+
+    def _node_detect_type(self, s: ContractAnalysisState) -> Dict[str, Any]:
+        docs = s.get("processed_documents") or [{}]
+        ct = self._detect_contract_type(s["extracted_text"], docs[0].get("metadata"))
         # optionally refine with research agent
-        s.update({"contract_type": ct, "current_step": "type_detected",
-                  "messages": [SystemMessage(content=f"Contract type: {ct}")]})
-        return s
-
-    def _node_get_rules(self, s: ContractAnalysisState) -> ContractAnalysisState:
-        q = f"Retrieve compliance rules for {s['contract_type']}"
-        rules = self.research_agent.research(q)
-        s.update({"compliance_rules": rules, "current_step": "rules_retrieved",
-                  "messages": [SystemMessage(content="Compliance rules retrieved.")]})
-        return s
-
-    def _node_run_analysis(self, s: ContractAnalysisState) -> ContractAnalysisState:
+        return {"contract_type": ct, "current_step": "type_detected",
+                "messages": [SystemMessage(content=f"Contract type: {ct}")]}
+
+    def _node_check_cache(self, s: ContractAnalysisState) -> Dict[str, Any]:
+        key, cached = self._lookup_cache(s.get("extracted_text"), s["contract_type"])
+        if key is None:
+            return {"cache_key": None, "current_step": "cache_skipped"}
+        if cached is None:
+            return {"cache_key": key, "current_step": "cache_miss"}
+
+        return {
+            "cache_key": key,
+            "analysis_results": cached,
+            "final_report": cached,
+            "processing_complete": True,
+            "current_step": "cache_hit",
+            "messages": [SystemMessage(content="Analysis loaded from cache.")]
+        }
+
+    def _node_get_rules(self, s: ContractAnalysisState) -> Dict[str, Any]:
+        rules = self._retrieve_rules(s["contract_type"])
+        return {"compliance_rules": rules, "current_step": "rules_retrieved",
+                "messages": [SystemMessage(content="Compliance rules retrieved.")]}
+
+    async def _anode_get_rules(self, s: ContractAnalysisState) -> Dict[str, Any]:
+        rules = await self._aretrieve_rules(s["contract_type"])
+        return {"compliance_rules": rules, "current_step": "rules_retrieved",
+                "messages": [SystemMessage(content="Compliance rules retrieved.")]}
+
+    def _node_run_analysis(self, s: ContractAnalysisState) -> Dict[str, Any]:
         """Node for running the research agent analysis with proper rules context"""
         try:
-            contract_text = s.get("extracted_text", "")
-            contract_type = s.get("contract_type", "General")
-            compliance_rules = s.get("compliance_rules", "")
-            
-            if not contract_text:
-                raise ValueError("No contract text available for analysis")
-            
-            # Call the research agent's analyze_contract method with rules context
-            result = self.research_agent.analyze_contract(
-                contract_text=contract_text,
-                contract_type=contract_type,
-                rules_context=compliance_rules  # Pass the compliance rules as context
-            )
-            
-            s.update({
-                "analysis_results": result,
-                "final_report": result,
-                "processing_complete": True,
-                "messages": [SystemMessage(content="Analysis complete.")]
-            })
-            return s
-            
+            contract_text, contract_type, compliance_rules = self._analysis_inputs(s)
+            result = self._analyze(contract_text, contract_type, compliance_rules)
+            return self._complete_analysis(s, result)
         except Exception as e:
-            s.update({
-                "analysis_results": {
-                    "status": "error",
-                    "error": str(e),
-                    "document_type": "Error",
-                    "risk_assessment": {
-                        "risk_score": 100,
-                        "risk_level": "Critical"
-                    }
-                },
-                "final_report": {
-                    "status": "error",
-                    "error": str(e)
-                },
-                "processing_complete": True,
-                "messages": [SystemMessage(content=f"Analysis failed: {str(e)}")]
-            })
-            return s
-
-
-    def _node_chat_interface(self, s: ContractAnalysisState) -> ContractAnalysisState:
-        # Expects last message from user in s["messages"]
-        last = s["messages"][-1]
-        if isinstance(last, HumanMessage):
-            prompt = (
-                "User follow-up: "
-                f"{last.content}\n"
-                f"Refer to report: {s['final_report']}"
-            )
-            resp = self.research_agent.research(prompt)
-            s["messages"].append(ToolMessage(tool_call_id="", name="", content=resp))
-        return s
-
-    def process_contracts(self, files: List[Dict[str, Any]]) -> Dict[str, Any]:
-        init = ContractAnalysisState(
-            uploaded_files=files,
-            processed_documents=[],
-            contract_type=None,
-            extracted_text=None,
-            compliance_rules=None,
-            analysis_results=None,
-            final_report=None,
-            messages=[],
-            current_step="start",
-            processing_complete=False
-        )
-        config = {"configurable": {"thread_id": "unique_session_id"}}
-        result = self.graph.invoke(init, config=config)
-        return result["final_report"]
-
-
-
-
+            return self._fail_analysis(s, e)
 
+    async def _anode_run_analysis(self, s: ContractAnalysisState) -> Dict[str, Any]:
+        try:
+            contract_text, contract_type, compliance_rules = self._analysis_inputs(s)
+            result = await self._aanalyze(contract_text, contract_type, compliance_rules)
+            return self._complete_analysis(s, result)
+        except Exception as e:
+            return self._fail_analysis(s, e)
+
+    def _analysis_inputs(self, s: ContractAnalysisState) -> Tuple[str, str, str]:
+        contract_text = s.get("extracted_text", "")
+        contract_type = s.get("contract_type", "General")
+        compliance_rules = s.get("compliance_rules", "")
+
+        if not contract_text:
+            docs = s.get("processed_documents") or [{}]
+            raise ValueError(docs[0].get("error") or "No contract text available for analysis")
+        return contract_text, contract_type, compliance_rules
+
+    def _complete_analysis(self, s: ContractAnalysisState, result: Dict[str, Any]) -> Dict[str, Any]:
+        self._store_result(s.get("cache_key"), result)
+        return {
+            "analysis_results": result,
+            "final_report": result,
+            "processing_complete": True,
+            "messages": [SystemMessage(content="Analysis complete.")]
+        }
+
+    def _fail_analysis(self, s: ContractAnalysisState, e: Exception) -> Dict[str, Any]:
+        return {
+            "analysis_results": {
+                "status": "error",
+                "error": str(e),
+                "document_type": "Error",
+                "risk_assessment": {
+                    "risk_score": 100,
+                    "risk_level": "Critical"
+                }
+            },
+            "final_report": {
+                "status": "error",
+                "error": str(e)
+            },
+            "processing_complete": True,
+            "messages": [SystemMessage(content=f"Analysis failed: {str(e)}")]
+        }
+
+    def _node_analyze_document(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """One fan-out branch: type detection, rules and analysis for a single file"""
+        doc = payload["document"]
+        try:
+            if not doc["text"]:
+                # Files that failed extraction carry the reason
+                raise ValueError(doc.get("error") or "No contract text available for analysis")
+            contract_type = self._detect_contract_type(doc["text"], doc.get("metadata"))
+            key, report = self._lookup_cache(doc["text"], contract_type)
+            if report is None:
+                rules = self._retrieve_rules(contract_type)
+                report = self._analyze(doc["text"], contract_type, rules)
+                self._store_result(key, report)
+        except Exception as e:
+            report = {"status": "error", "error": str(e)}
+        return {"document_reports": {doc["file_name"]: report}}
 
-# orchestration_agent.py
-from langgraph.graph import StateGraph, END, START
-from langgraph.checkpoint.memory import MemorySaver
-from typing import TypedDict, Annotated, List, Dict, Any, Optional
-import operator
-from langchain_core.messages import AnyMessage, SystemMessage, HumanMessage, ToolMessage
-from modules.agents.document_processor import DocumentProcessor
-from modules.agents.research_agent import ResearchAgent
-
-class ContractAnalysisState(TypedDict):
-    uploaded_files: List[Dict[str, Any]]
-    processed_documents: List[Dict[str, Any]]
-    contract_type: Optional[str]
-    extracted_text: Optional[str]
-    compliance_rules: Optional[str]
-    analysis_results: Optional[Dict[str, Any]]
-    final_report: Optional[Dict[str, Any]]
-    messages: Annotated[List[AnyMessage], operator.add]
-    current_step: str
-    processing_complete: bool
+    async def _anode_analyze_document(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        doc = payload["document"]
+        try:
+            if not doc["text"]:
+                # Files that failed extraction carry the reason
+                raise ValueError(doc.get("error") or "No contract text available for analysis")
+            contract_type = self._detect_contract_type(doc["text"], doc.get("metadata"))
+            key, report = self._lookup_cache(doc["text"], contract_type)
+            if report is None:
+                rules = await self._aretrieve_rules(contract_type)
+                report = await self._aanalyze(doc["text"], contract_type, rules)
+                self._store_result(key, report)
+        except Exception as e:
+            report = {"status": "error", "error": str(e)}
+        return {"document_reports": {doc["file_name"]: report}}
+
+    def _node_collect_reports(self, s: ContractAnalysisState) -> Dict[str, Any]:
+        reports = s.get("document_reports") or {}
+        final = {"document_count": len(reports), "documents": reports}
+        return {
+            "analysis_results": final,
+            "final_report": final,
+            "processing_complete": True,
+            "current_step": "reports_collected",
+            "messages": [SystemMessage(content=f"Analysis complete for {len(reports)} documents.")]
+        }
+
+    # Pipeline steps shared by the single-document nodes and the batch branches
+
+    def _detect_contract_type(self, text: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+        # Metadata computed at extraction time (and cached with the text) is reused
+        metadata = metadata or self.document_processor.extract_metadata(text)
+        return metadata.get("contract_type", "General")
+
+    def _rulebook_rules(self, contract_type: str) -> Optional[str]:
+        """Complete rule block for a known contract type, looked up without any model or search call"""
+        block = get_rulebook().lookup(contract_type or "")
+        record_cache_lookup("rulebook", block is not None)
+        return block.text if block is not None else None
+
+    @staticmethod
+    def _session_id() -> Optional[str]:
+        """The running graph's thread id, so the research agent keeps one memory per run"""
+        try:
+            return get_config()["configurable"].get("thread_id")
+        except (RuntimeError, KeyError):
+            return None
+
+    def _retrieve_rules(self, contract_type: str) -> str:
+        rules = self._rulebook_rules(contract_type)
+        if rules is not None:
+            return rules
+        if self.analysis_mode != "agent":
+            return check_compliance_rules.invoke({"query": contract_type})
+        return self.research_agent.research(f"Retrieve compliance rules for {contract_type}", self._session_id())
+
+    async def _aretrieve_rules(self, contract_type: str) -> str:
+        rules = self._rulebook_rules(contract_type)
+        if rules is not None:
+            return rules
+        if self.analysis_mode != "agent":
+            return await check_compliance_rules.ainvoke({"query": contract_type})
+        return await self.research_agent.aresearch(f"Retrieve compliance rules for {contract_type}", self._session_id())
+
+    def _analyze(self, contract_text: str, contract_type: str, rules: str) -> Dict[str, Any]:
+        if self.analysis_mode == "direct":
+            return self._direct_report(analyze_contract_compliance.invoke(
+                {"contract_text": contract_text, "rules_context": rules}
+            ), contract_type)
+        if self.analysis_mode == "chunked":
+            return analyze_contract_chunks(contract_text, rules, contract_type)
+        if self.analysis_mode == "targeted":
+            return analyze_contract_by_rule(contract_text, rules, contract_type)
+        # Call the research agent's analyze_contract method with rules context
+        return self.research_agent.analyze_contract(
+            contract_text=contract_text,
+            contract_type=contract_type,
+            rules_context=rules,  # Pass the compliance rules as context
+            session_id=self._session_id()
+        )
 
-class ContractComplianceOrchestrator:
-    def __init__(self, research_agent: ResearchAgent):
-        self.research_agent = research_agent
-        self.document_processor = DocumentProcessor()
-        self.memory = MemorySaver()
-        self.graph = self._build_graph()
+    async def _aanalyze(self, contract_text: str, contract_type: str, rules: str) -> Dict[str, Any]:
+        if self.analysis_mode == "direct":
+            return self._direct_report(await analyze_contract_compliance.ainvoke(
+                {"contract_text": contract_text, "rules_context": rules}
+            ), contract_type)
+        if self.analysis_mode == "chunked":
+            return await aanalyze_contract_chunks(contract_text, rules, contract_type)
+        if self.analysis_mode == "targeted":
+            return await aanalyze_contract_by_rule(contract_text, rules, contract_type)
+        return await self.research_agent.aanalyze_contract(
+            contract_text=contract_text,
+            contract_type=contract_type,
+            rules_context=rules,
+            session_id=self._session_id()
+        )
 
-    def _build_graph(self) -> StateGraph:
-        g = StateGraph(ContractAnalysisState)
-        g.add_node("process_docs", self._node_process_docs)
-        g.add_node("detect_type", self._node_detect_type)
-        g.add_node("get_rules", self._node_get_rules)
-        g.add_node("run_analysis", self._node_run_analysis)
-        g.add_node("chat_interface", self._node_chat_interface)
-        g.add_edge(START, "process_docs")
-        g.add_edge("process_docs", "detect_type")
-        g.add_edge("detect_type", "get_rules")
-        g.add_edge("get_rules", "run_analysis")
-        # After analysis, allow up to one chat follow-up before END
-        g.add_conditional_edges(
-            "run_analysis",
-            lambda s: "ask_followup" if not s["processing_complete"] else END,
-            {"ask_followup": "chat_interface", END: END}
+    @staticmethod
+    def _direct_report(result: str, contract_type: str) -> Dict[str, Any]:
+        # The analyzer tool always returns a JSON report, falling back to an error report
+        report = json.loads(result)
+        if report.get("document_type") in (None, "", "Unknown"):
+            report["document_type"] = contract_type or "Unknown"
+        return report
+
+    def _lookup_cache(self, text: Optional[str], contract_type: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        if self.result_cache is None or not text:
+            return None, None
+        from modules.vector_store import rules_version
+        # Reports of the model every chain runs on are cached separately per analysis mode
+        model = DEFAULT_CHAT_MODEL if self.analysis_mode == "agent" else f"{DEFAULT_CHAT_MODEL}/{self.analysis_mode}"
+        key = AnalysisCache.make_key(text, contract_type, model, rules_version())
+        report = self.result_cache.get(key)
+        record_cache_lookup("analysis", report is not None)
+        return key, report
+
+    def _store_result(self, key: Optional[str], report: Dict[str, Any]) -> None:
+        if self.result_cache is not None and key and self._is_cacheable(report):
+            self.result_cache.put(key, report)
+
+    @staticmethod
+    def _is_cacheable(report: Dict[str, Any]) -> bool:
+        """Fallback reports produced by a failed analysis must not be cached"""
+        if not isinstance(report, dict) or report.get("status") == "error":
+            return False
+        return not any(
+            isinstance(item, dict) and item.get("category") == "SYSTEM_ERROR"
+            for item in report.get("shortcomings", [])
         )
-        g.add_edge("chat_interface", END)
-        return g.compile(checkpointer=self.memory)
-
-    def _node_process_docs(self, s: ContractAnalysisState) -> ContractAnalysisState:
-        docs = []
-        for f in s["uploaded_files"]:
-            text = self.document_processor.extract_text(f["file_path"])
-            docs.append({"file_name": f["file_name"], "text": text})
-        s.update({
-            "processed_documents": docs,
-            "extracted_text": docs[0]["text"] if docs else None,
-            "current_step": "processed",
-            "messages": [SystemMessage(content="Documents processed.")]
-        })
-        return s
 
-    def _node_detect_type(self, s: ContractAnalysisState) -> ContractAnalysisState:
-        text = s["extracted_text"]
-        ct = self.document_processor.extract_metadata(text).get("contract_type", "General")
-        # optionally refine with research agent
-        s.update({"contract_type": ct, "current_step": "type_detected",
-                  "messages": [SystemMessage(content=f"Contract type: {ct}")]})
-        return s
-
-    def _node_get_rules(self, s: ContractAnalysisState) -> ContractAnalysisState:
-        q = f"Retrieve compliance rules for {s['contract_type']}"
-        rules = self.research_agent.research(q)
-        s.update({"compliance_rules": rules, "current_step": "rules_retrieved",
-                  "messages": [SystemMessage(content="Compliance rules retrieved.")]})
-        return s
-
-    def _node_run_analysis(self, s: ContractAnalysisState) -> ContractAnalysisState:
-        """Node for running the research agent analysis with proper rules context"""
-        try:
-            contract_text = s.get("extracted_text", "")
-            contract_type = s.get("contract_type", "General")
-            compliance_rules = s.get("compliance_rules", "")
-            
-            if not contract_text:
-                raise ValueError("No contract text available for analysis")
-            
-            # Call the research agent's analyze_contract method with rules context
-            result = self.research_agent.analyze_contract(
-                contract_text=contract_text,
-                contract_type=contract_type,
-                rules_context=compliance_rules  # Pass the compliance rules as context
-            )
-            
-            s.update({
-                "analysis_results": result,
-                "final_report": result,
-                "processing_complete": True,
-                "messages": [SystemMessage(content="Analysis complete.")]
-            })
-            return s
-            
-        except Exception as e:
-            s.update({
-                "analysis_results": {
-                    "status": "error",
-                    "error": str(e),
-                    "document_type": "Error",
-                    "risk_assessment": {
-                        "risk_score": 100,
-                        "risk_level": "Critical"
-                    }
-                },
-                "final_report": {
-                    "status": "error",
-                    "error": str(e)
-                },
-                "processing_complete": True,
-                "messages": [SystemMessage(content=f"Analysis failed: {str(e)}")]
-            })
-            return s
-
-
-    def _node_chat_interface(self, s: ContractAnalysisState) -> ContractAnalysisState:
-        # Expects last message from user in s["messages"]
-        last = s["messages"][-1]
-        if isinstance(last, HumanMessage):
-            prompt = (
-                "User follow-up: "
-                f"{last.content}\n"
-                f"Refer to report: {s['final_report']}"
-            )
-            resp = self.research_agent.research(prompt)
-            s["messages"].append(ToolMessage(tool_call_id="", name="", content=resp))
-        return s
-
-    def process_contracts(self, files: List[Dict[str, Any]]) -> Dict[str, Any]:
-        init = ContractAnalysisState(
+    def _node_chat_interface(self, s: ContractAnalysisState) -> Dict[str, Any]:
+        # Answers the user's message (last in s["messages"]) from the report
+        last = s["messages"][-1] if s["messages"] else None
+        if not isinstance(last, HumanMessage):
+            return {}
+        values = {**s, "messages": s["messages"][:-1]}
+        answer = followup_chain().invoke(followup_inputs(values, last.content))
+        return {"messages": [AIMessage(content=message_text(answer.content))]}
+
+    async def _anode_chat_interface(self, s: ContractAnalysisState) -> Dict[str, Any]:
+        last = s["messages"][-1] if s["messages"] else None
+        if not isinstance(last, HumanMessage):
+            return {}
+        values = {**s, "messages": s["messages"][:-1]}
+        answer = await followup_chain().ainvoke(followup_inputs(values, last.content))
+        return {"messages": [AIMessage(content=message_text(answer.content))]}
+
+    def _initial_state(self, files: List[Dict[str, Any]], batch: Optional[bool]) -> ContractAnalysisState:
+        return ContractAnalysisState(
             uploaded_files=files,
             processed_documents=[],
+            batch_mode=len(files) > 1 if batch is None else batch,
+            document_reports=None,
             contract_type=None,
             extracted_text=None,
             compliance_rules=None,
+            cache_key=None,
             analysis_results=None,
             final_report=None,
             messages=[],
             current_step="start",
             processing_complete=False
         )
-        config = {"configurable": {"thread_id": "unique_session_id"}}
+
+    def _run_config(self, thread_id: str, run: RunMetrics) -> Dict[str, Any]:
+        # Callbacks in the run config reach every chain and agent the nodes invoke
+        config = {"configurable": {"thread_id": thread_id}, "callbacks": [run]}
+        if self.max_concurrency:
+            config["max_concurrency"] = self.max_concurrency
+        return config
+
+    @property
+    def last_run_llm_calls(self) -> int:
+        """Model calls made by the calling thread's or task's most recent run"""
+        return self._last_run.get().get("llm_calls", 0)
+
+    @property
+    def last_stream_timing(self) -> Dict[str, Optional[float]]:
+        """Timing of the calling thread's or task's most recent streamed run or follow-up answer"""
+        return self._last_run.get().get("stream_timing", {})
+
+    @property
+    def last_run_metrics(self) -> Dict[str, Any]:
+        """Node, tool and model timings, tokens and cache lookups of the calling thread's or task's most recent run"""
+        return self._last_run.get().get("metrics", {})
+
+    def _set_last_run(self, **values: Any) -> None:
+        # A new dict each time, so contexts copied from this one keep their own values
+        self._last_run.set({**self._last_run.get(), **values})
+
+    def _record_run(self, run: RunMetrics, values: Dict[str, Any]) -> None:
+        """Add a finished run's model calls to call_stats and its timings to the metrics registry"""
+        with self._stats_lock:
+            stats = self._call_stats.setdefault(self.analysis_mode, {"runs": 0, "llm_calls": 0})
+            stats["runs"] += 1
+            stats["llm_calls"] += run.calls
+        report = values.get("final_report") or {}
+        status = "error" if not report or report.get("status") == "error" else "ok"
+        contract_type = values.get("contract_type") or ("batch" if values.get("batch_mode") else None)
+        record = run.record(contract_type, status)
+        self._set_last_run(llm_calls=run.calls, metrics=record)
+        metrics.add_run(record)
+
+    @property
+    def call_stats(self) -> Dict[str, Dict[str, float]]:
+        """Runs, model calls and calls per run for every analysis mode used so far"""
+        with self._stats_lock:
+            return {
+                mode: {**stats, "llm_calls_per_run": round(stats["llm_calls"] / stats["runs"], 2)}
+                for mode, stats in self._call_stats.items()
+            }
+
+    def _finish_run(self, thread_id: str) -> None:
+        """Compact the finished thread and periodically drop expired ones"""
+        self.checkpointer.compact_thread(thread_id)
+        now = time.time()
+        with self._stats_lock:
+            due = now - self._last_prune > CHECKPOINT_PRUNE_INTERVAL
+            if due:
+                self._last_prune = now
+        if due:
+            self.checkpointer.prune()
+
+    def process_contracts(self, files: List[Dict[str, Any]], batch: Optional[bool] = None,
+                          thread_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Run the analysis graph over the uploaded files.
+
+        With several files (or batch=True) every file is analysed in its own
+        branch and the report maps file name to that file's analysis. Each
+        call runs on its own checkpoint thread (a fresh one unless thread_id
+        is given); get_report(thread_id) loads the report back later.
+        """
+        thread_id = thread_id or str(uuid.uuid4())
+        init = self._initial_state(files, batch)
+        run = RunMetrics(thread_id)
+        config = self._run_config(thread_id, run)
         result = self.graph.invoke(init, config=config)
+        self._record_run(run, result)
+        self._finish_run(thread_id)
         return result["final_report"]
-    
-    from PIL import Image as PILImage
-    import io
+
+    async def aprocess_contracts(self, files: List[Dict[str, Any]], batch: Optional[bool] = None,
+                                 thread_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Async variant of process_contracts.
+
+        Each call runs on its own checkpoint thread (a fresh one unless
+        thread_id is given), so many analyses can be awaited concurrently
+        on one event loop.
+        """
+        thread_id = thread_id or str(uuid.uuid4())
+        init = self._initial_state(files, batch)
+        run = RunMetrics(thread_id)
+        config = self._run_config(thread_id, run)
+        result = await self.async_graph.ainvoke(init, config=config)
+        self._record_run(run, result)
+        self._finish_run(thread_id)
+        return result["final_report"]
+
+    @staticmethod
+    def _stream_event(mode: str, data: Any) -> Optional[Dict[str, Any]]:
+        """Progress event for a finished node, token event for a model output chunk"""
+        if mode == "updates":
+            node = next(iter(data), "")
+            if node.startswith("__"):
+                return None
+            return {"type": "progress", "node": node, "message": NODE_LABELS.get(node, node)}
+        chunk, metadata = data
+        # Tool-call chunks of structured output carry no text and are skipped
+        text = message_text(chunk.content) if isinstance(chunk, AIMessageChunk) else ""
+        if not text:
+            return None
+        return {"type": "token", "node": metadata.get("langgraph_node"), "content": text}
+
+    def _stream_result(self, thread_id: str, run: RunMetrics, timer: StreamTimer) -> Dict[str, Any]:
+        values = self.graph.get_state({"configurable": {"thread_id": thread_id}}).values
+        self._record_run(run, values)
+        self._finish_run(thread_id)
+        self._set_last_run(stream_timing=timer.stop())
+        return {
+            "type": "report",
+            "thread_id": thread_id,
+            "report": values.get("final_report"),
+            "timing": self.last_stream_timing
+        }
+
+    def stream_contracts(self, files: List[Dict[str, Any]], batch: Optional[bool] = None,
+                         thread_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        process_contracts that yields events while the graph runs.
+
+        Yields {"type": "progress", "node", "message"} as each node finishes,
+        {"type": "token", "node", "content"} for every piece of model text as
+        it is generated, and finally {"type": "report", "thread_id", "report",
+        "timing"}. Every event carries the seconds elapsed since the start;
+        timing holds the time to the first event, to the first token and in
+        total.
+        """
+        thread_id = thread_id or str(uuid.uuid4())
+        init = self._initial_state(files, batch)
+        run = RunMetrics(thread_id)
+        config = self._run_config(thread_id, run)
+        timer = StreamTimer()
+        for mode, data in self.graph.stream(init, config=config, stream_mode=["updates", "messages"]):
+            event = self._stream_event(mode, data)
+            if event is not None:
+                yield timer.mark(event)
+        yield timer.mark(self._stream_result(thread_id, run, timer))
+
+    async def astream_contracts(self, files: List[Dict[str, Any]], batch: Optional[bool] = None,
+                                thread_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Async variant of stream_contracts"""
+        thread_id = thread_id or str(uuid.uuid4())
+        init = self._initial_state(files, batch)
+        run = RunMetrics(thread_id)
+        config = self._run_config(thread_id, run)
+        timer = StreamTimer()
+        async for mode, data in self.async_graph.astream(init, config=config, stream_mode=["updates", "messages"]):
+            event = self._stream_event(mode, data)
+            if event is not None:
+                yield timer.mark(event)
+        yield timer.mark(self._stream_result(thread_id, run, timer))
+
+    def get_report(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """Final report of an earlier run, read from its checkpoint thread"""
+        state = self.graph.get_state({"configurable": {"thread_id": thread_id}})
+        return state.values.get("final_report") if state.values else None
+
+    def _followup_inputs(self, thread_id: str, question: str) -> Dict[str, Any]:
+        state = self.graph.get_state({"configurable": {"thread_id": thread_id}})
+        return followup_inputs(state.values, question)
+
+    def _save_followup(self, thread_id: str, question: str, answer: str) -> None:
+        """Append the exchange to the run's checkpoint so later questions see it"""
+        self.graph.update_state(
+            {"configurable": {"thread_id": thread_id}},
+            {"messages": [HumanMessage(content=question), AIMessage(content=answer)]},
+            as_node="chat_interface"
+        )
+        self.checkpointer.compact_thread(thread_id)
+
+    def stream_answer(self, thread_id: str, question: str) -> Iterator[str]:
+        """
+        Answer a follow-up question about a finished run, yielding the answer as it streams.
+
+        The answer comes from one model call over the run's checkpointed report
+        and contract text; the graph itself is not re-run. Raises ValueError
+        when the thread holds no finished analysis. last_stream_timing holds
+        the time to the first token and in total once the answer is complete.
+        """
+        timer = StreamTimer()
+        inputs = self._followup_inputs(thread_id, question)
+        parts = []
+        for chunk in followup_chain().stream(inputs):
+            text = message_text(chunk.content)
+            if text:
+                timer.mark({"type": "token"})
+                parts.append(text)
+                yield text
+        self._save_followup(thread_id, question, "".join(parts))
+        self._set_last_run(stream_timing=timer.stop())
+
+    def answer_question(self, thread_id: str, question: str) -> str:
+        """Non-streaming variant of stream_answer"""
+        return "".join(self.stream_answer(thread_id, question))
+
+    async def aanswer_question(self, thread_id: str, question: str) -> str:
+        """Async variant of answer_question"""
+        inputs = await asyncio.to_thread(self._followup_inputs, thread_id, question)
+        answer = await followup_chain().ainvoke(inputs)
+        text = message_text(answer.content)
+        await asyncio.to_thread(self._save_followup, thread_id, question, text)
+        return text
+
+    def get_followups(self, thread_id: str) -> List[Tuple[str, str]]:
+        """(role, text) pairs of the follow-up questions and answers saved for a run"""
+        state = self.graph.get_state({"configurable": {"thread_id": thread_id}})
+        return [
+            ("user" if isinstance(m, HumanMessage) else "assistant", m.content)
+            for m in (state.values or {}).get("messages", [])
+            if isinstance(m, (HumanMessage, AIMessage))
+        ]
+
+    def close(self) -> None:
+        """Shut down the extraction worker processes and the checkpoint database"""
+        if self._extraction_pool is not None:
+            self._extraction_pool.shutdown()
+            self._extraction_pool = None
+        self.checkpointer.conn.close()
 
     def visualize_graph(self, save_path: str = "contract_analysis_graph.png"):
         """Display the agent graph as a Mermaid diagram and save it to file"""
+        # Only needed for visualization, so keep PIL off the import path
+        import io
+        from PIL import Image as PILImage
+
         # Get the graph data as PNG bytes
         graph_png = self.graph.get_graph().draw_mermaid_png()
         
@@ -1,38 +1,40 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.agents import create_react_agent, AgentExecutor
 from langchain_core.prompts import PromptTemplate
-from langchain.memory import ConversationBufferMemory
-from langchain import hub
 from modules.tools.web_search_tool import web_search
 from modules.tools.compliance_checker_tool import check_compliance_rules
-from modules.tools.contract_analyzer_tool import analyze_contract_compliance
-import os
-import json
-import re
+from modules.tools.contract_analyzer_tool import ComplianceAnalysis, analyze_contract_compliance
+from modules.resources import DEFAULT_CHAT_MODEL, get_chat_model
+from modules.structured_output import arepair_text, repair_text
+from modules.session_memory import SessionMemory
 from dotenv import load_dotenv
 
 load_dotenv()
 
 class ResearchAgent:
-    def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            temperature=0,
-            google_api_key=os.getenv("GOOGLE_API_KEY")
-        )
-
+    def __init__(self, memory: SessionMemory = None):
         self.tools = [
             web_search,
             check_compliance_rules,  # Call the function to get the tool
             analyze_contract_compliance # This tool now expects both contract_text and rules_context
         ]
 
-        self.memory = ConversationBufferMemory(
-            return_messages=True,
-            memory_key="chat_history"
-        )
+        # History is kept per session (the orchestrator passes its run's
+        # thread id) and bounded in tokens, so prompts do not grow with the
+        # number of contracts a long-running worker has analysed
+        self.memory = memory or SessionMemory()
+
+        # The LLM and agent executor are built on first use
+        self._agent = None
 
-        self.agent = self._create_agent()
+    @property
+    def llm(self):
+        return get_chat_model(DEFAULT_CHAT_MODEL, temperature=0)
+
+    @property
+    def agent(self) -> AgentExecutor:
+        if self._agent is None:
+            self._agent = self._create_agent()
+        return self._agent
 
     def _create_agent(self):
         """Create the ReAct agent with enhanced JSON output capability"""
@@ -76,148 +78,132 @@ class ResearchAgent:
         return AgentExecutor(
         agent=agent,
         tools=self.tools,
-        memory=self.memory,
-        verbose=True,
+        # Step-by-step traces go to callbacks (modules.metrics), not stdout
+        verbose=False,
         handle_parsing_errors=True,
         max_iterations=3  # Reduced to prevent loops
         )
 
 
-    def research(self, query: str) -> str:
-        """Execute open-ended research query"""
+    def _agent_input(self, query: str, session_id: str = None) -> dict:
+        return {"input": query, "chat_history": self.memory.buffer(session_id)}
+
+    def research(self, query: str, session_id: str = None) -> str:
+        """Execute open-ended research query within the given session's conversation"""
+        try:
+            response = self.agent.invoke(self._agent_input(query, session_id))
+            output = response.get("output", "No output returned.")
+            self.memory.add_exchange(session_id, query, output)
+            return output
+        except Exception as e:
+            return f"Error during research: {str(e)}"
+
+    async def aresearch(self, query: str, session_id: str = None) -> str:
+        """Async variant of research for use inside an event loop"""
         try:
-            response = self.agent.invoke({"input": query})
-            return response.get("output", "No output returned.")
+            response = await self.agent.ainvoke(self._agent_input(query, session_id))
+            output = response.get("output", "No output returned.")
+            self.memory.add_exchange(session_id, query, output)
+            return output
         except Exception as e:
             return f"Error during research: {str(e)}"
 
-    def analyze_contract(self, contract_text: str, contract_type: str = None, rules_context: str = "") -> dict:
+    def _analysis_request(self, contract_text: str, contract_type: str = None, rules_context: str = "") -> str:
+        """Agent input asking for a structured JSON analysis with rules context"""
+        return f"""
+        Analyze the following contract text for compliance and return structured JSON output:
+
+        CONTRACT TEXT:
+        {contract_text}
+
+        CONTRACT TYPE: {contract_type or "Unknown"}
+
+        COMPLIANCE RULES TO CHECK AGAINST:
+        {rules_context}
+
+        ANALYSIS REQUIREMENTS:
+        1. Identify the contract type (use provided type as reference)
+        2. Extract all parties involved (companies, individuals with contractual obligations)
+        3. Use the analyze_contract_compliance tool with both contract_text and rules_context
+        4. Calculate risk score using the weighted methodology provided
+        5. Identify specific shortcomings based on the rules provided
+        6. Return ONLY valid JSON in the specified format - no additional text
+
+        IMPORTANT: Use the analyze_contract_compliance tool with both contract_text and rules_context parameters.
+        The rules_context contains the specific compliance rules to check against.
+        """
+
+    def _analysis_report(self, parsed, contract_type: str = None) -> dict:
+        """Report dict from a validated ComplianceAnalysis"""
+        if parsed is None:
+            raise ValueError("Agent output could not be validated as a compliance analysis")
+        report = parsed.model_dump()
+        if not report["document_type"]:
+            report["document_type"] = contract_type or "Unknown"
+        return report
+
+    def _analysis_failure(self, contract_type: str, e: Exception) -> dict:
+        # No risk score is made up for a contract that was never analysed
+        return {
+            "status": "error",
+            "error": str(e),
+            "document_type": contract_type or "Error",
+            "parties_involved": [],
+            "risk_score": {
+                "overall_score": None,
+                "risk_level": "Unknown",
+                "breakdown": {}
+            },
+            "shortcomings": [{
+                "category": "SYSTEM_ERROR",
+                "issue": f"Analysis failed: {str(e)}",
+                "severity": "Critical",
+                "points_deducted": 0
+            }],
+            "compliance_summary": {
+                "total_rules_checked": 0,
+                "rules_violated": 0,
+                "compliance_percentage": 0
+            }
+        }
+
+    def _remember_analysis(self, session_id: str, contract_type: str, output: str) -> None:
+        # The contract itself is not kept; later prompts only need the outcome
+        self.memory.add_exchange(session_id, f"Analyze the {contract_type or 'Unknown'} contract for compliance.", output)
+
+    async def aanalyze_contract(self, contract_text: str, contract_type: str = None, rules_context: str = "",
+                                session_id: str = None) -> dict:
+        """Async variant of analyze_contract"""
+        try:
+            analysis_prompt = self._analysis_request(contract_text, contract_type, rules_context)
+            response = await self.agent.ainvoke(self._agent_input(analysis_prompt, session_id))
+            self._remember_analysis(session_id, contract_type, response.get("output", ""))
+            parsed = await arepair_text(response.get("output", ""), ComplianceAnalysis)
+            return self._analysis_report(parsed, contract_type)
+        except Exception as e:
+            return self._analysis_failure(contract_type, e)
+
+    def analyze_contract(self, contract_text: str, contract_type: str = None, rules_context: str = "",
+                         session_id: str = None) -> dict:
         """
         Analyze contract compliance and return structured JSON with:
         1. Contract type detection
         2. Compliance rule extraction
         3. Risk scoring with weighted methodology
         4. Shortcoming identification
+
+        session_id selects the conversation memory used (see SessionMemory).
         """
-        
         try:
-            # Enhanced prompt for structured JSON analysis with rules context
-            analysis_prompt = f"""
-            Analyze the following contract text for compliance and return structured JSON output:
-
-            CONTRACT TEXT:
-            {contract_text}
-
-            CONTRACT TYPE: {contract_type or "Unknown"}
-
-            COMPLIANCE RULES TO CHECK AGAINST:
-            {rules_context}
-
-            ANALYSIS REQUIREMENTS:
-            1. Identify the contract type (use provided type as reference)
-            2. Extract all parties involved (companies, individuals with contractual obligations)
-            3. Use the analyze_contract_compliance tool with both contract_text and rules_context
-            4. Calculate risk score using the weighted methodology provided
-            5. Identify specific shortcomings based on the rules provided
-            6. Return ONLY valid JSON in the specified format - no additional text
-
-            IMPORTANT: Use the analyze_contract_compliance tool with both contract_text and rules_context parameters.
-            The rules_context contains the specific compliance rules to check against.
-            """
-            
-            response = self.agent.invoke({"input": analysis_prompt})
-            result = response.get("output", "{}")
-            
-            # Attempt to parse JSON response
-            try:
-                json_result = json.loads(result)
-                
-                # Ensure the result has the required structure
-                if not isinstance(json_result, dict):
-                    raise ValueError("Result is not a dictionary")
-                
-                # Add contract_type if missing
-                if "document_type" not in json_result:
-                    json_result["document_type"] = contract_type or "Unknown"
-                
-                # Ensure risk_score structure exists
-                if "risk_score" not in json_result:
-                    json_result["risk_score"] = {
-                        "overall_score": 0,
-                        "risk_level": "Unknown",
-                        "breakdown": {
-                            "compliance_rules_score": 0,
-                            "validation_criteria_score": 0,
-                            "common_violations_score": 0,
-                            "regulatory_references_score": 0
-                        }
-                    }
-                
-                return json_result
-                
-            except (json.JSONDecodeError, ValueError) as e:
-                # If JSON parsing fails, try to extract JSON from the response
-                json_match = re.search(r'\{.*\}', result, re.DOTALL)
-                if json_match:
-                    try:
-                        json_result = json.loads(json_match.group())
-                        return json_result
-                    except json.JSONDecodeError:
-                        pass
-                
-                # Fallback: return error structure
-                return {
-                    "document_type": contract_type or "Unknown",
-                    "parties_involved": [],
-                    "risk_score": {
-                        "overall_score": 50,
-                        "risk_level": "Medium",
-                        "breakdown": {
-                            "compliance_rules_score": 0,
-                            "validation_criteria_score": 0,
-                            "common_violations_score": 0,
-                            "regulatory_references_score": 0
-                        }
-                    },
-                    "shortcomings": [{
-                        "category": "SYSTEM_ERROR",
-                        "issue": f"Failed to parse contract analysis: {str(e)}",
-                        "severity": "High",
-                        "points_deducted": 50
-                    }],
-                    "compliance_summary": {
-                        "total_rules_checked": 0,
-                        "rules_violated": 1,
-                        "compliance_percentage": 0
-                    }
-                }
-                
+            analysis_prompt = self._analysis_request(contract_text, contract_type, rules_context)
+            response = self.agent.invoke(self._agent_input(analysis_prompt, session_id))
+            self._remember_analysis(session_id, contract_type, response.get("output", ""))
+            # The final answer is free text; validate it against the schema and
+            # only re-ask the model to restructure it when that fails
+            parsed = repair_text(response.get("output", ""), ComplianceAnalysis)
+            return self._analysis_report(parsed, contract_type)
         except Exception as e:
-            return {
-                "document_type": contract_type or "Error",
-                "parties_involved": [],
-                "risk_score": {
-                    "overall_score": 100,
-                    "risk_level": "Critical",
-                    "breakdown": {
-                        "compliance_rules_score": 25,
-                        "validation_criteria_score": 25,
-                        "common_violations_score": 25,
-                        "regulatory_references_score": 25
-                    }
-                },
-                "shortcomings": [{
-                    "category": "SYSTEM_ERROR",
-                    "issue": f"Analysis failed: {str(e)}",
-                    "severity": "Critical",
-                    "points_deducted": 100
-                }],
-                "compliance_summary": {
-                    "total_rules_checked": 0,
-                    "rules_violated": 1,
-                    "compliance_percentage": 0
-                }
-            }
+            return self._analysis_failure(contract_type, e)
 
 
         def _extract_contract_type(self, response_obj):
@@ -0,0 +1,34 @@
+# modules/callbacks.py
+"""
+Callback handlers attached to graph runs.
+
+Handlers passed in a run's config are inherited by every chain, agent and
+tool invoked inside the graph nodes, so they see each model call without
+the nodes having to thread them through.
+"""
+import threading
+from typing import Any, Dict, List
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    """Counts model calls made during a run, in total and per model name"""
+
+    def __init__(self):
+        self.calls = 0
+        self.by_model: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, serialized: Dict[str, Any], kwargs: Dict[str, Any]) -> None:
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or (serialized or {}).get("name", "unknown")
+        with self._lock:
+            self.calls += 1
+            self.by_model[model] = self.by_model.get(model, 0) + 1
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], **kwargs: Any) -> None:
+        self._count(serialized, kwargs)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any) -> None:
+        self._count(serialized, kwargs)
@@ -0,0 +1,120 @@
+# modules/checkpoints.py
+"""
+SQLite checkpointer for the orchestrator graphs.
+
+Every analysis run gets its own checkpoint thread. Checkpoints live in a
+SQLite database (a file, or ":memory:" for throwaway orchestrators), so a
+long-lived worker keeps no per-run state in Python memory and a restarted
+app can still load a run's report. Each thread is compacted down to its
+latest checkpoint once the run finishes, and threads idle for longer than
+the retention period, or beyond the maximum thread count, are pruned.
+"""
+import asyncio
+import os
+import sqlite3
+import time
+from typing import Any, AsyncIterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+DEFAULT_CHECKPOINT_PATH = "./checkpoints.db"
+CHECKPOINT_TTL_SECONDS = float(os.getenv("CHECKPOINT_TTL_SECONDS", str(7 * 24 * 3600)))
+CHECKPOINT_MAX_THREADS = int(os.getenv("CHECKPOINT_MAX_THREADS", "1000"))
+
+
+class SqliteCheckpointer(SqliteSaver):
+    """
+    SqliteSaver that also serves the async graph and supports retention.
+
+    The async methods run the synchronous ones in a worker thread; the
+    connection is shared and serialized by the saver's lock.
+    """
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_PATH, ttl_seconds: Optional[float] = CHECKPOINT_TTL_SECONDS,
+                 max_threads: Optional[int] = CHECKPOINT_MAX_THREADS):
+        super().__init__(sqlite3.connect(path, check_same_thread=False))
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_threads = max_threads
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS thread_activity (thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        result = super().put(config, checkpoint, metadata, new_versions)
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO thread_activity (thread_id, updated_at) VALUES (?, ?)",
+                (str(config["configurable"]["thread_id"]), time.time())
+            )
+        return result
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+
+    def compact_thread(self, thread_id: str) -> None:
+        """Keep only the latest checkpoint (and its writes) of a finished thread"""
+        with self.cursor() as cur:
+            # Checkpoint ids are time-ordered, so the greatest id is the latest
+            for table in ("writes", "checkpoints"):
+                cur.execute(
+                    f"""
+                    DELETE FROM {table} WHERE thread_id = ? AND checkpoint_id < (
+                        SELECT MAX(checkpoint_id) FROM checkpoints c
+                        WHERE c.thread_id = {table}.thread_id AND c.checkpoint_ns = {table}.checkpoint_ns
+                    )
+                    """,
+                    (str(thread_id),)
+                )
+
+    def prune(self) -> int:
+        """Delete threads past the retention period or beyond max_threads; returns how many"""
+        with self.cursor() as cur:
+            stale = set()
+            if self.ttl_seconds is not None:
+                cur.execute("SELECT thread_id FROM thread_activity WHERE updated_at < ?",
+                            (time.time() - self.ttl_seconds,))
+                stale.update(row[0] for row in cur.fetchall())
+            if self.max_threads is not None:
+                cur.execute("SELECT thread_id FROM thread_activity ORDER BY updated_at DESC LIMIT -1 OFFSET ?",
+                            (self.max_threads,))
+                stale.update(row[0] for row in cur.fetchall())
+        for thread_id in stale:
+            self.delete_thread(thread_id)
+        return len(stale)
+
+    def thread_count(self) -> int:
+        with self.cursor(transaction=False) as cur:
+            cur.execute("SELECT COUNT(*) FROM thread_activity")
+            return cur.fetchone()[0]
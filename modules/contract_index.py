@@ -0,0 +1,116 @@
+# modules/contract_index.py
+"""
+In-memory similarity index over the passages of one contract.
+
+A contract is split into overlapping word passages and embedded once; the
+index is kept (least-recently-used, keyed on the text hash) so re-analysing
+the same contract, or checking it against another rule set, reuses the
+vectors. Rule lines are matched against it to send the model only the
+passages relevant to each rule.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from modules.agents.document_processor import DocumentProcessor
+
+PASSAGE_WORDS = 200
+PASSAGE_OVERLAP = 40
+MAX_INDEXES = 32
+
+# Each entry also holds the embeddings client it was built with: while the
+# entry lives the client cannot be freed, so its id in the key cannot be
+# reused by a different client (resources.reset also clears the cache)
+_indexes: "OrderedDict[Tuple[str, int, int, int], Tuple[object, ContractIndex]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _normalized(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+class ContractIndex:
+    """Passages of one contract with their unit-length embedding vectors"""
+
+    def __init__(self, passages: List[str], vectors):
+        self.passages = passages
+        self.vectors = _normalized(vectors)
+
+    @staticmethod
+    def split(text: str, passage_words: int = PASSAGE_WORDS, overlap: int = PASSAGE_OVERLAP) -> List[str]:
+        return DocumentProcessor().chunk_document(text, chunk_size=passage_words, overlap=overlap)
+
+    def search(self, query_vectors, k: int) -> List[List[Tuple[int, float]]]:
+        """Top-k (passage index, cosine similarity) for every query vector, best first"""
+        if not self.passages:
+            return [[] for _ in query_vectors]
+        scores = _normalized(query_vectors) @ self.vectors.T
+        k = min(k, len(self.passages))
+        results = []
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top])]
+            results.append([(int(i), float(row[i])) for i in top])
+        return results
+
+
+def _index_key(text: str, embedding, passage_words: int, overlap: int) -> Tuple[str, int, int, int]:
+    return (hashlib.sha256(text.encode("utf-8")).hexdigest(), id(embedding), passage_words, overlap)
+
+
+def _cached(key) -> Optional[ContractIndex]:
+    with _lock:
+        entry = _indexes.get(key)
+        if entry is None:
+            return None
+        _indexes.move_to_end(key)
+        return entry[1]
+
+
+def _remember(key, embedding, index: ContractIndex) -> ContractIndex:
+    with _lock:
+        _indexes[key] = (embedding, index)
+        _indexes.move_to_end(key)
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def get_contract_index(text: str, embedding=None, passage_words: int = PASSAGE_WORDS,
+                       overlap: int = PASSAGE_OVERLAP) -> ContractIndex:
+    """Index for text, embedding its passages only the first time it is seen"""
+    if embedding is None:
+        from modules.resources import get_embeddings
+        embedding = get_embeddings()
+    key = _index_key(text, embedding, passage_words, overlap)
+    index = _cached(key)
+    if index is None:
+        passages = ContractIndex.split(text, passage_words, overlap)
+        vectors = embedding.embed_documents(passages) if passages else np.zeros((0, 1))
+        index = _remember(key, embedding, ContractIndex(passages, vectors))
+    return index
+
+
+async def aget_contract_index(text: str, embedding=None, passage_words: int = PASSAGE_WORDS,
+                              overlap: int = PASSAGE_OVERLAP) -> ContractIndex:
+    """Async variant of get_contract_index"""
+    if embedding is None:
+        from modules.resources import get_embeddings
+        embedding = get_embeddings()
+    key = _index_key(text, embedding, passage_words, overlap)
+    index = _cached(key)
+    if index is None:
+        passages = ContractIndex.split(text, passage_words, overlap)
+        vectors = await embedding.aembed_documents(passages) if passages else np.zeros((0, 1))
+        index = _remember(key, embedding, ContractIndex(passages, vectors))
+    return index
+
+
+def clear() -> None:
+    with _lock:
+        _indexes.clear()
@@ -0,0 +1,89 @@
+# modules/extraction_cache.py
+"""
+Content-addressed cache of parsed documents.
+
+Entries are keyed by the SHA-256 of the uploaded file's bytes and hold the
+extracted text together with its metadata, so re-uploading or re-running
+the same file skips PDF/DOCX parsing entirely. The cache lives in a local
+directory shared by every process and is trimmed least-recently-used first
+once it grows past its size limit.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+DEFAULT_CACHE_DIR = "./.extraction_cache"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Bump when the extracted text or metadata format changes
+EXTRACTION_VERSION = 2
+
+
+class ExtractionCache:
+    """Directory of JSON entries with LRU eviction by total size"""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def file_digest(file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _entry_path(self, digest: str) -> Path:
+        return self.cache_dir / f"{digest}.v{EXTRACTION_VERSION}.json"
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        path = self._entry_path(digest)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        # The modification time doubles as the last-access time for eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, digest: str, entry: Dict[str, Any]) -> None:
+        # Write to a temp file and rename so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._entry_path(digest))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        total = 0
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # removed by another process
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
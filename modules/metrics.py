@@ -0,0 +1,319 @@
+# modules/metrics.py
+"""
+Latency, token, cost and cache metrics for analysis runs.
+
+A RunMetrics handler is attached to every run's config (like the call
+counter it extends, it sees each node, tool and model call made inside the
+graph). When the run finishes its timings are folded into the process-wide
+`metrics` registry, labelled by contract type, and, if METRICS_LOG_PATH is
+set, appended as one JSON line tagged with the run id. The registry can be
+exported in the Prometheus text format for a textfile collector or scrape
+endpoint.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import dispatch_custom_event
+
+from modules.callbacks import LLMCallCounter
+
+# JSON-lines file receiving one record per finished run (unset = no log)
+METRICS_LOG_PATH = os.getenv("METRICS_LOG_PATH")
+# USD per million prompt / completion tokens, overridable with LLM_PRICES='{"model": [in, out]}'
+LLM_PRICES: Dict[str, Tuple[float, float]] = {
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-1.5-pro": (1.25, 5.00),
+    **{k: tuple(v) for k, v in json.loads(os.getenv("LLM_PRICES", "{}")).items()}
+}
+
+CACHE_EVENT = "cache_lookup"
+
+# name -> (type, help) of every exported metric
+METRICS = {
+    "contract_runs_total": ("counter", "Finished analysis runs"),
+    "contract_run_seconds": ("summary", "Wall time of whole analysis runs"),
+    "contract_node_seconds": ("summary", "Wall time per LangGraph node"),
+    "contract_tool_seconds": ("summary", "Wall time per tool call"),
+    "contract_llm_seconds": ("summary", "Wall time per model call"),
+    "contract_llm_prompt_tokens_total": ("counter", "Prompt tokens sent to the model"),
+    "contract_llm_completion_tokens_total": ("counter", "Completion tokens returned by the model"),
+    "contract_llm_cost_usd_total": ("counter", "Estimated model cost in USD"),
+    "contract_llm_retries_total": ("counter", "Model call retries"),
+    "contract_llm_errors_total": ("counter", "Model calls that raised"),
+    "contract_cache_lookups_total": ("counter", "Cache lookups by cache and result"),
+}
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    """Report a cache lookup to the metrics handler of the run it happens in (if any)"""
+    try:
+        dispatch_custom_event(CACHE_EVENT, {"cache": cache, "hit": hit})
+    except RuntimeError:
+        # Called outside a graph run
+        pass
+
+
+def _model_name(serialized: Dict[str, Any], kwargs: Dict[str, Any]) -> str:
+    params = kwargs.get("invocation_params") or {}
+    model = params.get("model") or params.get("model_name") or (serialized or {}).get("name", "unknown")
+    return model.split("/")[-1]
+
+
+def _token_usage(response) -> Tuple[int, int]:
+    prompt = completion = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt += usage.get("input_tokens", 0)
+            completion += usage.get("output_tokens", 0)
+    if not prompt and not completion:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt = usage.get("prompt_tokens", 0)
+        completion = usage.get("completion_tokens", 0)
+    return prompt, completion
+
+
+def llm_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prices = LLM_PRICES.get(model)
+    if prices is None:
+        return 0.0
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1e6
+
+
+class RunMetrics(LLMCallCounter):
+    """
+    Times every graph node, tool call and model call of one run and counts
+    tokens, retries and cache lookups.
+
+    Spans are keyed by callback run id, so parallel branches of the same run
+    are timed separately.
+    """
+
+    def __init__(self, run_id: str):
+        super().__init__()
+        self.run_id = run_id
+        self.started = time.perf_counter()
+        self._open: Dict[UUID, Tuple[str, str, float]] = {}
+        self.spans: List[Dict[str, Any]] = []
+        self.llm: Dict[str, Dict[str, float]] = {}
+        self.cache: Dict[str, Dict[str, int]] = {}
+
+    def _start(self, run_id: UUID, kind: str, name: str) -> None:
+        with self._lock:
+            self._open[run_id] = (kind, name, time.perf_counter())
+
+    def _end(self, run_id: UUID, error: bool = False) -> Optional[Tuple[str, str, float]]:
+        with self._lock:
+            opened = self._open.pop(run_id, None)
+            if opened is None:
+                return None
+            kind, name, start = opened
+            seconds = time.perf_counter() - start
+            self.spans.append({"kind": kind, "name": name, "seconds": round(seconds, 6), "error": error})
+            return kind, name, seconds
+
+    def _model(self, model: str) -> Dict[str, float]:
+        return self.llm.setdefault(model, dict.fromkeys(
+            ("calls", "seconds", "prompt_tokens", "completion_tokens", "retries", "errors", "cost_usd"), 0
+        ))
+
+    # Graph nodes: the chain LangGraph starts for a node carries the node's name
+
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Dict[str, Any], *, run_id: UUID,
+                       metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            self._start(run_id, "node", node)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error=True)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, "tool", kwargs.get("name") or (serialized or {}).get("name", "unknown"))
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error=True)
+
+    def _count(self, serialized: Dict[str, Any], kwargs: Dict[str, Any]) -> None:
+        super()._count(serialized, kwargs)
+        self._start(kwargs["run_id"], "llm", _model_name(serialized, kwargs))
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        ended = self._end(run_id)
+        if ended is None:
+            return
+        _, model, seconds = ended
+        prompt, completion = _token_usage(response)
+        with self._lock:
+            stats = self._model(model)
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["prompt_tokens"] += prompt
+            stats["completion_tokens"] += completion
+            stats["cost_usd"] += llm_cost(model, prompt, completion)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        ended = self._end(run_id, error=True)
+        if ended is not None:
+            with self._lock:
+                self._model(ended[1])["errors"] += 1
+
+    def on_retry(self, retry_state: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            opened = self._open.get(run_id)
+            self._model(opened[1] if opened else "unknown")["retries"] += 1
+
+    def on_custom_event(self, name: str, data: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        if name != CACHE_EVENT:
+            return
+        with self._lock:
+            counts = self.cache.setdefault(data["cache"], {"hit": 0, "miss": 0})
+            counts["hit" if data["hit"] else "miss"] += 1
+
+    def record(self, contract_type: Optional[str], status: str = "ok") -> Dict[str, Any]:
+        """JSON-serialisable summary of the run"""
+        with self._lock:
+            nodes: Dict[str, float] = {}
+            tools: Dict[str, float] = {}
+            for span in self.spans:
+                target = nodes if span["kind"] == "node" else tools if span["kind"] == "tool" else None
+                if target is not None:
+                    target[span["name"]] = round(target.get(span["name"], 0) + span["seconds"], 6)
+            return {
+                "timestamp": time.time(),
+                "run_id": self.run_id,
+                "contract_type": contract_type or "unknown",
+                "status": status,
+                "seconds": round(time.perf_counter() - self.started, 6),
+                "nodes": nodes,
+                "tools": tools,
+                "llm": {model: {k: round(v, 6) for k, v in stats.items()} for model, stats in self.llm.items()},
+                "cache": {cache: dict(counts) for cache, counts in self.cache.items()},
+                "spans": list(self.spans)
+            }
+
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class MetricsRegistry:
+    """Thread-safe counters and summaries (count / sum / max) exported as Prometheus text"""
+
+    def __init__(self, log_path: Optional[str] = METRICS_LOG_PATH):
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters: Dict[Key, float] = {}
+            self._summaries: Dict[Key, List[float]] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, str]) -> Key:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            summary = self._summaries.setdefault(key, [0, 0.0, 0.0])
+            summary[0] += 1
+            summary[1] += value
+            summary[2] = max(summary[2], value)
+
+    def add_run(self, record: Dict[str, Any]) -> None:
+        """Fold a RunMetrics.record() into the registry and the JSON log"""
+        ct = record["contract_type"]
+        self.inc("contract_runs_total", contract_type=ct, status=record["status"])
+        self.observe("contract_run_seconds", record["seconds"], contract_type=ct)
+        for span in record["spans"]:
+            if span["kind"] != "llm":
+                self.observe(f"contract_{span['kind']}_seconds", span["seconds"], contract_type=ct,
+                             **{span["kind"]: span["name"]})
+            else:
+                self.observe("contract_llm_seconds", span["seconds"], contract_type=ct, model=span["name"])
+        for model, stats in record["llm"].items():
+            self.inc("contract_llm_prompt_tokens_total", stats["prompt_tokens"], contract_type=ct, model=model)
+            self.inc("contract_llm_completion_tokens_total", stats["completion_tokens"], contract_type=ct, model=model)
+            self.inc("contract_llm_cost_usd_total", stats["cost_usd"], contract_type=ct, model=model)
+            self.inc("contract_llm_retries_total", stats["retries"], contract_type=ct, model=model)
+            self.inc("contract_llm_errors_total", stats["errors"], contract_type=ct, model=model)
+        for cache, counts in record["cache"].items():
+            for result, n in counts.items():
+                self.inc("contract_cache_lookups_total", n, contract_type=ct, cache=cache, result=result)
+        if self.log_path:
+            line = json.dumps(record, default=str)
+            with self._lock:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Every series as {"name", "labels", ...} dicts"""
+        with self._lock:
+            counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self._counters.items()]
+            summaries = [
+                {"name": n, "labels": dict(l), "count": c, "sum": round(s, 6), "max": round(m, 6)}
+                for (n, l), (c, s, m) in self._summaries.items()
+            ]
+        return {"counters": counters, "summaries": summaries}
+
+    def node_summary(self) -> Dict[str, Dict[str, float]]:
+        """Mean and max seconds per graph node across contract types, slowest first"""
+        totals: Dict[str, List[float]] = {}
+        for series in self.snapshot()["summaries"]:
+            if series["name"] == "contract_node_seconds":
+                total = totals.setdefault(series["labels"]["node"], [0, 0.0, 0.0])
+                total[0] += series["count"]
+                total[1] += series["sum"]
+                total[2] = max(total[2], series["max"])
+        return {
+            node: {"count": c, "mean_seconds": round(s / c, 6), "max_seconds": m}
+            for node, (c, s, m) in sorted(totals.items(), key=lambda item: -item[1][1])
+        }
+
+    def to_prometheus(self) -> str:
+        snapshot = self.snapshot()
+        by_name: Dict[str, List[str]] = {}
+
+        def labels(values: Dict[str, str]) -> str:
+            if not values:
+                return ""
+            escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values.values())
+            return "{" + ",".join(f'{k}="{v}"' for k, v in zip(values, escaped)) + "}"
+
+        for series in snapshot["counters"]:
+            by_name.setdefault(series["name"], []).append(f"{series['name']}{labels(series['labels'])} {series['value']}")
+        for series in snapshot["summaries"]:
+            lines = by_name.setdefault(series["name"], [])
+            lines.append(f"{series['name']}_count{labels(series['labels'])} {series['count']}")
+            lines.append(f"{series['name']}_sum{labels(series['labels'])} {series['sum']}")
+        out = []
+        for name in sorted(by_name):
+            kind, help_text = METRICS.get(name, ("untyped", name))
+            out += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"] + sorted(by_name[name])
+        return "\n".join(out) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """Write the Prometheus text atomically (for node_exporter's textfile collector)"""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp, path)
+
+
+metrics = MetricsRegistry()
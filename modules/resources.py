@@ -0,0 +1,386 @@
+# modules/resources.py
+"""
+Lazily created clients shared by the agents and tools.
+
+Nothing here talks to the network or builds the vector store at import
+time: each resource is created on first use and reused afterwards, so
+importing the agents stays cheap and workers only pay for what they use.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+DEFAULT_CHAT_MODEL = "gemini-1.5-flash"
+DEFAULT_EMBEDDING_MODEL = "models/embedding-001"
+
+# Chat clients kept per (model, temperature, timeout) and per-request timeout in seconds
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "4"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+# Model calls in flight at once across the whole process (0 = unlimited)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+
+_lock = threading.RLock()
+_instances: Dict[Hashable, Any] = {}
+_event_loop_patched = False
+
+
+class ClientPool:
+    """
+    Thread-safe round-robin pool holding up to `size` instances per key.
+
+    Clients keep their underlying connection open, so handing out the same
+    few instances reuses connections and TLS sessions across calls instead
+    of paying for a new client per request.
+    """
+
+    def __init__(self, size: int = LLM_POOL_SIZE):
+        self.size = max(1, size)
+        self._items: Dict[Hashable, List[Any]] = {}
+        self._next: Dict[Hashable, int] = {}
+        self._lock = threading.RLock()
+
+    def get(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        with self._lock:
+            items = self._items.setdefault(key, [])
+            if len(items) < self.size:
+                items.append(factory())
+                return items[-1]
+            index = self._next.get(key, 0)
+            self._next[key] = (index + 1) % self.size
+            return items[index]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._next.clear()
+
+
+class ConcurrencyLimiter:
+    """
+    Process-wide cap on model calls in flight, shared by threads and event loops.
+
+    Slots are re-entrant within one call (an async call that falls back to
+    the sync implementation in an executor does not take a second slot).
+    active and peak report current and highest concurrency.
+    """
+
+    def __init__(self, limit: Optional[int] = LLM_MAX_CONCURRENCY):
+        self._lock = threading.Lock()
+        self._held = contextvars.ContextVar(f"llm_slot_{id(self)}", default=False)
+        self.active = 0
+        self.peak = 0
+        self.set_limit(limit)
+
+    def set_limit(self, limit: Optional[int]) -> None:
+        # Calls already holding a slot release it on the semaphore they took it from
+        self.limit = limit or None
+        self._semaphore = threading.BoundedSemaphore(limit) if limit else None
+
+    def _enter(self) -> None:
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+
+    def _exit(self) -> None:
+        with self._lock:
+            self.active -= 1
+
+    @contextmanager
+    def slot(self):
+        if self._held.get():
+            yield
+            return
+        semaphore = self._semaphore
+        if semaphore is not None:
+            semaphore.acquire()
+        token = self._held.set(True)
+        self._enter()
+        try:
+            yield
+        finally:
+            self._exit()
+            self._held.reset(token)
+            if semaphore is not None:
+                semaphore.release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        if self._held.get():
+            yield
+            return
+        semaphore = self._semaphore
+        if semaphore is not None:
+            # Poll instead of blocking the event loop; a cancelled waiter holds nothing
+            while not semaphore.acquire(blocking=False):
+                await asyncio.sleep(0.005)
+        token = self._held.set(True)
+        self._enter()
+        try:
+            yield
+        finally:
+            self._exit()
+            self._held.reset(token)
+            if semaphore is not None:
+                semaphore.release()
+
+
+llm_limiter = ConcurrencyLimiter()
+
+
+def limit_concurrency(cls):
+    """
+    Subclass of a chat model class whose generations run inside llm_limiter slots.
+
+    Only the generation methods cls implements itself are wrapped, so a
+    model without native streaming keeps falling back to _generate.
+    """
+    from langchain_core.language_models.chat_models import BaseChatModel
+
+    namespace = {"__module__": cls.__module__, "__doc__": cls.__doc__}
+
+    def _generate(self, *args, **kwargs):
+        with llm_limiter.slot():
+            return cls._generate(self, *args, **kwargs)
+    namespace["_generate"] = _generate
+
+    if cls._agenerate is not BaseChatModel._agenerate:
+        async def _agenerate(self, *args, **kwargs):
+            async with llm_limiter.aslot():
+                return await cls._agenerate(self, *args, **kwargs)
+        namespace["_agenerate"] = _agenerate
+
+    if cls._stream is not BaseChatModel._stream:
+        def _stream(self, *args, **kwargs):
+            with llm_limiter.slot():
+                yield from cls._stream(self, *args, **kwargs)
+        namespace["_stream"] = _stream
+
+    if cls._astream is not BaseChatModel._astream:
+        async def _astream(self, *args, **kwargs):
+            async with llm_limiter.aslot():
+                async for chunk in cls._astream(self, *args, **kwargs):
+                    yield chunk
+        namespace["_astream"] = _astream
+
+    return type(f"Limited{cls.__name__}", (cls,), namespace)
+
+
+_pool = ClientPool()
+_pool_timeout = LLM_TIMEOUT
+_rate_limiter = None
+# Replacements for the Google clients (see set_model_factories)
+_chat_factory: Optional[Callable[[str, float, float], Any]] = None
+_embeddings_factory: Optional[Callable[[str], Any]] = None
+
+
+def configure_llm_pool(size: Optional[int] = None, timeout: Optional[float] = None) -> None:
+    """Resize the chat client pool and/or change the default per-call timeout"""
+    global _pool, _pool_timeout
+    with _lock:
+        if size is not None:
+            _pool = ClientPool(size)
+        if timeout is not None:
+            _pool_timeout = timeout
+
+
+def set_model_factories(chat: Optional[Callable[[str, float, float], Any]] = None,
+                        embeddings: Optional[Callable[[str], Any]] = None) -> None:
+    """
+    Build chat models with chat(model, temperature, timeout) and embeddings
+    with embeddings(model) instead of the Google clients, e.g. to run and
+    time the pipeline offline. None restores the Google clients. Every
+    cached resource is dropped, so the rule index is rebuilt with the new
+    embeddings on next use.
+    """
+    global _chat_factory, _embeddings_factory
+    with _lock:
+        _chat_factory = chat
+        _embeddings_factory = embeddings
+        reset()
+
+
+def set_llm_concurrency(limit: Optional[int]) -> None:
+    """Change how many model calls may run at once across the process (None or 0 = unlimited)"""
+    llm_limiter.set_limit(limit)
+
+
+def set_llm_rate_limit(requests_per_second: Optional[float]) -> None:
+    """
+    Throttle every pooled chat client to a shared request rate (None disables).
+
+    Clients already in the pool are dropped so new ones pick up the limiter.
+    """
+    global _rate_limiter
+    from langchain_core.rate_limiters import InMemoryRateLimiter
+    with _lock:
+        _rate_limiter = None
+        if requests_per_second:
+            _rate_limiter = InMemoryRateLimiter(
+                requests_per_second=requests_per_second,
+                max_bucket_size=max(1, int(requests_per_second))
+            )
+        _pool.clear()
+
+
+def _get_or_create(key: Hashable, factory: Callable[[], Any]) -> Any:
+    """Return the cached resource for key, creating it at most once"""
+    try:
+        return _instances[key]
+    except KeyError:
+        pass
+    with _lock:
+        if key not in _instances:
+            _instances[key] = factory()
+        return _instances[key]
+
+
+def _patch_event_loop() -> None:
+    """
+    The Google clients need a usable event loop in Streamlit worker threads.
+
+    Async callers (aprocess_contracts and friends) already run inside a loop
+    and never need the nest_asyncio patch, so it is only applied for
+    synchronous callers.
+    """
+    global _event_loop_patched
+    if _event_loop_patched:
+        return
+    try:
+        asyncio.get_running_loop()
+        return
+    except RuntimeError:
+        pass
+    import nest_asyncio
+    nest_asyncio.apply()
+    _event_loop_patched = True
+
+
+def get_embeddings(model: Optional[str] = None):
+    """
+    Embeddings client used for the compliance rule index and contract passages.
+
+    The backend is chosen by EMBEDDING_BACKEND (see modules.vector_store);
+    model defaults to that backend's model. Query vectors are cached.
+    """
+    def factory():
+        if _embeddings_factory is not None:
+            return _embeddings_factory(model or DEFAULT_EMBEDDING_MODEL)
+        from modules.vector_store import EMBEDDING_BACKEND, make_embeddings
+        return make_embeddings(EMBEDDING_BACKEND, model)
+
+    return _get_or_create(("embeddings", model), factory)
+
+
+def _limited_gemini_class():
+    def factory():
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return limit_concurrency(ChatGoogleGenerativeAI)
+
+    return _get_or_create("limited_gemini_class", factory)
+
+
+def get_chat_model(model: str = DEFAULT_CHAT_MODEL, temperature: float = 0,
+                   timeout: Optional[float] = None):
+    """Pooled chat model for the given model, temperature and per-call timeout"""
+    timeout = _pool_timeout if timeout is None else timeout
+
+    def factory():
+        if _chat_factory is not None:
+            return _chat_factory(model, temperature, timeout)
+        _patch_event_loop()
+        return _limited_gemini_class()(
+            model=model,
+            temperature=temperature,
+            timeout=timeout,
+            max_retries=LLM_MAX_RETRIES,
+            rate_limiter=_rate_limiter,
+            google_api_key=os.getenv("GOOGLE_API_KEY")
+        )
+
+    return _pool.get(("chat", model, temperature, timeout), factory)
+
+
+def get_chain(name: str, prompt, model: str = DEFAULT_CHAT_MODEL, temperature: float = 0,
+              timeout: Optional[float] = None):
+    """
+    Pooled `prompt | llm` chain registered under name.
+
+    The prompt is expected to be a module-level constant; each pooled chain
+    wraps its own pooled chat client.
+    """
+    timeout = _pool_timeout if timeout is None else timeout
+    return _pool.get(
+        ("chain", name, model, temperature, timeout),
+        lambda: prompt | get_chat_model(model, temperature, timeout)
+    )
+
+
+def get_structured_chain(name: str, prompt, schema, model: str = DEFAULT_CHAT_MODEL,
+                         temperature: float = 0, timeout: Optional[float] = None):
+    """
+    Pooled `prompt | llm.with_structured_output(schema, include_raw=True)` chain.
+
+    Results are dicts with the raw message, the parsed schema instance and
+    the parsing error, so callers can repair invalid output (see
+    modules.structured_output) instead of losing it.
+    """
+    timeout = _pool_timeout if timeout is None else timeout
+    return _pool.get(
+        ("structured_chain", name, schema.__name__, model, temperature, timeout),
+        lambda: prompt | get_chat_model(model, temperature, timeout).with_structured_output(schema, include_raw=True)
+    )
+
+
+def get_rulebook(rules_path: Optional[str] = None):
+    """Parsed rulebook used to resolve known contract types without a vector search"""
+    from modules.rulebook import RULES_PATH, Rulebook
+    rules_path = rules_path or RULES_PATH
+    return _get_or_create(("rulebook", rules_path), lambda: Rulebook.from_path(rules_path))
+
+
+def get_rule_store():
+    """Persisted Chroma collection holding the compliance rules"""
+    def factory():
+        from modules.vector_store import build_rule_index
+        return build_rule_index(embedding=get_embeddings())
+
+    return _get_or_create("rule_store", factory)
+
+
+def get_rule_retriever(k: Optional[int] = None):
+    """Hybrid keyword and vector retriever over the compliance rules (see modules.rule_search)"""
+    def factory():
+        from modules.rule_search import RULE_TOP_K, HybridRuleRetriever
+        from modules.vector_store import unique_rule_chunks
+        return HybridRuleRetriever.from_chunks(
+            get_rule_store(), list(unique_rule_chunks().values()), k=k or RULE_TOP_K
+        )
+
+    return _get_or_create(("rule_retriever", k), factory)
+
+
+def get_compliance_rules_tool():
+    """Retriever tool returning the matching rule chunks as one string"""
+    def factory():
+        from langchain.tools.retriever import create_retriever_tool
+        return create_retriever_tool(
+            get_rule_retriever(),
+            name="get_compliance_rules",
+            description="Retrieve relevant compliance rules from the vector database according to the contract text"
+        )
+
+    return _get_or_create("compliance_rules_tool", factory)
+
+
+def reset() -> None:
+    """Drop every cached resource so the next call recreates it"""
+    with _lock:
+        _instances.clear()
+        _pool.clear()
+    # Contract passage vectors belong to the embeddings client being dropped
+    from modules import contract_index
+    contract_index.clear()
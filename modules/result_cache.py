@@ -0,0 +1,116 @@
+# modules/result_cache.py
+"""
+Persistent cache of finished compliance reports.
+
+Reports are keyed on the normalized contract text, the detected contract
+type, the model name and the rulebook version, so a re-uploaded or re-run
+contract returns its stored report without touching the LLM, while any
+change to the rules or the model produces a fresh analysis.
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+DEFAULT_CACHE_PATH = "./analysis_cache.db"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class AnalysisCache:
+    """SQLite-backed report cache with TTL expiry and LRU eviction by entry count"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 1000,
+                 ttl_seconds: Optional[float] = 7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS analysis_results (
+                cache_key TEXT PRIMARY KEY,
+                report TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_analysis_last_access ON analysis_results (last_access)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(contract_text: str, contract_type: str, model: str, rules_version: str) -> str:
+        """Deterministic key; whitespace differences in the text do not change it"""
+        normalized = _WHITESPACE.sub(" ", contract_text or "").strip()
+        text_hash = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        parts = [text_hash, (contract_type or "").lower(), model, rules_version]
+        return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT report, created_at FROM analysis_results WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None or self._expired(row[1], now):
+                if row is not None:
+                    self._conn.execute("DELETE FROM analysis_results WHERE cache_key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE analysis_results SET last_access = ? WHERE cache_key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, report: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analysis_results (cache_key, report, created_at, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(report), now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM analysis_results")
+            self._conn.commit()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM analysis_results").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": size}
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _evict(self, now: float) -> None:
+        if self.ttl_seconds is not None:
+            self._conn.execute(
+                "DELETE FROM analysis_results WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+        # Least recently used entries go first once the cache is over capacity
+        self._conn.execute(
+            """
+            DELETE FROM analysis_results WHERE cache_key IN (
+                SELECT cache_key FROM analysis_results
+                ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,)
+        )
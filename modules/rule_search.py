@@ -0,0 +1,290 @@
+# modules/rule_search.py
+"""
+Hybrid keyword and vector search over the compliance rule chunks.
+
+An in-memory BM25 index catches exact terms that embeddings blur (type
+names, aliases such as "NDA", statute abbreviations such as "FLSA"), and
+the Chroma collection catches paraphrases. The two rankings are combined
+with reciprocal rank fusion. Overlapping chunks of the same rulebook are
+then merged back into one passage, and the passages are reranked by how
+much of the query they cover. A small k therefore returns whole, distinct
+rule blocks instead of overlapping fragments.
+
+Searches can be filtered on the rule metadata (contract type, jurisdiction,
+risk level). Chunks are partitioned by those fields, and a filter selects
+partitions before anything is ranked. BM25 then only reads the postings of
+those partitions, and the vector side compares the query with just their
+vectors (fetched from Chroma once per partition and kept in an LRU). The
+latency of a filtered search follows the size of the filtered slice, not
+of the whole corpus. Unfiltered searches use Chroma's own index.
+"""
+import heapq
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr
+
+from modules.vector_store import FILTER_FIELDS, accepted_values, tokenize
+
+# Passages returned per query, and candidates taken from each index before fusion
+RULE_TOP_K = int(os.getenv("RULE_TOP_K", "1"))
+RULE_FETCH_K = int(os.getenv("RULE_FETCH_K", "6"))
+# Chunks of one block this many characters apart (a paragraph break) are joined
+MAX_GAP = 2
+# Damping constant of reciprocal rank fusion (60 is the usual choice)
+RRF_K = 60
+# Partitions whose vectors are kept in memory for filtered searches
+PARTITION_CACHE_SIZE = int(os.getenv("PARTITION_CACHE_SIZE", "256"))
+
+
+class BM25Index:
+    """
+    Okapi BM25 over an inverted index of tokenized texts.
+
+    Postings are kept per partition (e.g. per contract type and
+    jurisdiction), so a search restricted to some partitions only reads
+    their postings and its cost does not grow with the rest of the corpus.
+    Term statistics are shared, so scores are comparable across partitions.
+    """
+
+    def __init__(self, texts: List[str], partitions: Optional[List[Hashable]] = None,
+                 k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self._postings: Dict[Hashable, Dict[str, List[Tuple[int, int]]]] = {}
+        frequencies: Dict[str, int] = {}
+        lengths = []
+        for i, text in enumerate(texts):
+            counts: Dict[str, int] = {}
+            for term in tokenize(text):
+                counts[term] = counts.get(term, 0) + 1
+            lengths.append(sum(counts.values()))
+            postings = self._postings.setdefault(partitions[i] if partitions else None, {})
+            for term, count in counts.items():
+                postings.setdefault(term, []).append((i, count))
+                frequencies[term] = frequencies.get(term, 0) + 1
+        average = sum(lengths) / len(lengths) if lengths else 1.0
+        # Per-text length normalisation, computed once
+        self._norms = [k1 * (1 - b + b * length / (average or 1.0)) for length in lengths]
+        n = len(texts)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in frequencies.items()}
+
+    @property
+    def partitions(self) -> List[Hashable]:
+        return list(self._postings)
+
+    def search(self, query: str, n: int, partitions: Optional[List[Hashable]] = None) -> List[Tuple[int, float]]:
+        """Top-n (text index, score) pairs, best first, from the given partitions (default all)"""
+        if partitions is None:
+            partitions = self.partitions
+        terms = [(term, self.idf[term]) for term in set(tokenize(query)) if term in self.idf]
+        scores: Dict[int, float] = {}
+        for partition in partitions:
+            postings = self._postings.get(partition, {})
+            for term, idf in terms:
+                for i, count in postings.get(term, ()):
+                    scores[i] = scores.get(i, 0.0) + idf * count * (self.k1 + 1) / (count + self._norms[i])
+        return heapq.nlargest(n, scores.items(), key=lambda item: item[1])
+
+    def coverage(self, query: str, text: str) -> float:
+        """IDF-weighted share of the known query terms that occur in text"""
+        terms = {t for t in tokenize(query) if t in self.idf}
+        total = sum(self.idf[t] for t in terms)
+        if not total:
+            return 0.0
+        words = set(tokenize(text))
+        return sum(self.idf[t] for t in terms if t in words) / total
+
+
+def merge_overlapping(ranked: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+    """
+    Merge chunks of one rule block whose source spans overlap or touch into one passage.
+
+    Each merged passage keeps the best score of its chunks. Chunks without
+    a start_index are kept as they are.
+    """
+    spans: Dict[Any, List[Tuple[int, Document, float]]] = {}
+    passages = []
+    for doc, score in ranked:
+        start = doc.metadata.get("start_index")
+        if start is None or start < 0:
+            passages.append((Document(page_content=doc.page_content, metadata=dict(doc.metadata)), score))
+        else:
+            key = (doc.metadata.get("source"), doc.metadata.get("block_start"))
+            spans.setdefault(key, []).append((start, doc, score))
+
+    for parts in spans.values():
+        parts.sort(key=lambda part: part[0])
+        start, first, best = parts[0]
+        text, end = first.page_content, start + len(first.page_content)
+        for part_start, doc, score in parts[1:]:
+            part_end = part_start + len(doc.page_content)
+            if part_start <= end + MAX_GAP:
+                if part_start > end:
+                    # Adjacent chunks split on a paragraph break
+                    text += "\n\n" + doc.page_content
+                    end = part_end
+                elif part_end > end:
+                    text += doc.page_content[end - part_start:]
+                    end = part_end
+                best = max(best, score)
+                continue
+            passages.append((_passage(first, text, start, end), best))
+            start, first, best = part_start, doc, score
+            text, end = doc.page_content, part_end
+        passages.append((_passage(first, text, start, end), best))
+    return passages
+
+
+def _passage(first: Document, text: str, start: int, end: int) -> Document:
+    metadata = dict(first.metadata, start_index=start, end_index=end)
+    return Document(page_content=text, metadata=metadata)
+
+
+class HybridRuleRetriever(BaseRetriever):
+    """BM25 and vector results fused, merged and reranked (see module docstring)"""
+
+    store: Any
+    chunks: List[Document]
+    index: BM25Index
+    k: int = RULE_TOP_K
+    fetch_k: int = RULE_FETCH_K
+    keyword_weight: float = 1.0
+    vector_weight: float = 1.0
+    positions: Dict[str, int] = {}
+    # Chunk rows of every (contract_type, jurisdiction, risk_level) partition
+    partition_rows: Dict[Hashable, List[int]] = {}
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    # Per filter field, the partitions holding each stored value
+    _by_value: List[Dict[str, Set[Hashable]]] = PrivateAttr(default_factory=list)
+    _vectors: "OrderedDict[Hashable, np.ndarray]" = PrivateAttr(default_factory=OrderedDict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, __context: Any) -> None:
+        super().model_post_init(__context)
+        self._by_value = [{} for _ in FILTER_FIELDS]
+        for partition in self.partition_rows:
+            for i, value in enumerate(partition):
+                self._by_value[i].setdefault(value, set()).add(partition)
+
+    @classmethod
+    def from_chunks(cls, store, chunks: List[Document], **kwargs) -> "HybridRuleRetriever":
+        """Retriever over chunks, which must be the documents held by the vector store"""
+        partitions = [tuple(doc.metadata.get(field, "") for field in FILTER_FIELDS) for doc in chunks]
+        partition_rows: Dict[Hashable, List[int]] = {}
+        for i, partition in enumerate(partitions):
+            partition_rows.setdefault(partition, []).append(i)
+        return cls(
+            store=store,
+            chunks=chunks,
+            index=BM25Index([doc.page_content for doc in chunks], partitions),
+            positions={doc.metadata["chunk_hash"]: i for i, doc in enumerate(chunks)},
+            partition_rows=partition_rows,
+            **kwargs
+        )
+
+    def _partitions(self, filters: Dict[str, str]) -> List[Hashable]:
+        """Partitions matching every filter, found through the value index without scanning"""
+        selected: Optional[Set[Hashable]] = None
+        for field, wanted in filters.items():
+            by_value = self._by_value[FILTER_FIELDS.index(field)]
+            matching: Set[Hashable] = set()
+            for value in accepted_values(field, wanted):
+                matching |= by_value.get(value, set())
+            selected = matching if selected is None else selected & matching
+        return list(selected or ())
+
+    def _partition_vectors(self, partition: Hashable) -> np.ndarray:
+        """Unit-length vectors of a partition's chunks, in partition_rows order"""
+        with self._lock:
+            vectors = self._vectors.get(partition)
+            if vectors is not None:
+                self._vectors.move_to_end(partition)
+                return vectors
+        rows = self.partition_rows[partition]
+        ids = [self.chunks[i].metadata["chunk_hash"] for i in rows]
+        stored = self.store.get(ids=ids, include=["embeddings"])
+        by_id = dict(zip(stored["ids"], stored["embeddings"]))
+        vectors = np.asarray([by_id[i] for i in ids], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        with self._lock:
+            self._vectors[partition] = vectors
+            while len(self._vectors) > PARTITION_CACHE_SIZE:
+                self._vectors.popitem(last=False)
+        return vectors
+
+    def _vector_search(self, query_vector: List[float], partitions: List[Hashable]) -> List[int]:
+        """Chunk rows of the fetch_k most similar chunks in partitions"""
+        if not partitions:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        rows = [i for partition in partitions for i in self.partition_rows[partition]]
+        scores = np.concatenate([self._partition_vectors(partition) @ query for partition in partitions])
+        n = min(self.fetch_k, len(rows))
+        top = np.argpartition(-scores, n - 1)[:n]
+        return [rows[i] for i in top[np.argsort(-scores[top])]]
+
+    def _vector_rows(self, vector_docs: List[Document]) -> List[int]:
+        rows = (self.positions.get(doc.metadata.get("chunk_hash")) for doc in vector_docs)
+        return [i for i in rows if i is not None]
+
+    def _fuse(self, query: str, keyword: List[Tuple[int, float]], vector: List[int],
+              k: Optional[int] = None) -> List[Document]:
+        scores: Dict[int, float] = {}
+        for rank, (i, _) in enumerate(keyword):
+            scores[i] = scores.get(i, 0.0) + self.keyword_weight / (RRF_K + rank + 1)
+        for rank, i in enumerate(vector):
+            scores[i] = scores.get(i, 0.0) + self.vector_weight / (RRF_K + rank + 1)
+        if not scores:
+            return []
+
+        passages = merge_overlapping([(self.chunks[i], score) for i, score in scores.items()])
+        top = max(score for _, score in passages)
+        # Fused rank and query coverage count equally
+        reranked = sorted(
+            ((doc, score / top + self.index.coverage(query, doc.page_content)) for doc, score in passages),
+            key=lambda item: item[1], reverse=True
+        )
+        results = []
+        for doc, score in reranked[:k or self.k]:
+            doc.metadata["score"] = round(score, 4)
+            results.append(doc)
+        return results
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                **kwargs) -> List[Document]:
+        """kwargs: k (passages to return) and filter (see modules.vector_store.rule_filter)"""
+        filters = kwargs.get("filter")
+        if not filters:
+            keyword = self.index.search(query, self.fetch_k)
+            vector = self._vector_rows(self.store.similarity_search(query, k=self.fetch_k))
+            return self._fuse(query, keyword, vector, kwargs.get("k"))
+        partitions = self._partitions(filters)
+        keyword = self.index.search(query, self.fetch_k, partitions)
+        vector = self._vector_search(self.store.embeddings.embed_query(query), partitions) if partitions else []
+        return self._fuse(query, keyword, vector, kwargs.get("k"))
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun,
+                                       **kwargs) -> List[Document]:
+        filters = kwargs.get("filter")
+        if not filters:
+            keyword = self.index.search(query, self.fetch_k)
+            vector = self._vector_rows(await self.store.asimilarity_search(query, k=self.fetch_k))
+            return self._fuse(query, keyword, vector, kwargs.get("k"))
+        partitions = self._partitions(filters)
+        keyword = self.index.search(query, self.fetch_k, partitions)
+        vector = []
+        if partitions:
+            vector = self._vector_search(await self.store.embeddings.aembed_query(query), partitions)
+        return self._fuse(query, keyword, vector, kwargs.get("k"))
@@ -0,0 +1,184 @@
+# modules/rulebook.py
+"""
+Parsed compliance rulebook indexed by contract type.
+
+rules.txt is a sequence of `===== CONTRACT TYPE: <name> =====` blocks, each
+listing its CONTRACT_TYPES aliases (and optionally its JURISDICTION)
+followed by rule sections. RULES_PATH may also be a directory of such
+files, e.g. one per jurisdiction. Every block is
+indexed under its name and aliases (with and without a trailing "agreement"
+/ "contract"), so a known type such as "employment", "NDA" or "lease"
+resolves to its complete rule set with a dictionary lookup. Only types that
+match no block need the semantic search over the embedded rule chunks.
+"""
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+# A rulebook file, or a directory of .txt rulebooks and .jsonl rule files
+RULES_PATH = os.getenv("RULES_PATH", "./sample_data/rules.txt")
+RULE_FILE_EXTENSIONS = (".txt", ".jsonl")
+# Jurisdiction (and contract type) of rules that apply everywhere
+GENERAL = "general"
+
+_HEADER = re.compile(r"^=+\s*CONTRACT TYPE:\s*(.+?)\s*=+\s*$", re.MULTILINE)
+_FIELD = re.compile(r"^([A-Z_]+):\s*(.*)$")
+_BULLET = re.compile(r"^\s*(?:-|\*|\d+[.)])\s+(.+?)\s*$")
+_NON_WORD = re.compile(r"[\W_]+")
+
+# Trailing words that do not distinguish one contract type from another
+GENERIC_WORDS = ("agreement", "contract", "agreements", "contracts")
+
+
+def rule_files(rules_path: str = RULES_PATH) -> List[str]:
+    """The rule files under rules_path (itself when it is a file), in a stable order"""
+    if not os.path.isdir(rules_path):
+        return [rules_path]
+    files = []
+    for root, dirs, names in os.walk(rules_path):
+        dirs.sort()
+        files.extend(os.path.join(root, n) for n in sorted(names) if n.endswith(RULE_FILE_EXTENSIONS))
+    return files
+
+
+def normalize_value(value: Optional[str]) -> str:
+    """Form in which jurisdictions and risk levels are stored and filtered; empty means general"""
+    return _NON_WORD.sub(" ", (value or "").lower()).strip() or GENERAL
+
+
+def block_spans(text: str) -> List[Tuple[str, int, int]]:
+    """(name, start, end) character span of every contract type block in rulebook text"""
+    headers = list(_HEADER.finditer(text))
+    return [
+        (header.group(1), header.start(), headers[i + 1].start() if i + 1 < len(headers) else len(text))
+        for i, header in enumerate(headers)
+    ]
+
+
+class RuleBlock:
+    """All rules for one contract type, in rulebook order"""
+
+    def __init__(self, name: str, aliases: List[str], fields: Dict[str, str],
+                 sections: Dict[str, List[str]], text: str):
+        self.name = name
+        self.aliases = aliases
+        self.fields = fields
+        self.sections = sections
+        self.text = text
+
+    @property
+    def risk_level(self) -> str:
+        return self.fields.get("RISK_LEVEL", "")
+
+    @property
+    def description(self) -> str:
+        return self.fields.get("DESCRIPTION", "")
+
+    @property
+    def jurisdiction(self) -> str:
+        return normalize_value(self.fields.get("JURISDICTION"))
+
+    @property
+    def regulatory_references(self) -> List[str]:
+        return self.sections.get("REGULATORY_REFERENCES", [])
+
+    def rules(self, section: str = "COMPLIANCE_RULES") -> List[str]:
+        return self.sections.get(section, [])
+
+
+class Rulebook:
+    """Rule blocks with an in-memory index from type names and aliases"""
+
+    def __init__(self, blocks: List[RuleBlock]):
+        self.blocks = blocks
+        # Blocks of several jurisdictions may share a name; rulebook order is kept
+        self._index: Dict[str, List[RuleBlock]] = {}
+        for block in blocks:
+            for name in [block.name] + block.aliases:
+                for key in self._keys(name):
+                    claimed = self._index.setdefault(key, [])
+                    if block not in claimed:
+                        claimed.append(block)
+
+    @classmethod
+    def from_path(cls, rules_path: str = RULES_PATH) -> "Rulebook":
+        """Blocks of every .txt rulebook under rules_path (a file or a directory)"""
+        blocks = []
+        for path in rule_files(rules_path):
+            if not path.endswith(".jsonl"):
+                blocks.extend(cls.from_file(path).blocks)
+        return cls(blocks)
+
+    @classmethod
+    def from_file(cls, rules_path: str = RULES_PATH) -> "Rulebook":
+        with open(rules_path, encoding="utf-8") as f:
+            return cls.parse(f.read())
+
+    @classmethod
+    def parse(cls, text: str) -> "Rulebook":
+        return cls([cls._parse_block(name, text[start:end].strip()) for name, start, end in block_spans(text)])
+
+    @staticmethod
+    def _parse_block(name: str, text: str) -> RuleBlock:
+        fields: Dict[str, str] = {}
+        sections: Dict[str, List[str]] = {}
+        section = None
+        for line in text.splitlines()[1:]:
+            field = _FIELD.match(line)
+            if field:
+                key, value = field.groups()
+                if value:
+                    fields[key] = value.strip()
+                    section = None
+                else:
+                    section = key
+                    sections[section] = []
+                continue
+            bullet = _BULLET.match(line)
+            if bullet and section:
+                sections[section].append(bullet.group(1))
+        aliases = [a.strip() for a in fields.get("CONTRACT_TYPES", "").split(",") if a.strip()]
+        return RuleBlock(name, aliases, fields, sections, text)
+
+    @staticmethod
+    def normalize(name: str) -> str:
+        return _NON_WORD.sub(" ", (name or "").lower()).strip()
+
+    @classmethod
+    def _keys(cls, name: str) -> List[str]:
+        key = cls.normalize(name)
+        words = key.split()
+        while words and words[-1] in GENERIC_WORDS:
+            words.pop()
+        short = " ".join(words)
+        return [key, short] if short and short != key else [key]
+
+    @classmethod
+    def type_key(cls, name: Optional[str]) -> str:
+        """Form in which contract types are stored and filtered ("Employment Agreement" -> "employment")"""
+        return cls._keys(name or "")[-1] or GENERAL
+
+    def lookup(self, contract_type: str, jurisdiction: Optional[str] = None) -> Optional[RuleBlock]:
+        """
+        Rule block for a type name or alias, or None when the type is unknown.
+
+        With a jurisdiction, that jurisdiction's block is preferred over a
+        general one, and None is returned when there is neither. Without
+        one, the general block (or else the first) is returned.
+        """
+        for key in self._keys(contract_type):
+            if key in self._index:
+                blocks = self._index[key]
+                wanted = normalize_value(jurisdiction)
+                for block in blocks:
+                    if block.jurisdiction == wanted:
+                        return block
+                general = [b for b in blocks if b.jurisdiction == GENERAL]
+                if general:
+                    return general[0]
+                return None if jurisdiction else blocks[0]
+        return None
+
+    @property
+    def types(self) -> List[str]:
+        return [block.name for block in self.blocks]
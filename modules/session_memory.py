@@ -0,0 +1,86 @@
+# modules/session_memory.py
+"""
+Per-session conversation memory with a token budget.
+
+Each session (an orchestrator checkpoint thread, or a caller-chosen id) has
+its own history, so users never see each other's conversations. A session
+keeps only its most recent messages that fit in MEMORY_TOKEN_BUDGET, and
+each stored message is cut to MEMORY_MESSAGE_TOKENS, so a contract pasted
+into a request is not re-sent with every later prompt. The least recently
+used sessions beyond MEMORY_MAX_SESSIONS are dropped, which keeps both the
+prompt size and the memory of a long-running worker constant.
+"""
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, get_buffer_string
+
+from modules.tokens import CHARS_PER_TOKEN, estimate_tokens
+
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "2000"))
+MEMORY_MESSAGE_TOKENS = int(os.getenv("MEMORY_MESSAGE_TOKENS", "400"))
+MEMORY_MAX_SESSIONS = int(os.getenv("MEMORY_MAX_SESSIONS", "256"))
+
+DEFAULT_SESSION = "default"
+
+
+class SessionMemory:
+    """Thread-safe, token-bounded chat histories keyed by session id"""
+
+    def __init__(self, max_tokens: int = MEMORY_TOKEN_BUDGET, max_message_tokens: int = MEMORY_MESSAGE_TOKENS,
+                 max_sessions: int = MEMORY_MAX_SESSIONS):
+        self.max_tokens = max_tokens
+        self.max_message_tokens = max_message_tokens
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Deque[BaseMessage]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _truncate(self, text: str) -> str:
+        # Same characters per token estimate as estimate_tokens
+        limit = self.max_message_tokens * CHARS_PER_TOKEN
+        return text if len(text) <= limit else text[:limit] + " ...[truncated]"
+
+    def add_exchange(self, session_id: Optional[str], question: str, answer: str) -> None:
+        """Store a question and its answer, dropping the oldest messages over the budget"""
+        session_id = session_id or DEFAULT_SESSION
+        with self._lock:
+            history = self._sessions.pop(session_id, None) or deque()
+            history.append(HumanMessage(content=self._truncate(question)))
+            history.append(AIMessage(content=self._truncate(answer)))
+            while len(history) > 2 and self._tokens(history) > self.max_tokens:
+                history.popleft()
+            self._sessions[session_id] = history
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def messages(self, session_id: Optional[str]) -> List[BaseMessage]:
+        with self._lock:
+            history = self._sessions.get(session_id or DEFAULT_SESSION)
+            if history is None:
+                return []
+            self._sessions.move_to_end(session_id or DEFAULT_SESSION)
+            return list(history)
+
+    def buffer(self, session_id: Optional[str]) -> str:
+        """History as "Human: ... / AI: ..." text for string prompts"""
+        return get_buffer_string(self.messages(session_id))
+
+    def tokens(self, session_id: Optional[str]) -> int:
+        return self._tokens(self.messages(session_id))
+
+    @staticmethod
+    def _tokens(messages) -> int:
+        return sum(estimate_tokens(m.content) for m in messages)
+
+    def clear(self, session_id: Optional[str] = None) -> None:
+        """Forget one session, or every session when session_id is None"""
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+            else:
+                self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
@@ -0,0 +1,253 @@
+# modules/structured_output.py
+"""
+Schema-validated model output with bounded repair.
+
+Chains built with resources.get_structured_chain return the raw message
+together with the parsed pydantic object. Output that fails validation is
+first re-validated locally (a model that answered with fenced JSON text
+instead of a structured response costs nothing extra), and only then
+re-asked, at most MAX_REPAIR_ATTEMPTS times, with the failed output and the
+validation error rather than the whole original prompt. The counters in
+`stats` measure how often that happens.
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from langchain_core.prompts import PromptTemplate
+from pydantic import BaseModel, ValidationError
+
+from modules.resources import get_structured_chain
+
+MAX_REPAIR_ATTEMPTS = int(os.getenv("ANALYSIS_REPAIR_ATTEMPTS", "1"))
+# Longest failed output / error message sent back in a repair request
+MAX_REPAIR_CHARS = 8000
+
+REPAIR_PROMPT = PromptTemplate(
+    template="""
+    The output below was meant to match the required schema but failed validation.
+
+    OUTPUT:
+    {output}
+
+    VALIDATION ERROR:
+    {error}
+
+    Return the same content corrected so that it matches the schema exactly.
+    Do not add findings that are not in the output.
+    """,
+    input_variables=["output", "error"]
+)
+
+
+class StructuredOutputStats:
+    """Thread-safe counters for structured responses and the repairs they needed"""
+
+    FIELDS = ("requests", "valid", "repaired_locally", "reasked", "repaired_by_reask", "failed", "call_errors")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def add(self, field: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[field] += n
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            counts = dict(self._counts)
+        requests = counts["requests"] or 1
+        counts["reask_rate"] = round(counts["reasked"] / requests, 4)
+        counts["failure_rate"] = round(counts["failed"] / requests, 4)
+        return counts
+
+
+stats = StructuredOutputStats()
+
+
+def _strip_fences(text: str) -> str:
+    """Extract the payload if it is wrapped in a markdown code fence"""
+    if "```" in text:
+        start = text.find("```")
+        start = text.find("\n", start) + 1 if text.startswith("```json", start) else start + 3
+        end = text.find("```", start)
+        text = text[start:end if end != -1 else len(text)]
+    return text.strip()
+
+
+def raw_text(message: Any) -> str:
+    """What the model actually returned: tool-call arguments, or the message text"""
+    if message is None:
+        return ""
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        return json.dumps(tool_calls[0].get("args", {}))
+    content = getattr(message, "content", message)
+    if isinstance(content, list):
+        content = "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return str(content)
+
+
+def validate_text(text: str, schema: Type[BaseModel]) -> Tuple[Optional[BaseModel], Optional[str]]:
+    """
+    (model, None) when text holds valid JSON for schema, else (None, error).
+
+    Besides the (fence-stripped) text itself, the span from the first "{" to
+    the last "}" is tried, which covers JSON wrapped in a sentence.
+    """
+    text = _strip_fences(text or "")
+    candidates = [text]
+    start, end = text.find("{"), text.rfind("}")
+    if -1 < start < end and (start, end) != (0, len(text) - 1):
+        candidates.append(text[start:end + 1])
+    error = None
+    for candidate in candidates:
+        try:
+            return schema.model_validate_json(candidate), None
+        except (ValidationError, ValueError) as e:
+            error = error or str(e)
+    return None, error
+
+
+def _parse_result(result: Dict[str, Any], schema: Type[BaseModel]) -> Tuple[Optional[BaseModel], str, Optional[str], bool]:
+    """(parsed, raw output, error, validated locally) for one include_raw structured result"""
+    parsed = result.get("parsed")
+    if parsed is not None:
+        return parsed, "", None, False
+    raw = raw_text(result.get("raw"))
+    parsed, error = validate_text(raw, schema)
+    if parsed is not None:
+        return parsed, raw, None, True
+    return None, raw, str(result.get("parsing_error") or error), False
+
+
+def _start(results: list, schema: Type[BaseModel]) -> List[list]:
+    stats.add("requests", len(results))
+    outcomes = []
+    for result in results:
+        if isinstance(result, Exception):
+            # Timeouts and API errors are not validation failures and are not re-asked
+            stats.add("call_errors")
+            outcomes.append([result, "", None])
+            continue
+        parsed, raw, error, local = _parse_result(result, schema)
+        if parsed is not None:
+            stats.add("repaired_locally" if local else "valid")
+        outcomes.append([parsed, raw, error])
+    return outcomes
+
+
+def _needs_repair(outcomes: List[list]) -> List[int]:
+    return [i for i, (parsed, _, error) in enumerate(outcomes) if parsed is None and error is not None]
+
+
+def _repair_inputs(outcomes: List[list], pending: List[int]) -> List[Dict[str, str]]:
+    return [
+        {"output": outcomes[i][1][:MAX_REPAIR_CHARS] or "(empty)", "error": outcomes[i][2][:MAX_REPAIR_CHARS]}
+        for i in pending
+    ]
+
+
+def _apply_repairs(outcomes: List[list], pending: List[int], results: list, schema: Type[BaseModel]) -> None:
+    stats.add("reasked", len(pending))
+    for i, result in zip(pending, results):
+        if isinstance(result, Exception):
+            outcomes[i][2] = str(result)
+            continue
+        parsed, raw, error, _ = _parse_result(result, schema)
+        if parsed is not None:
+            stats.add("repaired_by_reask")
+        outcomes[i] = [parsed, raw or outcomes[i][1], error]
+
+
+def _finish(outcomes: List[list]) -> List[Any]:
+    """Parsed models; the call's exception, or None when validation never succeeded"""
+    finished = []
+    for parsed, _, error in outcomes:
+        if parsed is None and error is not None:
+            stats.add("failed")
+        finished.append(parsed)
+    return finished
+
+
+def _config(max_concurrency: Optional[int]) -> Dict[str, Any]:
+    return {"max_concurrency": max_concurrency} if max_concurrency else {}
+
+
+def _repair_chain(schema: Type[BaseModel]):
+    return get_structured_chain("repair", REPAIR_PROMPT, schema)
+
+
+def run_structured(chain, inputs: List[Dict[str, Any]], schema: Type[BaseModel],
+                   max_concurrency: Optional[int] = None) -> List[Any]:
+    """
+    Run an include_raw structured chain over inputs with bounded repairs.
+
+    Each result is the validated model, the exception the call raised, or
+    None when the output could not be repaired.
+    """
+    outcomes = _start(chain.batch(inputs, config=_config(max_concurrency), return_exceptions=True), schema)
+    for _ in range(MAX_REPAIR_ATTEMPTS):
+        pending = _needs_repair(outcomes)
+        if not pending:
+            break
+        results = _repair_chain(schema).batch(
+            _repair_inputs(outcomes, pending), config=_config(max_concurrency), return_exceptions=True
+        )
+        _apply_repairs(outcomes, pending, results, schema)
+    return _finish(outcomes)
+
+
+async def arun_structured(chain, inputs: List[Dict[str, Any]], schema: Type[BaseModel],
+                          max_concurrency: Optional[int] = None) -> List[Any]:
+    """Async variant of run_structured"""
+    outcomes = _start(await chain.abatch(inputs, config=_config(max_concurrency), return_exceptions=True), schema)
+    for _ in range(MAX_REPAIR_ATTEMPTS):
+        pending = _needs_repair(outcomes)
+        if not pending:
+            break
+        results = await _repair_chain(schema).abatch(
+            _repair_inputs(outcomes, pending), config=_config(max_concurrency), return_exceptions=True
+        )
+        _apply_repairs(outcomes, pending, results, schema)
+    return _finish(outcomes)
+
+
+def repair_text(text: str, schema: Type[BaseModel]) -> Optional[BaseModel]:
+    """
+    Validate free text (e.g. an agent's final answer) against schema, re-asking
+    the model to restructure it only when local validation fails.
+    """
+    parsed, error = validate_text(text, schema)
+    stats.add("requests")
+    if parsed is not None:
+        stats.add("valid")
+        return parsed
+    outcomes = [[None, text, error]]
+    for _ in range(MAX_REPAIR_ATTEMPTS):
+        if not _needs_repair(outcomes):
+            break
+        results = _repair_chain(schema).batch(_repair_inputs(outcomes, [0]), return_exceptions=True)
+        _apply_repairs(outcomes, [0], results, schema)
+    return _finish(outcomes)[0]
+
+
+async def arepair_text(text: str, schema: Type[BaseModel]) -> Optional[BaseModel]:
+    """Async variant of repair_text"""
+    parsed, error = validate_text(text, schema)
+    stats.add("requests")
+    if parsed is not None:
+        stats.add("valid")
+        return parsed
+    outcomes = [[None, text, error]]
+    for _ in range(MAX_REPAIR_ATTEMPTS):
+        if not _needs_repair(outcomes):
+            break
+        results = await _repair_chain(schema).abatch(_repair_inputs(outcomes, [0]), return_exceptions=True)
+        _apply_repairs(outcomes, [0], results, schema)
+    return _finish(outcomes)[0]
@@ -0,0 +1,15 @@
+# modules/tokens.py
+"""
+Prompt size estimates shared by the analysis chains and the memory layer.
+
+Kept free of model and LangChain imports so anything that only needs a
+token count can import it cheaply.
+"""
+
+# Rough average for English contract text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)"""
+    return len(text or "") // CHARS_PER_TOKEN + 1
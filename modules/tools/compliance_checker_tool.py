@@ -1,31 +1,77 @@
-from langchain_core.tools import tool
-from langchain.tools.retriever import create_retriever_tool
-from modules.vector_store import get_compliance_rules
+from typing import Optional
 
-@tool
-def check_compliance_rules(query: str) -> str:
+from langchain_core.tools import StructuredTool
+from modules.resources import get_compliance_rules_tool, get_rule_retriever, get_rulebook
+from modules.rulebook import normalize_value
+
+
+def _format_rules(docs) -> str:
+    # If docs is a string, just return it
+    if isinstance(docs, str):
+        return docs
+
+    # If docs is a list, extract page_content
+    results = []
+    for i, doc in enumerate(docs, 1):
+        # Defensive: handle both Document and string
+        content = getattr(doc, "page_content", str(doc))
+        results.append(f"Rule {i}: {content}")
+
+    return "\n\n".join(results) if results else "No relevant compliance rules found"
+
+
+def _rulebook_block(query: str, contract_type: Optional[str], jurisdiction: Optional[str],
+                    risk_level: Optional[str]):
+    block = get_rulebook().lookup(contract_type or query, jurisdiction)
+    if block is not None and risk_level and normalize_value(block.risk_level) != normalize_value(risk_level):
+        return None
+    return block
+
+
+def _check_compliance_rules(query: str, contract_type: Optional[str] = None, jurisdiction: Optional[str] = None,
+                            risk_level: Optional[str] = None) -> str:
     """
     Retrieve relevant compliance rules from the vector database according to the contract type.
     pass the contract type as a string to the tool.
     it will return the relevant compliance rules for the contract type.
     Use this to find specific compliance requirements and risk indicators.
+    Optionally restrict the rules to a contract_type, jurisdiction or risk_level.
     """
     try:
-        docs = get_compliance_rules.invoke(query)
+        # Known contract types get their whole rule block without a vector search
+        block = _rulebook_block(query, contract_type, jurisdiction, risk_level)
+        if block is not None:
+            return block.text
+        # Imported here so importing the tool does not load Chroma
+        from modules.vector_store import rule_filter
+        filters = rule_filter(contract_type, jurisdiction, risk_level)
+        if filters:
+            # Only the rules matching the filter are searched
+            return _format_rules(get_rule_retriever().invoke(query, filter=filters))
+        return _format_rules(get_compliance_rules_tool().invoke(query))
 
-        # If docs is a string, just return it
-        if isinstance(docs, str):
-            return docs
+    except Exception as e:
+        return f"Error retrieving compliance rules: {str(e)}"
 
-        # If docs is a list, extract page_content
-        results = []
-        for i, doc in enumerate(docs, 1):
-            # Defensive: handle both Document and string
-            content = getattr(doc, "page_content", str(doc))
-            results.append(f"Rule {i}: {content}")
 
-        return "\n\n".join(results) if results else "No relevant compliance rules found"
+async def _acheck_compliance_rules(query: str, contract_type: Optional[str] = None,
+                                   jurisdiction: Optional[str] = None, risk_level: Optional[str] = None) -> str:
+    try:
+        block = _rulebook_block(query, contract_type, jurisdiction, risk_level)
+        if block is not None:
+            return block.text
+        from modules.vector_store import rule_filter
+        filters = rule_filter(contract_type, jurisdiction, risk_level)
+        if filters:
+            return _format_rules(await get_rule_retriever().ainvoke(query, filter=filters))
+        return _format_rules(await get_compliance_rules_tool().ainvoke(query))
 
     except Exception as e:
         return f"Error retrieving compliance rules: {str(e)}"
 
+
+check_compliance_rules = StructuredTool.from_function(
+    func=_check_compliance_rules,
+    coroutine=_acheck_compliance_rules,
+    name="check_compliance_rules",
+)
@@ -1,23 +1,645 @@
 # modules/tools/contract_analyzer_tool.py
-from langchain_core.tools import tool
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.tools import StructuredTool
 from langchain_core.prompts import PromptTemplate
 from pydantic import BaseModel, Field
+from modules.resources import DEFAULT_CHAT_MODEL, LLM_POOL_SIZE, get_embeddings, get_structured_chain
+from modules.structured_output import MAX_REPAIR_ATTEMPTS, arun_structured, run_structured
+from modules.agents.document_processor import DocumentProcessor
+from modules.agents.metadata_engine import DEFAULT_ENGINE
+from modules.contract_index import ContractIndex, aget_contract_index, get_contract_index
+from modules.tokens import estimate_tokens
+from typing import Any, Dict, List, Literal, Optional, Tuple
+from collections import Counter
 import json
+import logging
 import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Approximate tokens allowed per model call (prompt + contract text + rules).
+# Contracts that do not fit in one call are analysed chunk by chunk.
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", "3000"))
+# Smallest chunk worth a call, in words, even when the rules leave little room
+MIN_CHUNK_WORDS = 150
+# Map calls in flight at once for one contract
+CHUNK_CONCURRENCY = int(os.getenv("CHUNK_CONCURRENCY", str(LLM_POOL_SIZE)))
+# Points added to the risk score for every rule the contract misses or only partly meets
+MISSING_RULE_POINTS = 10
+PARTIAL_RULE_POINTS = 5
+# Contract passages sent with each rule in rule-targeted analysis
+TARGETED_TOP_K = int(os.getenv("TARGETED_TOP_K", "3"))
+# Rulebook sections checked rule by rule
+TARGETED_SECTIONS = ("COMPLIANCE_RULES", "VALIDATION_CRITERIA")
+EXCERPT_CHARS = 300
+
+class Party(BaseModel):
+    """A company or individual bound by the contract"""
+    name: str = Field(description="Name of the company or individual")
+    role: str = Field(default="", description="Role in the contract, e.g. Employer or Employee")
+    type: str = Field(default="", description="entity or individual")
+
+class RiskBreakdown(BaseModel):
+    """Points deducted per rulebook section"""
+    compliance_rules_score: float = Field(default=0, ge=0)
+    validation_criteria_score: float = Field(default=0, ge=0)
+    common_violations_score: float = Field(default=0, ge=0)
+    regulatory_references_score: float = Field(default=0, ge=0)
+
+class RiskScore(BaseModel):
+    """Overall risk score with its per-section breakdown"""
+    overall_score: float = Field(ge=0, le=100, description="Risk score from 0-100")
+    risk_level: Literal["Low", "Medium", "High", "Critical"] = Field(description="Risk level for the score")
+    breakdown: RiskBreakdown = Field(default_factory=RiskBreakdown)
+
+class Shortcoming(BaseModel):
+    """One problem found in the contract"""
+    category: str = Field(description="COMPLIANCE_RULES, VALIDATION_CRITERIA, COMMON_VIOLATIONS or REGULATORY_REFERENCES")
+    issue: str = Field(description="What is missing or wrong")
+    severity: Literal["Low", "Medium", "High", "Critical"] = Field(description="Severity of the issue")
+    points_deducted: float = Field(default=0, ge=0, description="Points this issue adds to the risk score")
+
+class ComplianceSummary(BaseModel):
+    """How many of the checked rules the contract meets"""
+    total_rules_checked: int = Field(default=0, ge=0)
+    rules_violated: int = Field(default=0, ge=0)
+    compliance_percentage: float = Field(default=0, ge=0, le=100)
 
 class ComplianceAnalysis(BaseModel):
     """Structured output for contract compliance analysis"""
     document_type: str = Field(description="Type of contract being analyzed")
-    parties_involved: list = Field(description="List of parties in the contract")
-    compliant_items: list = Field(description="List of compliant requirements")
-    missing_items: list = Field(description="List of missing requirements")
-    risk_factors: list = Field(description="Identified risk factors")
-    risk_score: float = Field(description="Risk score from 0-100")
-    shortcomings: list = Field(description="Detailed shortcomings found")
-
-@tool(args_schema=None)
-def analyze_contract_compliance(contract_text: str = '', rules_context: str = '') -> str:
+    parties_involved: List[Party] = Field(default_factory=list, description="Parties in the contract")
+    compliant_items: List[str] = Field(default_factory=list, description="Requirements the contract meets")
+    missing_items: List[str] = Field(default_factory=list, description="Requirements the contract misses")
+    risk_factors: List[str] = Field(default_factory=list, description="Identified risk factors")
+    risk_score: RiskScore = Field(description="Risk score and breakdown")
+    shortcomings: List[Shortcoming] = Field(default_factory=list, description="Detailed shortcomings found")
+    compliance_summary: ComplianceSummary = Field(default_factory=ComplianceSummary)
+
+class ChunkFindings(BaseModel):
+    """What one section of a contract shows, for the chunked analysis"""
+    document_type: str = Field(default="", description="Type of contract the section belongs to")
+    parties_involved: List[Party] = Field(default_factory=list)
+    rules_addressed: List[str] = Field(default_factory=list, description="Exact text of every rule this section satisfies")
+    risk_factors: List[str] = Field(default_factory=list)
+    shortcomings: List[Shortcoming] = Field(default_factory=list)
+
+class RuleVerdict(BaseModel):
+    """Whether the contract satisfies one rule, for the rule-targeted analysis"""
+    status: Literal["compliant", "partial", "missing"]
+    passage: str = Field(default="", description="Id of the passage the decision is based on, e.g. P3")
+    evidence: str = Field(default="", description="Short quote from that passage")
+    issue: str = Field(default="", description="What is missing or wrong (empty when compliant)")
+    severity: Literal["Low", "Medium", "High", "Critical"] = "High"
+
+# Built once at import; the chain around it is pooled in modules.resources
+ANALYSIS_PROMPT = PromptTemplate(
+    template="""
+    You are a legal compliance expert. Analyze the contract against the provided rules.
+
+    CONTRACT TEXT:
+    {contract_text}
+
+    COMPLIANCE RULES:
+    {rules_context}
+
+    ANALYSIS REQUIREMENTS:
+    1. Extract parties involved (companies, individuals)
+    2. Identify missing elements based on rules
+    3. Calculate risk score using this methodology:
+       - Each missing compliance rule = 10 points
+       - Critical missing elements = 15 points each
+       - Documentation deficiencies = 8 points each
+    4. List specific shortcomings with categories
+
+    Respond in the required structure, for example:
+    {{
+      "document_type": "Employment Agreement",
+      "parties_involved": [
+        {{"name": "Company Name", "role": "Employer", "type": "entity"}},
+        {{"name": "Employee Name", "role": "Employee", "type": "individual"}}
+      ],
+      "risk_score": {{
+        "overall_score": 65,
+        "risk_level": "Medium",
+        "breakdown": {{
+          "compliance_rules_score": 30,
+          "validation_criteria_score": 20,
+          "common_violations_score": 10,
+          "regulatory_references_score": 5
+        }}
+      }},
+      "shortcomings": [
+        {{
+          "category": "COMPLIANCE_RULES",
+          "issue": "Missing termination clause",
+          "severity": "High",
+          "points_deducted": 15
+        }}
+      ],
+      "compliance_summary": {{
+        "total_rules_checked": 10,
+        "rules_violated": 3,
+        "compliance_percentage": 70
+      }}
+    }}
+    """,
+    input_variables=["contract_text", "rules_context"]
+)
+
+# Map step: findings for one slice of the contract
+CHUNK_PROMPT = PromptTemplate(
+    template="""
+    You are a legal compliance expert. You are given section {chunk_number} of {chunk_count}
+    of a contract. Other sections are analysed separately, so only report what this
+    section shows; do not report a requirement as missing just because this section
+    does not mention it.
+
+    CONTRACT SECTION:
+    {contract_text}
+
+    COMPLIANCE RULES:
+    {rules_context}
+
+    Respond in the required structure, for example:
+    {{
+      "document_type": "Employment Agreement",
+      "parties_involved": [
+        {{"name": "Company Name", "role": "Employer", "type": "entity"}}
+      ],
+      "rules_addressed": ["exact text of every rule this section satisfies"],
+      "risk_factors": ["risky clause found in this section"],
+      "shortcomings": [
+        {{
+          "category": "COMPLIANCE_RULES",
+          "issue": "Termination clause allows no notice period",
+          "severity": "High",
+          "points_deducted": 15
+        }}
+      ]
+    }}
+    """,
+    input_variables=["contract_text", "rules_context", "chunk_number", "chunk_count"]
+)
+
+# Rule-targeted step: one rule against the passages most similar to it
+RULE_PROMPT = PromptTemplate(
+    template="""
+    You are a legal compliance expert. Decide whether the contract satisfies the rule
+    below. You are given the contract passages most relevant to the rule, each marked
+    with its passage id; base the decision only on them.
+
+    RULE:
+    {rule}
+
+    CONTRACT PASSAGES:
+    {passages}
+
+    Respond in the required structure, for example:
+    {{
+      "status": "partial",
+      "passage": "P3",
+      "evidence": "short quote from the passage the decision is based on",
+      "issue": "what is missing or wrong (empty when compliant)",
+      "severity": "High"
+    }}
+    """,
+    input_variables=["rule", "passages"]
+)
+
+_RULE_LINE = re.compile(r"^\s*(?:-|\*|\d+[.)])\s+(.+?)\s*$")
+_SECTION_HEADER = re.compile(r"^\s*([A-Z_]+):\s*$")
+_NON_WORD = re.compile(r"\W+")
+_PASSAGE_ID = re.compile(r"\d+")
+
+def _unwrap_inputs(contract_text: str, rules_context: str):
+    """Undo the markdown/JSON wrapping the agent sometimes puts around tool input"""
+    # Fix for markdown-wrapped JSON input
+    if contract_text.startswith("```json") or contract_text.startswith("```"):
+        contract_text = contract_text.strip("` ")
+    if rules_context.startswith("```json") or rules_context.startswith("```"):
+        rules_context = rules_context.strip("` ")
+
+    # Parse embedded dict if necessary
+    try:
+        if isinstance(contract_text, str) and contract_text.strip().startswith("{") and 'contract_text' in contract_text:
+            parsed = json.loads(contract_text)
+            contract_text = parsed.get("contract_text", contract_text)
+            rules_context = parsed.get("rules_context", rules_context)
+    except Exception as unwrap_err:
+        logger.warning("Could not unwrap tool input (%d chars of contract text, %d of rules): %s",
+                       len(contract_text), len(rules_context), unwrap_err)
+
+    return contract_text, rules_context
+
+
+def _analysis_chain():
+    # Pooled chain so connections are reused across calls
+    return get_structured_chain("contract_analysis", ANALYSIS_PROMPT, ComplianceAnalysis, DEFAULT_CHAT_MODEL,
+                                temperature=0)
+
+
+def _rule_chain():
+    return get_structured_chain("contract_rule_check", RULE_PROMPT, RuleVerdict, DEFAULT_CHAT_MODEL, temperature=0)
+
+
+def _chunk_chain():
+    return get_structured_chain("contract_chunk_analysis", CHUNK_PROMPT, ChunkFindings, DEFAULT_CHAT_MODEL,
+                                temperature=0)
+
+
+def _analysis_inputs(contract_text: str, rules_context: str) -> dict:
+    return {
+        "contract_text": contract_text,
+        "rules_context": rules_context
+    }
+
+
+def fits_single_call(contract_text: str, rules_context: str, budget: int = CHUNK_TOKEN_BUDGET) -> bool:
+    prompt_tokens = estimate_tokens(ANALYSIS_PROMPT.template)
+    return prompt_tokens + estimate_tokens(contract_text) + estimate_tokens(rules_context) <= budget
+
+
+def split_contract(contract_text: str, rules_context: str, budget: int = CHUNK_TOKEN_BUDGET) -> List[str]:
+    """Overlapping word chunks sized so each map call stays within budget"""
+    available = budget - estimate_tokens(CHUNK_PROMPT.template) - estimate_tokens(rules_context)
+    # About four words per three tokens of English prose
+    chunk_words = max(MIN_CHUNK_WORDS, available * 3 // 4)
+    return DocumentProcessor().chunk_document(contract_text, chunk_size=chunk_words, overlap=chunk_words // 5)
+
+
+def _chunk_inputs(chunks: List[str], rules_context: str) -> List[dict]:
+    return [
+        {
+            "contract_text": chunk,
+            "rules_context": rules_context,
+            "chunk_number": i,
+            "chunk_count": len(chunks)
+        }
+        for i, chunk in enumerate(chunks, 1)
+    ]
+
+
+def _error_report(e: Exception) -> str:
+    # No risk score is made up for a contract that was never analysed
+    return json.dumps({
+        "status": "error",
+        "error": str(e),
+        "document_type": "Error",
+        "parties_involved": [],
+        "risk_score": {
+            "overall_score": None,
+            "risk_level": "Unknown",
+            "breakdown": {}
+        },
+        "shortcomings": [{
+            "category": "SYSTEM_ERROR",
+            "issue": f"Analysis failed: {str(e)}",
+            "severity": "Critical",
+            "points_deducted": 0
+        }],
+        "compliance_summary": {
+            "total_rules_checked": 0,
+            "rules_violated": 0,
+            "compliance_percentage": 0
+        }
+    })
+
+
+def _invalid_output(schema) -> ValueError:
+    return ValueError(f"Model output failed {schema.__name__} validation "
+                      f"after {MAX_REPAIR_ATTEMPTS} repair attempt(s)")
+
+
+def _single_report(result: Any) -> str:
+    """JSON report for one structured analysis result"""
+    if isinstance(result, Exception):
+        raise result
+    if result is None:
+        raise _invalid_output(ComplianceAnalysis)
+    return json.dumps(result.model_dump())
+
+
+def _as_dict(result: Any) -> Optional[Dict]:
+    """Validated findings as a dict, or None when the call failed or never validated"""
+    return result.model_dump() if isinstance(result, BaseModel) else None
+
+
+def _rule_sections(rules_context: str, sections: Tuple[str, ...] = ("COMPLIANCE_RULES",)) -> List[Tuple[str, str]]:
+    """
+    (section, rule) for the individual rules listed in the rules context.
+
+    Bullets under the given section headers when the rulebook sections are
+    present (common violations and references are not requirements a
+    contract satisfies), otherwise every bullet or numbered line.
+    """
+    selected, bullets = [], []
+    section = None
+    for line in (rules_context or "").splitlines():
+        header = _SECTION_HEADER.match(line)
+        if header:
+            section = header.group(1)
+            continue
+        match = _RULE_LINE.match(line)
+        if match:
+            bullets.append((section or "COMPLIANCE_RULES", match.group(1)))
+            if section in sections:
+                selected.append((section, match.group(1)))
+    return list(dict.fromkeys(selected or bullets))
+
+
+def _rule_lines(rules_context: str) -> List[str]:
+    return [rule for _, rule in _rule_sections(rules_context)]
+
+
+def _normalize(text) -> str:
+    return _NON_WORD.sub(" ", str(text).lower()).strip()
+
+
+def _is_addressed(rule: str, addressed: set) -> bool:
+    # The model may quote a rule partially or with extra words around it
+    rule = _normalize(rule)
+    return any(rule == item or rule in item or item in rule for item in addressed)
+
+
+def _points(item: Dict) -> float:
+    try:
+        return float(item.get("points_deducted", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _risk_level(score: float) -> str:
+    if score >= 85:
+        return "Critical"
+    elif score >= 70:
+        return "High"
+    elif score >= 40:
+        return "Medium"
+    return "Low"
+
+
+_BREAKDOWN_KEYS = {
+    "COMPLIANCE_RULES": "compliance_rules_score",
+    "VALIDATION_CRITERIA": "validation_criteria_score",
+    "COMMON_VIOLATIONS": "common_violations_score",
+    "REGULATORY_REFERENCES": "regulatory_references_score",
+}
+
+
+def reduce_chunk_findings(findings: List[Optional[Dict]], rules_context: str,
+                          contract_type: Optional[str] = None) -> Dict:
+    """
+    Merge per-chunk findings into one report.
+
+    A rule counts as compliant when any chunk addresses it and as missing
+    when none does; parties, risk factors and shortcomings are deduplicated
+    across the overlapping chunks.
+    """
+    parsed = [f for f in findings if f]
+    if not parsed:
+        raise ValueError("No section of the contract could be analysed")
+
+    parties = {}
+    risk_factors = {}
+    shortcomings = {}
+    addressed = set()
+    for f in parsed:
+        for party in f.get("parties_involved") or []:
+            name = party.get("name") if isinstance(party, dict) else party
+            if name:
+                parties.setdefault(_normalize(name), party)
+        for factor in f.get("risk_factors") or []:
+            risk_factors.setdefault(_normalize(factor), factor)
+        for item in f.get("shortcomings") or []:
+            if isinstance(item, dict) and item.get("issue"):
+                shortcomings.setdefault((item.get("category"), _normalize(item["issue"])), item)
+        addressed.update(_normalize(rule) for rule in f.get("rules_addressed") or [] if _normalize(rule))
+
+    rules = _rule_lines(rules_context)
+    compliant = [rule for rule in rules if _is_addressed(rule, addressed)]
+    missing = [rule for rule in rules if not _is_addressed(rule, addressed)]
+    shortcomings = list(shortcomings.values()) + [
+        {
+            "category": "COMPLIANCE_RULES",
+            "issue": f"Missing: {rule}",
+            "severity": "High",
+            "points_deducted": MISSING_RULE_POINTS
+        }
+        for rule in missing
+    ]
+
+    breakdown = dict.fromkeys(_BREAKDOWN_KEYS.values(), 0)
+    for item in shortcomings:
+        key = _BREAKDOWN_KEYS.get(str(item.get("category", "")).upper(), "compliance_rules_score")
+        breakdown[key] += _points(item)
+    overall = min(100, sum(breakdown.values()))
+
+    failed = len(findings) - len(parsed)
+    if failed:
+        # An incomplete analysis must not be mistaken for (or cached as) a full one
+        shortcomings.append({
+            "category": "SYSTEM_ERROR",
+            "issue": f"{failed} of {len(findings)} contract sections could not be analysed",
+            "severity": "Medium",
+            "points_deducted": 0
+        })
+
+    document_types = Counter(f["document_type"] for f in parsed if f.get("document_type"))
+    return {
+        "document_type": document_types.most_common(1)[0][0] if document_types else contract_type or "Unknown",
+        "parties_involved": list(parties.values()),
+        "compliant_items": compliant,
+        "missing_items": missing,
+        "risk_factors": list(risk_factors.values()),
+        "risk_score": {
+            "overall_score": overall,
+            "risk_level": _risk_level(overall),
+            "breakdown": breakdown
+        },
+        "shortcomings": shortcomings,
+        "compliance_summary": {
+            "total_rules_checked": len(rules),
+            "rules_violated": len(missing),
+            "compliance_percentage": round(100 * len(compliant) / len(rules)) if rules else 0
+        },
+        "coverage": {
+            "chunks": len(findings),
+            "chunks_analyzed": len(parsed)
+        }
+    }
+
+
+def _raise_if_all_failed(results: list) -> None:
+    errors = [r for r in results if isinstance(r, Exception)]
+    if errors and len(errors) == len(results):
+        raise errors[0]
+
+
+def analyze_contract_chunks(contract_text: str, rules_context: str, contract_type: Optional[str] = None,
+                            budget: int = CHUNK_TOKEN_BUDGET, max_concurrency: int = CHUNK_CONCURRENCY) -> Dict:
+    """
+    Map-reduce analysis of the whole contract.
+
+    The text is split into overlapping chunks that each fit the token
+    budget together with the rules, the chunks are analysed in parallel and
+    their findings are reduced into a single report.
+    """
+    chunks = split_contract(contract_text, rules_context, budget)
+    results = run_structured(_chunk_chain(), _chunk_inputs(chunks, rules_context), ChunkFindings, max_concurrency)
+    _raise_if_all_failed(results)
+    return reduce_chunk_findings([_as_dict(r) for r in results], rules_context, contract_type)
+
+
+async def aanalyze_contract_chunks(contract_text: str, rules_context: str, contract_type: Optional[str] = None,
+                                   budget: int = CHUNK_TOKEN_BUDGET,
+                                   max_concurrency: int = CHUNK_CONCURRENCY) -> Dict:
+    """Async variant of analyze_contract_chunks"""
+    chunks = split_contract(contract_text, rules_context, budget)
+    results = await arun_structured(_chunk_chain(), _chunk_inputs(chunks, rules_context), ChunkFindings,
+                                    max_concurrency)
+    _raise_if_all_failed(results)
+    return reduce_chunk_findings([_as_dict(r) for r in results], rules_context, contract_type)
+
+
+def _rule_inputs(index: ContractIndex, rules: List[Tuple[str, str]], rule_vectors, k: int) -> Tuple[List[dict], List[List[int]]]:
+    """Prompt inputs pairing each rule with its top-k passages, and the passage ids sent"""
+    inputs, sent = [], []
+    for (_, rule), hits in zip(rules, index.search(rule_vectors, k)):
+        ids = sorted(i for i, _ in hits)  # contract order reads more naturally than score order
+        inputs.append({
+            "rule": rule,
+            "passages": "\n\n".join(f"[P{i}] {index.passages[i]}" for i in ids)
+        })
+        sent.append(ids)
+    return inputs, sent
+
+
+def _cited_passage(verdict: Dict, sent: List[int]) -> Optional[int]:
+    """Passage id the verdict cites, falling back to the first passage sent"""
+    match = _PASSAGE_ID.search(str(verdict.get("passage", "")))
+    if match and int(match.group()) in sent:
+        return int(match.group())
+    return sent[0] if sent else None
+
+
+def reduce_rule_verdicts(rules: List[Tuple[str, str]], sent: List[List[int]], results: list,
+                         index: ContractIndex, contract_text: str, inputs: List[dict],
+                         contract_type: Optional[str] = None) -> Dict:
+    """One report from the per-rule verdicts, each finding citing its passage"""
+    findings, shortcomings = [], []
+    compliant, missing = [], []
+    for (section, rule), ids, result in zip(rules, sent, results):
+        verdict = _as_dict(result)
+        if verdict is None:
+            continue
+        status = verdict["status"]
+        passage = _cited_passage(verdict, ids)
+        citation = {
+            "passage": passage,
+            "excerpt": index.passages[passage][:EXCERPT_CHARS] if passage is not None else "",
+            "evidence": verdict["evidence"]
+        }
+        findings.append({"rule": rule, "section": section, "status": status, **citation})
+        if status == "compliant":
+            compliant.append(rule)
+            continue
+        if status == "missing":
+            missing.append(rule)
+        shortcomings.append({
+            "category": section,
+            "issue": verdict["issue"] or f"Missing: {rule}",
+            "severity": verdict["severity"],
+            "points_deducted": MISSING_RULE_POINTS if status == "missing" else PARTIAL_RULE_POINTS,
+            "rule": rule,
+            **citation
+        })
+
+    if not findings:
+        raise ValueError("No compliance rule could be checked against the contract")
+
+    breakdown = dict.fromkeys(_BREAKDOWN_KEYS.values(), 0)
+    for item in shortcomings:
+        breakdown[_BREAKDOWN_KEYS.get(item["category"], "compliance_rules_score")] += item["points_deducted"]
+    overall = min(100, sum(breakdown.values()))
+
+    failed = len(rules) - len(findings)
+    if failed:
+        shortcomings.append({
+            "category": "SYSTEM_ERROR",
+            "issue": f"{failed} of {len(rules)} rules could not be checked",
+            "severity": "Medium",
+            "points_deducted": 0
+        })
+
+    return {
+        "document_type": contract_type or "Unknown",
+        "parties_involved": DEFAULT_ENGINE.parties(contract_text, DEFAULT_ENGINE.lowered(contract_text)),
+        "compliant_items": compliant,
+        "missing_items": missing,
+        "risk_factors": list(dict.fromkeys(item["issue"] for item in shortcomings if item["category"] != "SYSTEM_ERROR")),
+        "risk_score": {
+            "overall_score": overall,
+            "risk_level": _risk_level(overall),
+            "breakdown": breakdown
+        },
+        "shortcomings": shortcomings,
+        "rule_findings": findings,
+        "compliance_summary": {
+            "total_rules_checked": len(findings),
+            "rules_violated": len(findings) - len(compliant),
+            "compliance_percentage": round(100 * len(compliant) / len(findings))
+        },
+        "coverage": {
+            "rules": len(rules),
+            "rules_checked": len(findings),
+            "passages": len(index.passages),
+            "passages_per_rule": max((len(ids) for ids in sent), default=0),
+            "estimated_prompt_tokens": sum(estimate_tokens(RULE_PROMPT.format(**i)) for i in inputs)
+        }
+    }
+
+
+def analyze_contract_by_rule(contract_text: str, rules_context: str, contract_type: Optional[str] = None,
+                             k: int = TARGETED_TOP_K, embedding=None,
+                             max_concurrency: int = CHUNK_CONCURRENCY) -> Dict:
+    """
+    Rule-targeted analysis: each rule is checked against only the k contract
+    passages most similar to it.
+
+    The contract's passages are embedded once (see modules.contract_index),
+    so prompts stay small however long the contract is. Falls back to the
+    chunked analysis when the rules context lists no individual rules.
+    """
+    rules = _rule_sections(rules_context, TARGETED_SECTIONS)
+    if not rules:
+        return analyze_contract_chunks(contract_text, rules_context, contract_type)
+    embedding = embedding or get_embeddings()
+    index = get_contract_index(contract_text, embedding)
+    rule_vectors = embedding.embed_documents([rule for _, rule in rules])
+    inputs, sent = _rule_inputs(index, rules, rule_vectors, k)
+    results = run_structured(_rule_chain(), inputs, RuleVerdict, max_concurrency)
+    _raise_if_all_failed(results)
+    return reduce_rule_verdicts(rules, sent, results, index, contract_text, inputs, contract_type)
+
+
+async def aanalyze_contract_by_rule(contract_text: str, rules_context: str, contract_type: Optional[str] = None,
+                                    k: int = TARGETED_TOP_K, embedding=None,
+                                    max_concurrency: int = CHUNK_CONCURRENCY) -> Dict:
+    """Async variant of analyze_contract_by_rule"""
+    rules = _rule_sections(rules_context, TARGETED_SECTIONS)
+    if not rules:
+        return await aanalyze_contract_chunks(contract_text, rules_context, contract_type)
+    embedding = embedding or get_embeddings()
+    index = await aget_contract_index(contract_text, embedding)
+    rule_vectors = await embedding.aembed_documents([rule for _, rule in rules])
+    inputs, sent = _rule_inputs(index, rules, rule_vectors, k)
+    results = await arun_structured(_rule_chain(), inputs, RuleVerdict, max_concurrency)
+    _raise_if_all_failed(results)
+    return reduce_rule_verdicts(rules, sent, results, index, contract_text, inputs, contract_type)
+
+
+def _analyze_contract_compliance(contract_text: str = '', rules_context: str = '') -> str:
     """
     Analyze contract text against compliance rules and return structured analysis.
 
@@ -29,159 +651,32 @@ def analyze_contract_compliance(contract_text: str = '', rules_context: str = ''
         JSON string with detailed compliance analysis
     """
     try:
-        # Fix for markdown-wrapped JSON input
-        if contract_text.startswith("```json") or contract_text.startswith("```"):
-            contract_text = contract_text.strip("` ")
-        if rules_context.startswith("```json") or rules_context.startswith("```"):
-            rules_context = rules_context.strip("` ")
-
-        # Parse embedded dict if necessary
-        try:
-            if isinstance(contract_text, str) and contract_text.strip().startswith("{") and 'contract_text' in contract_text:
-                parsed = json.loads(contract_text)
-                contract_text = parsed.get("contract_text", contract_text)
-                rules_context = parsed.get("rules_context", rules_context)
-        except Exception as unwrap_err:
-            print(f"Error unwrapping contract_text: {unwrap_err}")
-            print(f"Contract text: {contract_text}")
-            print(f"Rules context: {rules_context}")
-
-        # Initialize the LLM
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            temperature=0,
-            google_api_key=os.getenv("GOOGLE_API_KEY")
-        )
-
-        # Create analysis prompt
-        analysis_prompt = PromptTemplate(
-            template="""
-            You are a legal compliance expert. Analyze the contract against the provided rules.
-
-            CONTRACT TEXT:
-            {contract_text}
-
-            COMPLIANCE RULES:
-            {rules_context}
-
-            ANALYSIS REQUIREMENTS:
-            1. Extract parties involved (companies, individuals)
-            2. Identify missing elements based on rules
-            3. Calculate risk score using this methodology:
-               - Each missing compliance rule = 10 points
-               - Critical missing elements = 15 points each
-               - Documentation deficiencies = 8 points each
-            4. List specific shortcomings with categories
-
-            Return ONLY a valid JSON object with this structure:
-            {{
-              "document_type": "Employment Agreement",
-              "parties_involved": [
-                {{"name": "Company Name", "role": "Employer", "type": "entity"}},
-                {{"name": "Employee Name", "role": "Employee", "type": "individual"}}
-              ],
-              "risk_score": {{
-                "overall_score": 65,
-                "risk_level": "Medium",
-                "breakdown": {{
-                  "compliance_rules_score": 30,
-                  "validation_criteria_score": 20,
-                  "common_violations_score": 10,
-                  "regulatory_references_score": 5
-                }}
-              }},
-              "shortcomings": [
-                {{
-                  "category": "COMPLIANCE_RULES",
-                  "issue": "Missing termination clause",
-                  "severity": "High",
-                  "points_deducted": 15
-                }}
-              ],
-              "compliance_summary": {{
-                "total_rules_checked": 10,
-                "rules_violated": 3,
-                "compliance_percentage": 70
-              }}
-            }}
-            """,
-            input_variables=["contract_text", "rules_context"]
-        )
-
-        # Execute the analysis
-        chain = analysis_prompt | llm
-        result = chain.invoke({
-            "contract_text": contract_text[:2000],
-            "rules_context": rules_context
-        })
+        contract_text, rules_context = _unwrap_inputs(contract_text, rules_context)
+        # Long contracts are analysed in full, chunk by chunk, rather than truncated
+        if not fits_single_call(contract_text, rules_context):
+            return json.dumps(analyze_contract_chunks(contract_text, rules_context))
+        results = run_structured(_analysis_chain(), [_analysis_inputs(contract_text, rules_context)], ComplianceAnalysis)
+        return _single_report(results[0])
 
-        # Clean the response
-        response_text = result.content if hasattr(result, 'content') else str(result)
-
-        # Extract JSON if wrapped in markdown
-        if "```json" in response_text and "```" in response_text:
-            json_start = response_text.find("```json") + 7
-            json_end = response_text.find("```", json_start)
-            response_text = response_text[json_start:json_end].strip()
-        elif "```" in response_text:
-            json_start = response_text.find("```") + 3
-            json_end = response_text.find("```", json_start)
-            response_text = response_text[json_start:json_end].strip()
-
-        # Validate JSON
-        try:
-            json.loads(response_text)
-            return response_text
-        except json.JSONDecodeError:
-            return json.dumps({
-                "document_type": "Unknown",
-                "parties_involved": [],
-                "risk_score": {
-                    "overall_score": 50,
-                    "risk_level": "Medium",
-                    "breakdown": {
-                        "compliance_rules_score": 20,
-                        "validation_criteria_score": 15,
-                        "common_violations_score": 10,
-                        "regulatory_references_score": 5
-                    }
-                },
-                "shortcomings": [{
-                    "category": "SYSTEM_ERROR",
-                    "issue": "JSON parsing failed",
-                    "severity": "Medium",
-                    "points_deducted": 50
-                }],
-                "compliance_summary": {
-                    "total_rules_checked": 1,
-                    "rules_violated": 1,
-                    "compliance_percentage": 0
-                }
-            })
+    except Exception as e:
+        return _error_report(e)
+
+
+async def _aanalyze_contract_compliance(contract_text: str = '', rules_context: str = '') -> str:
+    try:
+        contract_text, rules_context = _unwrap_inputs(contract_text, rules_context)
+        if not fits_single_call(contract_text, rules_context):
+            return json.dumps(await aanalyze_contract_chunks(contract_text, rules_context))
+        results = await arun_structured(_analysis_chain(), [_analysis_inputs(contract_text, rules_context)],
+                                        ComplianceAnalysis)
+        return _single_report(results[0])
 
     except Exception as e:
-        return json.dumps({
-            "document_type": "Error",
-            "parties_involved": [],
-            "risk_score": {
-                "overall_score": 100,
-                "risk_level": "Critical",
-                "breakdown": {
-                    "compliance_rules_score": 25,
-                    "validation_criteria_score": 25,
-                    "common_violations_score": 25,
-                    "regulatory_references_score": 25
-                }
-            },
-            "shortcomings": [{
-                "category": "SYSTEM_ERROR",
-                "issue": f"Analysis failed: {str(e)}",
-                "severity": "Critical",
-                "points_deducted": 100
-            }],
-            "compliance_summary": {
-                "total_rules_checked": 0,
-                "rules_violated": 1,
-                "compliance_percentage": 0
-            }
-        })
+        return _error_report(e)
+
+
+analyze_contract_compliance = StructuredTool.from_function(
+    func=_analyze_contract_compliance,
+    coroutine=_aanalyze_contract_compliance,
+    name="analyze_contract_compliance",
+)
@@ -1,39 +1,62 @@
 import requests
+import httpx
 from bs4 import BeautifulSoup
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
 from typing import List, Dict
 
-@tool
-def web_search(query: str) -> str:
+# Simple DuckDuckGo search (replace with your preferred search API)
+SEARCH_URL = "https://duckduckgo.com/html/"
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+
+def _format_results(content: bytes) -> str:
+    """Turn the search result page into numbered title/snippet lines"""
+    soup = BeautifulSoup(content, 'html.parser')
+
+    results = []
+    for i, result in enumerate(soup.find_all('div', class_='result'), 1):
+        if i > 3:  # Limit to top 3 results
+            break
+
+        title_elem = result.find('h2')
+        snippet_elem = result.find('span', class_='result-snippet')
+
+        if title_elem and snippet_elem:
+            title = title_elem.get_text().strip()
+            snippet = snippet_elem.get_text().strip()
+            results.append(f"[{i}] {title}: {snippet}")
+
+    return "\n".join(results) if results else "No relevant results found"
+
+
+def _web_search(query: str) -> str:
     """
     Search the web for information related to the query.
     Returns relevant web search results with citations.
     """
     try:
-        # Simple DuckDuckGo search (replace with your preferred search API)
-        search_url = f"https://duckduckgo.com/html/?q={query}"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        
-        response = requests.get(search_url, headers=headers, timeout=10)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        results = []
-        for i, result in enumerate(soup.find_all('div', class_='result'), 1):
-            if i > 3:  # Limit to top 3 results
-                break
-                
-            title_elem = result.find('h2')
-            snippet_elem = result.find('span', class_='result-snippet')
-            
-            if title_elem and snippet_elem:
-                title = title_elem.get_text().strip()
-                snippet = snippet_elem.get_text().strip()
-                results.append(f"[{i}] {title}: {snippet}")
-        
-        return "\n".join(results) if results else "No relevant results found"
-        
+        response = requests.get(SEARCH_URL, params={"q": query}, headers=HEADERS, timeout=10)
+        return _format_results(response.content)
+
+    except Exception as e:
+        return f"Error performing web search: {str(e)}"
+
+
+async def _aweb_search(query: str) -> str:
+    """Async variant of web_search that does not block the event loop"""
+    try:
+        async with httpx.AsyncClient(headers=HEADERS, timeout=10, follow_redirects=True) as client:
+            response = await client.get(SEARCH_URL, params={"q": query})
+        return _format_results(response.content)
+
     except Exception as e:
         return f"Error performing web search: {str(e)}"
 
+
+web_search = StructuredTool.from_function(
+    func=_web_search,
+    coroutine=_aweb_search,
+    name="web_search",
+)
@@ -1,15 +1,24 @@
 import sqlite3
 import sys
 import os
+import re
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 from langchain_community.vectorstores import Chroma
 from langchain_community.document_loaders import TextLoader
-from langchain_community.embeddings import OpenAIEmbeddings
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from dotenv import load_dotenv
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain.tools.retriever import create_retriever_tool
-import nest_asyncio
-nest_asyncio.apply()
+from modules.metrics import record_cache_lookup
+from modules.resources import DEFAULT_EMBEDDING_MODEL
+from modules.rulebook import GENERAL, RULES_PATH, Rulebook, block_spans, normalize_value, rule_files
 
 # SQLite workaround
 try:
@@ -20,34 +29,379 @@ except ImportError:
 
 load_dotenv()
 
+PERSIST_DIRECTORY = os.getenv("RULE_INDEX_DIR", "./chroma_product_db")
+COLLECTION_NAME = "compliance_rules"
+
+# "google" (remote Gemini embeddings), "local" (sentence-transformers on the
+# CPU) or "hashing" (hashed term-frequency vectors, no model at all)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "google").lower()
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+HASHING_DIMENSIONS = int(os.getenv("HASHING_DIMENSIONS", "1024"))
+# Query vectors kept per embeddings client
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
 
-loader = TextLoader("./sample_data/rules.txt")
-docs = loader.load()
+EMBEDDING_BACKENDS = ("google", "local", "hashing")
 
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1024,
-    chunk_overlap=256
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or shall that the this to was were will with"
+    .split()
 )
 
-splits = text_splitter.split_documents(docs)
 
+def tokenize(text: str) -> List[str]:
+    """Lowercase words of text without stopwords, as used by the hashing and keyword indexes"""
+    return [w for w in _TOKEN.findall(text.lower()) if w not in _STOPWORDS]
 
 
-product_store = Chroma.from_documents(
-    documents=splits,
-    embedding=GoogleGenerativeAIEmbeddings(model="models/embedding-001"),   
-    persist_directory="./chroma_product_db",
-)
+class HashingEmbeddings(Embeddings):
+    """
+    Hashed term-frequency vectors of words and word pairs.
 
-get_compliance_rules = create_retriever_tool(
-    product_store.as_retriever(search_kwargs={"k": 2}),
-    name="get_compliance_rules",
-    description="Retrieve relevant compliance rules from the vector database according to the contract text"
-)
+    Needs no model, download or network: a text is embedded in a few
+    microseconds per word, and texts sharing terms get similar vectors,
+    which is enough to match contract types and rule wording.
+    """
+
+    def __init__(self, dimensions: int = HASHING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def _index(self, term: str):
+        digest = hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest[:4], "little") % self.dimensions, 1.0 if digest[4] & 1 else -1.0
+
+    def _vector(self, text: str) -> List[float]:
+        words = tokenize(text)
+        counts: Dict[str, int] = {}
+        for term in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            counts[term] = counts.get(term, 0) + 1
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for term, count in counts.items():
+            index, sign = self._index(term)
+            # Sublinear term frequency, so repeated boilerplate does not dominate
+            vector[index] += sign * (1.0 + math.log(count))
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+class LocalEmbeddings(Embeddings):
+    """sentence-transformers model run on the CPU (pip install sentence-transformers)"""
+
+    def __init__(self, model: str = LOCAL_EMBEDDING_MODEL, device: str = "cpu"):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "EMBEDDING_BACKEND=local needs the sentence-transformers package "
+                "(pip install sentence-transformers), or use EMBEDDING_BACKEND=hashing"
+            ) from e
+        self.model = model
+        self._model = SentenceTransformer(model, device=device)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._model.encode(list(texts), normalize_embeddings=True).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._model.encode(text, normalize_embeddings=True).tolist()
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Wraps an embeddings client with an LRU cache of query vectors.
+
+    The orchestrator asks for the rules of the same few contract types over
+    and over, so repeated queries skip the model (or the network) entirely.
+    Documents are passed through uncached.
+    """
+
+    def __init__(self, embeddings: Embeddings, size: int = QUERY_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._vectors: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, text: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._vectors.get(text)
+            if vector is None:
+                self.misses += 1
+            else:
+                self._vectors.move_to_end(text)
+                self.hits += 1
+        record_cache_lookup("query_embedding", vector is not None)
+        return vector
+
+    def _remember(self, text: str, vector: List[float]) -> List[float]:
+        if self.size > 0:
+            with self._lock:
+                self._vectors[text] = vector
+                self._vectors.move_to_end(text)
+                while len(self._vectors) > self.size:
+                    self._vectors.popitem(last=False)
+        return vector
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self._cached(text)
+        if vector is None:
+            vector = self._remember(text, self.embeddings.embed_query(text))
+        # Callers get their own copy, so nobody can change the cached vector
+        return list(vector)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vector = self._cached(text)
+        if vector is None:
+            vector = self._remember(text, await self.embeddings.aembed_query(text))
+        return list(vector)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def cache_info(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._vectors)}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._vectors.clear()
+
+
+def make_embeddings(backend: str = EMBEDDING_BACKEND, model: Optional[str] = None) -> CachedQueryEmbeddings:
+    """Embeddings client for backend, with cached query vectors"""
+    if backend == "google":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        from modules.resources import _patch_event_loop
+        _patch_event_loop()
+        embeddings = GoogleGenerativeAIEmbeddings(model=model or DEFAULT_EMBEDDING_MODEL)
+    elif backend == "local":
+        embeddings = LocalEmbeddings(model or LOCAL_EMBEDDING_MODEL)
+    elif backend == "hashing":
+        embeddings = HashingEmbeddings()
+    else:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r}, expected one of {', '.join(EMBEDDING_BACKENDS)}")
+    return CachedQueryEmbeddings(embeddings)
+
+
+def rule_collection_name(backend: str = EMBEDDING_BACKEND, model: Optional[str] = None) -> str:
+    """
+    Chroma collection for the rule chunks embedded by backend.
+
+    Every backend (and local model) gets its own collection, so switching
+    backends never mixes vectors of different sizes or spaces.
+    """
+    if backend == "google":
+        return COLLECTION_NAME
+    if backend == "local":
+        name = (model or LOCAL_EMBEDDING_MODEL).split("/")[-1]
+        # Chroma allows 3-63 characters of [a-zA-Z0-9._-]
+        return f"{COLLECTION_NAME}_local_{re.sub(r'[^a-zA-Z0-9._-]', '-', name)}"[:63]
+    return f"{COLLECTION_NAME}_{backend}"
+
+
+# Ids written to or deleted from Chroma per call
+CHROMA_BATCH_SIZE = 5000
+
+# Metadata every rule chunk carries and check_compliance_rules can filter on
+FILTER_FIELDS = ("contract_type", "jurisdiction", "risk_level")
+
+
+def _rule_metadata(source: str, contract_type: Optional[str], jurisdiction: Optional[str],
+                   risk_level: Optional[str], references: List[str]) -> Dict[str, str]:
+    return {
+        "source": source,
+        "contract_type": Rulebook.type_key(contract_type),
+        "jurisdiction": normalize_value(jurisdiction),
+        "risk_level": normalize_value(risk_level),
+        "regulatory_references": "; ".join(references),
+    }
+
+
+def _text_rule_chunks(path: str, text_splitter) -> List[Document]:
+    text = TextLoader(path, encoding="utf-8").load()[0].page_content
+    # Text before the first header (if any) is kept as a block of its own
+    spans = block_spans(text) or [("", 0, len(text))]
+    if spans[0][1] > 0:
+        spans.insert(0, ("", 0, spans[0][1]))
+    chunks = []
+    for name, start, end in spans:
+        block = Rulebook.parse(text[start:end]).blocks[0] if name else None
+        metadata = _rule_metadata(
+            path, name, block and block.jurisdiction, block and block.risk_level,
+            block.regulatory_references if block else []
+        )
+        metadata["block_start"] = start
+        for doc in text_splitter.split_documents([Document(page_content=text[start:end], metadata=metadata)]):
+            doc.metadata["start_index"] += start
+            chunks.append(doc)
+    return chunks
+
+
+def _jsonl_rule_chunks(path: str) -> List[Document]:
+    """One chunk per line: {"text", "contract_type", "jurisdiction", "risk_level", "regulatory_reference"}"""
+    chunks = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                rule = json.loads(line)
+                text = rule["text"]
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"{path}:{number}: expected a JSON object with a \"text\" field ({e})") from e
+            reference = rule.get("regulatory_reference") or ""
+            chunks.append(Document(page_content=text, metadata=_rule_metadata(
+                path, rule.get("contract_type"), rule.get("jurisdiction"), rule.get("risk_level"),
+                [reference] if reference else []
+            )))
+    return chunks
+
+
+def load_rule_chunks(rules_path: str = RULES_PATH) -> List[Document]:
+    """
+    Load every rule file under rules_path into the chunks that get embedded.
+
+    Each contract type block of a text rulebook is split on its own, so no
+    chunk mixes the rules of two types. Chunks carry their block's contract
+    type, jurisdiction, risk level and regulatory references (see
+    FILTER_FIELDS), plus their start_index in the file, which lets the
+    hybrid retriever merge overlapping chunks of one block back together.
+    Every line of a .jsonl file is one rule.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1024,
+        chunk_overlap=256,
+        add_start_index=True
+    )
+    chunks = []
+    for path in rule_files(rules_path):
+        if path.endswith(".jsonl"):
+            chunks.extend(_jsonl_rule_chunks(path))
+        else:
+            chunks.extend(_text_rule_chunks(path, text_splitter))
+    return chunks
+
+
+def unique_rule_chunks(rules_path: str = RULES_PATH) -> Dict[str, Document]:
+    """Rule chunks keyed by chunk_id; identical chunks collapse onto one id"""
+    chunks = {}
+    for doc in load_rule_chunks(rules_path):
+        doc.metadata["chunk_hash"] = chunk_id(doc)
+        chunks.setdefault(doc.metadata["chunk_hash"], doc)
+    return chunks
+
+
+def chunk_id(doc: Document) -> str:
+    """
+    Hash of a rule chunk's content and filter metadata, used as its Chroma id.
+
+    The same rule text in two jurisdictions or contract types is kept once
+    for each of them.
+    """
+    key = "\0".join([doc.page_content] + [str(doc.metadata.get(field, "")) for field in FILTER_FIELDS])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def rule_filter(contract_type: Optional[str] = None, jurisdiction: Optional[str] = None,
+                risk_level: Optional[str] = None) -> Dict[str, str]:
+    """The given filter values in the form they are stored in (empty when nothing is filtered)"""
+    values = {}
+    if contract_type:
+        values["contract_type"] = Rulebook.type_key(contract_type)
+    if jurisdiction:
+        values["jurisdiction"] = normalize_value(jurisdiction)
+    if risk_level:
+        values["risk_level"] = normalize_value(risk_level)
+    return values
+
+
+def accepted_values(field: str, wanted: str) -> Tuple[str, ...]:
+    """Stored values a filter on field matches; general rules also match a contract type or jurisdiction"""
+    return (wanted,) if field == "risk_level" else (wanted, GENERAL)
+
+
+_versions: Dict[tuple, str] = {}
+
+
+def rules_version(rules_path: str = RULES_PATH) -> str:
+    """
+    Hash of the rule files' contents, used to invalidate cached analyses.
+
+    Re-hashed only when a file is added, removed or modified, so large rule
+    directories are not read on every run.
+    """
+    files = rule_files(rules_path)
+    signature = tuple((path, os.stat(path).st_size, os.stat(path).st_mtime_ns) for path in files)
+    version = _versions.get(signature)
+    if version is None:
+        digest = hashlib.sha256()
+        for path in files:
+            if len(files) > 1:
+                digest.update(os.path.relpath(path, rules_path).encode("utf-8") + b"\0")
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        version = _versions[signature] = digest.hexdigest()[:16]
+    return version
+
+
+def build_rule_index(
+    rules_path: str = RULES_PATH,
+    persist_directory: str = PERSIST_DIRECTORY,
+    embedding: Optional[Embeddings] = None,
+    collection_name: Optional[str] = None,
+) -> Chroma:
+    """
+    Open the persisted rule collection and sync it with the rulebook.
+
+    Chunks are keyed by their content hash, so only new or changed chunks
+    are embedded and chunks no longer present in the rulebook are deleted.
+    An unchanged rulebook opens the existing collection without any
+    embedding calls. The collection defaults to the one of the configured
+    EMBEDDING_BACKEND.
+    """
+    if embedding is None:
+        from modules.resources import get_embeddings
+        embedding = get_embeddings()
+    collection_name = collection_name or rule_collection_name()
+
+    chunks = unique_rule_chunks(rules_path)
+
+    store = Chroma(
+        collection_name=collection_name,
+        embedding_function=embedding,
+        persist_directory=persist_directory,
+    )
 
+    existing_ids = set(store.get(include=[])["ids"])
 
+    # Written in batches that stay under Chroma's maximum batch size
+    stale_ids = [i for i in existing_ids if i not in chunks]
+    for start in range(0, len(stale_ids), CHROMA_BATCH_SIZE):
+        store.delete(ids=stale_ids[start:start + CHROMA_BATCH_SIZE])
 
-# results = get_compliance_rules.invoke("Retrieve relevant compliance rules for employment agreement")
+    new_ids = [i for i in chunks if i not in existing_ids]
+    for start in range(0, len(new_ids), CHROMA_BATCH_SIZE):
+        batch = new_ids[start:start + CHROMA_BATCH_SIZE]
+        store.add_documents([chunks[i] for i in batch], ids=batch)
 
+    return store
 
 
+def __getattr__(name: str):
+    # The store and retriever tool used to be built at import time; they are
+    # now created on first access through the shared resource registry.
+    from modules import resources
+    if name == "product_store":
+        return resources.get_rule_store()
+    if name == "get_compliance_rules":
+        return resources.get_compliance_rules_tool()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")